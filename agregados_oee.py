@@ -0,0 +1,75 @@
+"""
+Agregados sumables de OEE.
+
+Un agregado lleva solo componentes aditivos (turnos, tiempos, unidades y minutos de
+paro), así que cualquier consolidación (turno -> día -> semana -> mes -> año, o
+línea -> planta) es una suma de agregados parciales, y los resultados parciales se
+pueden guardar o calcular por separado y combinar después. Los porcentajes se
+calculan recién al mostrarlos, como cociente de las sumas: es el OEE ponderado por
+tiempo programado, que no depende de la mezcla de turnos de cada período.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+COMPONENTES = ['turnos', 'tiempo_disponible_min', 'tiempo_programado_min', 'tiempo_efectivo_min',
+               'produccion_real_unidades', 'produccion_defectuosa_unidades', 'minutos_paro']
+
+
+class AgregadoOEE(namedtuple('AgregadoOEE', COMPONENTES)):
+    """Componentes sumables de un conjunto de turnos; `a + b` combina dos agregados."""
+
+    __slots__ = ()
+
+    @classmethod
+    def vacio(cls):
+        return cls(*[0] * len(COMPONENTES))
+
+    @classmethod
+    def de_fila(cls, fila):
+        """Agregado de una fila (dict o Serie) con las columnas de COMPONENTES."""
+        return cls(*[fila[c] for c in COMPONENTES])
+
+    def __add__(self, otro):
+        return AgregadoOEE(*[a + b for a, b in zip(self, otro)])
+
+    @property
+    def oee_neto(self):
+        """Tiempo efectivo sobre tiempo programado, en %; None sin tiempo programado."""
+        return self.tiempo_efectivo_min / self.tiempo_programado_min * 100 if self.tiempo_programado_min else None
+
+    @property
+    def calidad(self):
+        """Unidades buenas sobre unidades producidas, en %; None sin producción."""
+        if not self.produccion_real_unidades:
+            return None
+        return (self.produccion_real_unidades - self.produccion_defectuosa_unidades) / self.produccion_real_unidades * 100
+
+
+def combinar(partes, por):
+    """
+    Suma agregados parciales (DataFrames con las columnas `por` y COMPONENTES) por las columnas `por`.
+    Sirve para cualquier consolidación: basta con agrupar por menos columnas (por ejemplo,
+    sin 'linea_produccion' para la planta).
+    """
+    por = list(por)
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        return pd.DataFrame(columns=por + COMPONENTES)
+    datos = pd.concat(partes, ignore_index=True)
+    if not por:
+        return datos[COMPONENTES].sum().to_frame().T
+    return datos.groupby(por, sort=True, observed=True)[COMPONENTES].sum().reset_index()
+
+
+def indicadores(agregados):
+    """Agrega a los agregados las columnas oee_neto y calidad (%), NaN donde el denominador es cero."""
+    programado = agregados['tiempo_programado_min'].to_numpy(dtype=float)
+    real = agregados['produccion_real_unidades'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        oee_neto = np.where(programado > 0, agregados['tiempo_efectivo_min'].to_numpy(dtype=float) / programado * 100,
+                            np.nan)
+        calidad = np.where(real > 0, (real - agregados['produccion_defectuosa_unidades'].to_numpy(dtype=float))
+                           / real * 100, np.nan)
+    return agregados.assign(oee_neto=oee_neto, calidad=calidad)
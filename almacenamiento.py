@@ -0,0 +1,422 @@
+"""
+Persistencia de los reportes de producción.
+
+Ambas aplicaciones leen y escriben los reportes a través de este módulo, que
+delega en el backend configurado con la variable de entorno OEE_ALMACENAMIENTO:
+
+- ``csv`` (por defecto): `registros_produccion.csv` con journal append-only e índice de claves.
+- ``sqlite``: base SQLite en modo WAL (`registros_produccion.db`, o la ruta de OEE_SQLITE_DB).
+- ``parquet``: directorio Parquet particionado por año/mes/línea (`registros_parquet/`, o OEE_PARQUET_DIR).
+
+Los paros de cada turno se guardan aparte, en formato largo (report_id, código del
+par causal/subcausal en la taxonomía de `taxonomia_paros`, minutos), sin límite de
+paros por turno. Se capturan y se leen con sus nombres: `codificar_paros` traduce los
+nombres a códigos al guardar y `unir_paros` los nombres vigentes al leer. Los
+historiales en el formato ancho anterior (paro_causal_1..10, ...) se siguen leyendo
+con `separar_paros`.
+"""
+import argparse
+import os
+import threading
+import uuid
+
+import pandas as pd
+
+from cola_escritura import ColaEscritura
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+REGISTROS_FILE = 'registros_produccion.csv'
+
+# Un reporte se identifica por fecha, turno y línea
+CLAVE_REPORTE = ['fecha', 'turno', 'linea_produccion']
+
+ENCABEZADO_REGISTROS = ['report_id', 'fecha', 'turno', 'supervisor', 'linea_produccion', 'tiempo_disponible_min',
+                        'tiempo_programado_min', 'producto_terminado', 'produccion_real_unidades', 'produccion_defectuosa_unidades',
+                        'tiempo_efectivo_min', 'tiempo_no_conformidad_min', 'tiempo_a_justificar_min']
+
+# Un paro por fila, enlazado a su reporte, con los nombres de su causal y subcausal (captura e importación)
+COLUMNAS_PAROS = ['report_id', 'causal', 'subcausal', 'minutos']
+
+# Paros tal como se guardan: el par causal/subcausal va como código de la taxonomía
+COLUMNAS_PAROS_GUARDADOS = ['report_id', 'codigo_paro', 'minutos']
+
+# Paros tal como los devuelve leer_paros, con la clave de su reporte y los nombres vigentes de su código
+COLUMNAS_PAROS_LEIDOS = ['report_id', 'fecha', 'turno', 'linea_produccion', 'codigo_paro', 'causal', 'subcausal', 'minutos']
+
+# Formato ancho anterior: hasta 10 paros por reporte en columnas fijas
+MAX_PAROS_LEGADO = 10
+COLUMNAS_PAROS_LEGADO = []
+for _i in range(1, MAX_PAROS_LEGADO + 1):
+    COLUMNAS_PAROS_LEGADO.extend([f'paro_causal_{_i}', f'paro_subcausal_{_i}', f'tiempo_paro_min_{_i}'])
+
+BACKENDS = ['csv', 'sqlite', 'parquet']
+
+# Variable de entorno con la ruta de cada backend
+_VARIABLES_RUTA = {'sqlite': 'OEE_SQLITE_DB', 'parquet': 'OEE_PARQUET_DIR'}
+
+_backends = {}
+_colas = {}
+_lock_backends = threading.Lock()
+
+
+class BloqueoArchivo:
+    """
+    Exclusión mutua entre hilos del proceso y entre procesos (varias instancias de
+    Streamlit sobre los mismos archivos), mediante un bloqueo sobre un archivo `.lock`.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._file = None
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._file = open(self.ruta, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except Exception:
+            if self._file is not None:
+                self._file.close()
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+            self._lock.release()
+
+
+def fecha_iso(valor):
+    """Normaliza una fecha (str, date o Timestamp) al formato 'YYYY-MM-DD' de los registros."""
+    return pd.Timestamp(valor).strftime('%Y-%m-%d')
+
+
+def filtrar_registros(df, lineas=None, desde=None, hasta=None):
+    """Aplica en memoria los mismos filtros de línea y rango de fechas que resuelven los backends."""
+    if df.empty:
+        return df
+    mascara = pd.Series(True, index=df.index)
+    if lineas is not None:
+        mascara &= df['linea_produccion'].isin(list(lineas))
+    if desde is not None:
+        mascara &= df['fecha'].astype(str) >= fecha_iso(desde)
+    if hasta is not None:
+        mascara &= df['fecha'].astype(str) <= fecha_iso(hasta)
+    return df[mascara].reset_index(drop=True)
+
+
+def nuevo_report_id():
+    return uuid.uuid4().hex
+
+
+def es_formato_ancho(columnas):
+    return 'paro_causal_1' in columnas
+
+
+def asegurar_report_id(df, prefijo, inicio=0):
+    """
+    Asigna report_id a las filas del formato anterior que no lo tienen.
+    El id se deriva de la posición de la fila en su archivo, así que es estable
+    mientras el archivo no se reescriba; `inicio` es la posición de la primera fila
+    cuando se lee solo el final del archivo.
+    """
+    if 'report_id' not in df.columns:
+        df = df.copy()
+        df.insert(0, 'report_id', [f'{prefijo}{inicio + n}' for n in range(len(df))])
+    elif df['report_id'].isna().any():
+        df = df.copy()
+        faltantes = df['report_id'].isna().to_numpy()
+        df.loc[faltantes, 'report_id'] = [f'{prefijo}{inicio + n}' for n in range(len(df)) if faltantes[n]]
+    return df
+
+
+def separar_paros(df, prefijo_id='L'):
+    """
+    Lector de compatibilidad para el formato ancho.
+    Devuelve (registros, paros): los registros sin las columnas paro_* y los paros
+    en formato largo, en el mismo orden en que se recorrían las columnas 1..10.
+    """
+    df = asegurar_report_id(df, prefijo_id)
+    if not es_formato_ancho(df.columns):
+        return df, pd.DataFrame(columns=COLUMNAS_PAROS)
+
+    partes = []
+    for i in range(1, MAX_PAROS_LEGADO + 1):
+        if f'paro_causal_{i}' not in df.columns:
+            break
+        parte = pd.DataFrame({
+            'report_id': df['report_id'],
+            'causal': df[f'paro_causal_{i}'],
+            'subcausal': df.get(f'paro_subcausal_{i}'),
+            'minutos': pd.to_numeric(df.get(f'tiempo_paro_min_{i}'), errors='coerce'),
+        })
+        partes.append(parte[parte['causal'].notna() & (parte['causal'] != '') & parte['minutos'].notna()])
+    paros = pd.concat(partes, ignore_index=True)
+    registros = df.drop(columns=[c for c in COLUMNAS_PAROS_LEGADO if c in df.columns])
+    return registros, paros
+
+
+def codificar_paros(paros, registrar_faltantes=True):
+    """
+    Paros con las columnas con que se guardan (COLUMNAS_PAROS_GUARDADOS). Los que traen la
+    causal y la subcausal como texto (captura, importaciones, archivos anteriores) se
+    codifican con la taxonomía, que agrega los pares que todavía no tenga; los que ya
+    traen `codigo_paro` lo conservan. Con `registrar_faltantes=False` (lecturas) la
+    taxonomía no se modifica y los pares que no tiene quedan sin código.
+    """
+    from taxonomia_paros import obtener_taxonomia, registrar
+    paros = paros.reset_index(drop=True)
+    codigos = pd.Series(pd.array([pd.NA] * len(paros), dtype='Int64'))
+    if 'codigo_paro' in paros.columns:
+        codigos = pd.to_numeric(paros['codigo_paro'], errors='coerce').round().astype('Int64')
+    if 'causal' in paros.columns:
+        por_nombre = (codigos.isna() & paros['causal'].notna()).to_numpy()
+        if por_nombre.any():
+            nombres = paros.loc[por_nombre].reindex(columns=['causal', 'subcausal'])
+            pares = nombres.drop_duplicates()
+            taxonomia = (registrar(list(zip(pares['causal'], pares['subcausal']))) if registrar_faltantes
+                         else obtener_taxonomia())
+            codigos[por_nombre] = taxonomia.codificar(nombres['causal'], nombres['subcausal'])
+    return pd.DataFrame({'report_id': paros['report_id'] if 'report_id' in paros.columns else None,
+                         'codigo_paro': codigos,
+                         'minutos': paros['minutos'] if 'minutos' in paros.columns else None},
+                        columns=COLUMNAS_PAROS_GUARDADOS)
+
+
+def nombrar_paros(paros):
+    """Agrega a los paros la causal y la subcausal de su código, con los nombres vigentes de la taxonomía."""
+    from taxonomia_paros import obtener_taxonomia
+    causales, subcausales = obtener_taxonomia().nombres(paros['codigo_paro'])
+    return paros.assign(causal=causales, subcausal=subcausales)
+
+
+def unir_paros(paros, registros):
+    """
+    Agrega a cada paro la fecha, turno y línea de su reporte y los nombres de su código;
+    descarta los paros de reportes reemplazados.
+    """
+    meta = registros[['report_id', 'fecha', 'turno', 'linea_produccion']]
+    # Los paros quedan en el orden de sus reportes y, dentro de cada reporte, en el que se capturaron.
+    # La lectura no escribe en la taxonomía: los pares que todavía no tiene se registran al
+    # guardar, compactar o convertir el historial
+    unidos = meta.merge(codificar_paros(paros, registrar_faltantes=False), on='report_id', how='inner')
+    return nombrar_paros(unidos)[COLUMNAS_PAROS_LEIDOS]
+
+
+def dimensiones_de(df):
+    """Años, meses y líneas presentes en un DataFrame de registros."""
+    if df.empty:
+        return {'años': [], 'meses': [], 'lineas': []}
+    fechas = pd.to_datetime(df['fecha'])
+    return {
+        'años': sorted(fechas.dt.year.unique().tolist()),
+        'meses': sorted(fechas.dt.month.unique().tolist()),
+        'lineas': sorted(df['linea_produccion'].dropna().unique().tolist()),
+    }
+
+
+def crear_almacenamiento(nombre, ruta=None):
+    """Construye un backend por nombre; `ruta` reemplaza el archivo por defecto."""
+    if nombre == 'csv':
+        from almacenamiento_csv import AlmacenamientoCSV
+        return AlmacenamientoCSV(ruta or REGISTROS_FILE)
+    if nombre == 'sqlite':
+        from almacenamiento_sqlite import SQLITE_FILE, AlmacenamientoSQLite
+        return AlmacenamientoSQLite(ruta or SQLITE_FILE)
+    if nombre == 'parquet':
+        from almacenamiento_parquet import PARQUET_DIR, AlmacenamientoParquet
+        return AlmacenamientoParquet(ruta or PARQUET_DIR)
+    raise ValueError(f"Backend de almacenamiento desconocido: '{nombre}'. Opciones: {', '.join(BACKENDS)}.")
+
+
+def obtener_almacenamiento():
+    """Backend configurado, compartido por todas las sesiones del proceso."""
+    nombre = os.environ.get('OEE_ALMACENAMIENTO', 'csv').lower()
+    ruta = os.environ.get(_VARIABLES_RUTA[nombre]) if nombre in _VARIABLES_RUTA else None
+    with _lock_backends:
+        if (nombre, ruta) not in _backends:
+            almacenamiento = crear_almacenamiento(nombre, ruta)
+            almacenamiento.inicializar()
+            _backends[(nombre, ruta)] = almacenamiento
+        return _backends[(nombre, ruta)]
+
+
+def obtener_cola_escritura():
+    """
+    Escritor único del backend configurado, compartido por todas las sesiones del proceso.
+    Cada lote escrito actualiza también el cubo de OEE y pide publicar la instantánea de los dashboards.
+    """
+    from cubo_oee import obtener_cubo
+    from instantanea import obtener_instantanea
+    almacenamiento = obtener_almacenamiento()
+    with _lock_backends:
+        if almacenamiento not in _colas:
+            _colas[almacenamiento] = ColaEscritura(almacenamiento, observadores=[
+                obtener_cubo().actualizar_al_guardar, obtener_instantanea().publicar_al_guardar])
+        return _colas[almacenamiento]
+
+
+# --- API usada por las aplicaciones ---
+def inicializar_almacenamiento():
+    """Prepara el almacenamiento configurado (crea el archivo o las tablas si no existen)."""
+    obtener_almacenamiento()
+
+
+def _preparar_lote(lote):
+    """
+    Asigna un report_id nuevo a cada reporte y lo propaga a sus paros, que pasan a llevar
+    el código de su causal y subcausal. Todo el lote se codifica de una vez.
+    """
+    reportes = [dict(reporte, report_id=nuevo_report_id()) for reporte, _ in lote]
+    filas = [{'report_id': reporte['report_id'], 'causal': p['causal'], 'subcausal': p['subcausal'], 'minutos': p['minutos']}
+             for reporte, (_, paros) in zip(reportes, lote) for p in paros]
+    codigos = iter([None if pd.isna(codigo) else int(codigo)
+                    for codigo in codificar_paros(pd.DataFrame(filas, columns=COLUMNAS_PAROS))['codigo_paro']])
+    return [(reporte, [{'report_id': reporte['report_id'], 'codigo_paro': next(codigos), 'minutos': p['minutos']}
+                       for p in paros])
+            for reporte, (_, paros) in zip(reportes, lote)]
+
+
+def guardar_reporte(reporte, paros=()):
+    """
+    Guarda el reporte y sus paros ({'causal', 'subcausal', 'minutos'}),
+    reemplazando el existente con la misma fecha, turno y línea.
+    Pasa por el escritor único y devuelve el report_id recién cuando el reporte quedó escrito.
+    """
+    return obtener_cola_escritura().guardar(*_preparar_lote([(reporte, paros)])[0])
+
+
+def guardar_reportes(lote):
+    """
+    Guarda una lista de (reporte, paros) en una sola escritura (upsert por fecha, turno y línea).
+    Devuelve los report_id asignados, en el mismo orden.
+    """
+    return obtener_cola_escritura().guardar_lote(_preparar_lote(lote))
+
+
+def buscar_reporte(fecha, turno, linea):
+    """Ubicación y versión del reporte vigente, o None si no existe."""
+    return obtener_almacenamiento().buscar(fecha, turno, linea)
+
+
+def existe_reporte(fecha, turno, linea):
+    """Indica si ya hay un reporte guardado para la fecha, turno y línea."""
+    return buscar_reporte(fecha, turno, linea) is not None
+
+
+def leer_registros(lineas=None, desde=None, hasta=None, columnas=None):
+    """
+    Devuelve los reportes vigentes como DataFrame.
+    Los filtros opcionales (líneas, rango de fechas inclusivo y columnas) los resuelve el backend.
+    """
+    return obtener_almacenamiento().leer(lineas=lineas, desde=desde, hasta=hasta, columnas=columnas)
+
+
+def leer_paros(lineas=None, desde=None, hasta=None):
+    """
+    Devuelve los paros de los reportes vigentes en formato largo, con la fecha, turno y línea de su
+    reporte: report_id, fecha, turno, linea_produccion, codigo_paro, causal, subcausal, minutos.
+    """
+    return obtener_almacenamiento().leer_paros(lineas=lineas, desde=desde, hasta=hasta)
+
+
+def version_de(almacenamiento):
+    """Versión de los datos de un backend, en el mismo formato que `version_registros`."""
+    return f"{almacenamiento.nombre}:{almacenamiento.version()}"
+
+
+def conservar_version(almacenamiento, antes, despues):
+    """
+    Avisa que la versión de los datos de un backend pasó de `antes` a `despues` (como las da
+    `version_de`) sin que cambiaran los datos, como en una compactación: el cubo y la
+    instantánea que correspondían a `antes` se vuelven a sellar en lugar de reconstruirse.
+    """
+    from cubo_oee import obtener_cubo
+    from instantanea import obtener_instantanea
+    for conservar in (obtener_cubo().conservar_version, obtener_instantanea().conservar_version):
+        try:
+            conservar(antes, despues)
+        except Exception:
+            # Queda desactualizado y se reconstruye como antes
+            pass
+
+
+def version_registros():
+    """
+    Identificador de la versión de los datos guardados: cambia con cada reporte guardado,
+    importación o compactación. Sirve de clave para los cachés de las aplicaciones.
+    """
+    return version_de(obtener_almacenamiento())
+
+
+def dimensiones_registros():
+    """Años, meses y líneas con reportes, sin cargar el historial completo cuando el backend lo permite."""
+    return obtener_almacenamiento().dimensiones()
+
+
+def compactar():
+    """Consolida las escrituras pendientes del backend configurado."""
+    return obtener_almacenamiento().compactar()
+
+
+def migrar(origen, destino, ruta_destino=None):
+    """Copia todos los reportes de un backend a otro, reemplazando el contenido del destino."""
+    fuente = crear_almacenamiento(origen)
+    fuente.inicializar()
+    registros = fuente.leer()
+    paros = fuente.leer_paros()[COLUMNAS_PAROS_GUARDADOS]
+    almacenamiento = crear_almacenamiento(destino, ruta_destino)
+    almacenamiento.inicializar()
+    return almacenamiento.importar(registros, paros)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento del almacenamiento de reportes OEE.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    subparsers.add_parser('compactar', help="Consolida las escrituras pendientes del backend configurado.")
+    parser_migrar = subparsers.add_parser('migrar', help="Copia todos los reportes de un backend a otro.")
+    parser_migrar.add_argument('--desde', choices=BACKENDS, default='csv')
+    parser_migrar.add_argument('--hacia', choices=BACKENDS, default='sqlite')
+    parser_migrar.add_argument('--ruta', help="Archivo de destino (por defecto el del backend).")
+    subparsers.add_parser('memoria', help="Memoria de los registros y paros cargados, sin tipar y con el esquema tipado.")
+    args = parser.parse_args()
+
+    if args.comando == 'compactar':
+        n = compactar()
+        print(f"{n} reportes pendientes consolidados.")
+    elif args.comando == 'migrar':
+        n = migrar(args.desde, args.hacia, args.ruta)
+        print(f"{n} reportes migrados de '{args.desde}' a '{args.hacia}'.")
+    elif args.comando == 'memoria':
+        from esquema import reporte_memoria, tipar_paros, tipar_registros
+        for nombre, df, tipar in (('registros', leer_registros(), tipar_registros), ('paros', leer_paros(), tipar_paros)):
+            sin_tipar = reporte_memoria(df)['mb'].iloc[-1]
+            reporte = reporte_memoria(tipar(df))
+            print(f"{nombre}: {len(df)} filas, {sin_tipar} MB sin tipar, {reporte['mb'].iloc[-1]} MB tipados")
+            print(reporte.to_string(index=False))
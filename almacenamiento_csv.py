@@ -0,0 +1,598 @@
+"""
+Almacenamiento de reportes en CSV con journal append-only.
+
+Los reportes nuevos (o de reemplazo) se agregan al final de un journal, de modo
+que guardar un turno cuesta una escritura de tamaño constante sin importar cuánto
+historial exista. Una compactación, bajo demanda o en segundo plano, consolida el
+journal en el CSV principal.
+
+Un índice en disco (fecha, turno, línea -> ubicación y versión) permite saber
+si un reporte existe sin recorrer los archivos.
+
+Los paros van en `registros_produccion.paros.csv` (y su propio journal), una fila
+por paro con el código de su causal y subcausal. Un CSV principal en el formato
+ancho anterior, o una tabla de paros con los nombres como texto, se siguen leyendo
+tal cual y la primera compactación los convierte.
+
+Entre compactaciones los archivos principales no cambian y los journals solo crecen,
+así que `leer_desde` puede devolver solo lo agregado desde una lectura anterior.
+"""
+import csv
+import io
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+from almacenamiento import (BloqueoArchivo, CLAVE_REPORTE, COLUMNAS_PAROS_GUARDADOS, COLUMNAS_PAROS_LEGADO, ENCABEZADO_REGISTROS,
+                            MAX_PAROS_LEGADO, REGISTROS_FILE, asegurar_report_id, codificar_paros, conservar_version,
+                            dimensiones_de, es_formato_ancho, filtrar_registros, nuevo_report_id, separar_paros,
+                            unir_paros, version_de)
+
+# Tamaño del journal a partir del cual se dispara la compactación en segundo plano
+UMBRAL_COMPACTACION_BYTES = 256 * 1024
+
+# Hasta dónde llegó una lectura de `leer_desde`: firmas de los archivos principales y, por journal,
+# su inodo, el byte leído y las filas leídas (las filas numeran los report_id que falten)
+MarcaLectura = namedtuple('MarcaLectura', ['base', 'journal', 'paros_journal'])
+PosicionJournal = namedtuple('PosicionJournal', ['inodo', 'fin', 'filas'])
+
+# Resultado de `leer_desde`; con completa=False, registros y paros son solo lo agregado desde la marca
+Lectura = namedtuple('Lectura', ['registros', 'paros', 'marca', 'completa'])
+
+
+def _clave(row):
+    return tuple(str(row[col]) for col in CLAVE_REPORTE)
+
+
+def _serie_clave(df):
+    return df[CLAVE_REPORTE].astype(str).agg('|'.join, axis=1)
+
+
+def _leer_encabezado(file_path):
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        with open(file_path, 'r', newline='', encoding='utf-8') as file:
+            return next(csv.reader(file), None)
+    return None
+
+
+def _escribir_entrada(file, clave, ubicacion):
+    csv.writer(file).writerow([*clave, *ubicacion])
+
+
+def _separar_fila(row):
+    """Versión por fila de `separar_paros`: devuelve (registro, paros) con un report_id definitivo."""
+    registro = {col: row.get(col) for col in ENCABEZADO_REGISTROS}
+    registro['report_id'] = registro['report_id'] or nuevo_report_id()
+    paros = []
+    for i in range(1, MAX_PAROS_LEGADO + 1):
+        causal, minutos = row.get(f'paro_causal_{i}'), row.get(f'tiempo_paro_min_{i}')
+        if causal and minutos:
+            paros.append({'report_id': registro['report_id'], 'causal': causal,
+                          'subcausal': row.get(f'paro_subcausal_{i}'), 'minutos': minutos})
+    return registro, paros
+
+
+def _leer_hasta(file_path, corte):
+    """Filas de un CSV append-only hasta un byte dado, junto con su línea de encabezado."""
+    if corte == 0:
+        return '', []
+    with open(file_path, 'rb') as file:
+        contenido = file.read(corte).decode('utf-8')
+    return contenido.splitlines(keepends=True)[0], list(csv.DictReader(contenido.splitlines()))
+
+
+def _recortar(file_path, corte, header):
+    """Descarta de un journal lo consolidado hasta `corte`, conservando lo agregado después."""
+    if corte == 0:
+        return
+    with open(file_path, 'rb') as file:
+        file.seek(corte)
+        resto = file.read()
+    if resto:
+        with open(file_path + '.tmp', 'wb') as file:
+            file.write(header.encode('utf-8') + resto)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file_path + '.tmp', file_path)
+    else:
+        os.remove(file_path)
+
+
+def _escribir_csv(file_path, header, rows):
+    with open(file_path + '.tmp', 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=header, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(file_path + '.tmp', file_path)
+
+
+def _agregar_csv(file_path, header, rows):
+    """
+    Agrega filas al final de un CSV (con encabezado si es nuevo) en una sola escritura.
+    Devuelve la lista de (posición, fin) en bytes de cada fila.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=header, extrasaction='ignore')
+    partes = []
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        writer.writeheader()
+    for row in rows:
+        partes.append(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(row)
+    partes.append(buffer.getvalue().encode('utf-8'))
+
+    with open(file_path, 'ab') as file:
+        inicio = file.tell()
+        file.write(b''.join(partes))
+        file.flush()
+        os.fsync(file.fileno())
+
+    # La primera parte es el encabezado (vacío si el archivo ya existía); cada una de las demás es una fila
+    ubicaciones = []
+    posicion = inicio + len(partes[0])
+    for parte in partes[1:]:
+        ubicaciones.append((posicion, posicion + len(parte)))
+        posicion += len(parte)
+    return ubicaciones
+
+
+def _tamaño(file_path):
+    return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+
+def _firma(file_path):
+    """(inodo, mtime, tamaño) del archivo, o None si no existe."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _continua(file_path, anterior):
+    """Indica si el journal es el mismo que se leyó hasta `anterior` y solo creció desde entonces."""
+    if anterior.inodo is None:
+        # No existía: todo lo que tenga ahora es nuevo
+        return True
+    firma = _firma(file_path)
+    return firma is not None and firma[0] == anterior.inodo and firma[2] >= anterior.fin
+
+
+def _cola_journal(file_path, posicion):
+    """
+    Encabezado y filas completas de un journal desde un byte (0: desde el principio).
+    Devuelve (encabezado, contenido, inodo, fin); sin journal, (b'', b'', None, 0).
+    """
+    try:
+        file = open(file_path, 'rb')
+    except FileNotFoundError:
+        return b'', b'', None, 0
+    with file:
+        encabezado = file.readline()
+        inicio = max(posicion, len(encabezado))
+        file.seek(inicio)
+        contenido = file.read()
+        inodo = os.fstat(file.fileno()).st_ino
+    contenido = contenido[:contenido.rfind(b'\n') + 1]
+    return encabezado, contenido, inodo, inicio + len(contenido)
+
+
+def _aplicar_journal(df, journal):
+    """Un reporte del journal reemplaza a los de `df` con la misma clave y, dentro del journal, gana la última escritura."""
+    if journal.empty:
+        return df
+    claves_journal = _serie_clave(journal)
+    journal = journal[~claves_journal.duplicated(keep='last')]
+    if not df.empty:
+        # Solo las filas de las fechas del journal pueden tener una de sus claves
+        reemplazadas = df['fecha'].astype(str).isin(journal['fecha'].astype(str)).to_numpy(copy=True)
+        if reemplazadas.any():
+            reemplazadas[reemplazadas] = _serie_clave(df[reemplazadas]).isin(claves_journal).to_numpy()
+            df = df[~reemplazadas]
+    return pd.concat([df, journal], ignore_index=True)
+
+
+class AlmacenamientoCSV:
+    """Reportes en `registros_produccion.csv` más su journal, su índice y la tabla de paros."""
+
+    nombre = 'csv'
+
+    def __init__(self, registros_file=REGISTROS_FILE):
+        base, _ = os.path.splitext(registros_file)
+        self.registros_file = registros_file
+        self.journal_file = base + '.journal.csv'
+        self.indice_file = base + '.idx.csv'
+        self.paros_file = base + '.paros.csv'
+        self.paros_journal_file = base + '.paros.journal.csv'
+        # Bloqueos también entre procesos: varias instancias de la app pueden compartir los archivos
+        self._lock_journal = BloqueoArchivo(base + '.lock')
+        self._lock_compactacion = BloqueoArchivo(base + '.compactacion.lock')
+        # Copia en memoria del índice, compartida por todas las sesiones del proceso
+        self._indice = {'claves': {}, 'firma': None, 'archivo': None, 'leido': 0, 'fin_journal': 0}
+
+    def inicializar(self):
+        """
+        Crea el archivo CSV de registros si no existe.
+        Asegura que el archivo tenga los encabezados correctos.
+        """
+        for file_path, header in ((self.registros_file, ENCABEZADO_REGISTROS), (self.paros_file, COLUMNAS_PAROS_GUARDADOS)):
+            if not os.path.exists(file_path):
+                with open(file_path, 'w', newline='', encoding='utf-8') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(header)
+
+    # --- Índice de claves ---
+    def _firma_registros(self):
+        """Identifica la versión del CSV principal a la que corresponde el índice."""
+        if not os.path.exists(self.registros_file):
+            return ''
+        stat = os.stat(self.registros_file)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _filas_journal(self, desde):
+        """Recorre el journal desde un byte dado devolviendo (posición, fin, fila)."""
+        with open(self.journal_file, 'rb') as file:
+            header = next(csv.reader([file.readline().decode('utf-8')]))
+            posicion = max(desde, file.tell())
+            file.seek(posicion)
+            for linea in file:
+                fin = posicion + len(linea)
+                if linea.endswith(b'\n'):
+                    yield posicion, fin, dict(zip(header, next(csv.reader([linea.decode('utf-8')]))))
+                posicion = fin
+
+    def _reconstruir_indice(self):
+        """Genera el índice desde cero a partir del CSV principal y el journal."""
+        previas = self._indice['claves']
+        claves = {}
+        if os.path.exists(self.registros_file):
+            with open(self.registros_file, 'r', newline='', encoding='utf-8') as file:
+                for n, row in enumerate(csv.DictReader(file)):
+                    clave = _clave(row)
+                    version = previas[clave][2] if clave in previas else 1
+                    claves[clave] = ('registros', n, version, '')
+        fin_journal = 0
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > 0:
+            for posicion, fin, row in self._filas_journal(0):
+                clave = _clave(row)
+                if clave in previas:
+                    version = previas[clave][2]
+                else:
+                    version = claves[clave][2] + 1 if clave in claves else 1
+                claves[clave] = ('journal', posicion, version, fin)
+                fin_journal = fin
+
+        firma = self._firma_registros()
+        with open(self.indice_file + '.tmp', 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerow(['#registros', firma])
+            for clave, ubicacion in claves.items():
+                _escribir_entrada(file, clave, ubicacion)
+        os.replace(self.indice_file + '.tmp', self.indice_file)
+
+        self._indice.update(claves=claves, firma=firma, archivo=os.stat(self.indice_file).st_ino,
+                            leido=os.path.getsize(self.indice_file), fin_journal=fin_journal)
+
+    def _refrescar_indice(self):
+        """
+        Pone al día la copia en memoria del índice.
+        Normalmente solo lee las entradas agregadas por otros procesos desde la última vez.
+        """
+        indice = self._indice
+        if not os.path.exists(self.indice_file):
+            self._reconstruir_indice()
+            return
+
+        stat = os.stat(self.indice_file)
+        if stat.st_ino != indice['archivo'] or stat.st_size < indice['leido']:
+            indice.update(claves={}, firma=None, archivo=stat.st_ino, leido=0, fin_journal=0)
+
+        if stat.st_size > indice['leido']:
+            with open(self.indice_file, 'rb') as file:
+                file.seek(indice['leido'])
+                contenido = file.read()
+            # Solo se consideran las líneas completas
+            completo = contenido[:contenido.rfind(b'\n') + 1]
+            for row in csv.reader(completo.decode('utf-8').splitlines()):
+                if row[0] == '#registros':
+                    indice['firma'] = row[1]
+                    continue
+                fecha, turno, linea, archivo, posicion, version, fin = row
+                indice['claves'][(fecha, turno, linea)] = (archivo, int(posicion), int(version), fin)
+                if fin:
+                    indice['fin_journal'] = max(indice['fin_journal'], int(fin))
+            indice['leido'] += len(completo)
+
+        # El CSV principal cambió por fuera del índice: no se puede confiar en las ubicaciones
+        if indice['firma'] != self._firma_registros():
+            self._reconstruir_indice()
+            return
+
+        # Reportes del journal que no alcanzaron a quedar en el índice
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > indice['fin_journal']:
+            for posicion, fin, row in self._filas_journal(indice['fin_journal']):
+                clave = _clave(row)
+                version = indice['claves'][clave][2] + 1 if clave in indice['claves'] else 1
+                indice['claves'][clave] = ('journal', posicion, version, fin)
+                indice['fin_journal'] = fin
+
+    def buscar(self, fecha, turno, linea):
+        """
+        Devuelve la ubicación del reporte vigente como (archivo, posición, versión),
+        o None si no existe. La posición es la fila en el CSV principal o el byte en el journal.
+        """
+        with self._lock_journal:
+            self._refrescar_indice()
+            ubicacion = self._indice['claves'].get((str(fecha), str(turno), str(linea)))
+        return ubicacion[:3] if ubicacion else None
+
+    # --- Escritura ---
+    def guardar(self, reporte, paros=()):
+        """
+        Agrega el reporte y sus paros al final de los journals y actualiza el índice.
+        Si ya existía un reporte con la misma clave, el nuevo lo reemplaza al leer o compactar.
+        """
+        self.guardar_lote([(reporte, paros)])
+
+    def guardar_lote(self, lote):
+        """
+        Guarda varios (reporte, paros) con una sola escritura y un solo fsync por archivo.
+        Dentro del lote, un reporte posterior con la misma clave reemplaza al anterior.
+        """
+        # Un journal escrito en un formato anterior (ancho, o paros con nombres) se consolida antes de usar el nuevo
+        if ('report_id' not in (_leer_encabezado(self.journal_file) or ['report_id'])
+                or (_leer_encabezado(self.paros_journal_file) or COLUMNAS_PAROS_GUARDADOS) != COLUMNAS_PAROS_GUARDADOS):
+            # Sin volver a sellar el cubo: el escritor lo tiene bloqueado mientras guarda este lote
+            self._compactar()
+
+        reportes = [reporte for reporte, _ in lote]
+        paros = [paro for _, paros_reporte in lote for paro in paros_reporte]
+        with self._lock_journal:
+            self._refrescar_indice()
+            # Primero los paros: si el proceso se interrumpe, quedan huérfanos y se ignoran al leer
+            if paros:
+                _agregar_csv(self.paros_journal_file, COLUMNAS_PAROS_GUARDADOS, paros)
+            ubicaciones = _agregar_csv(self.journal_file, ENCABEZADO_REGISTROS, reportes)
+
+            with open(self.indice_file, 'a', newline='', encoding='utf-8') as file:
+                for reporte, (posicion, fin) in zip(reportes, ubicaciones):
+                    clave = _clave(reporte)
+                    anterior = self._indice['claves'].get(clave)
+                    ubicacion = ('journal', posicion, anterior[2] + 1 if anterior else 1, fin)
+                    _escribir_entrada(file, clave, ubicacion)
+                    self._indice['claves'][clave] = ubicacion
+            self._indice['fin_journal'] = fin = ubicaciones[-1][1]
+
+        if fin >= UMBRAL_COMPACTACION_BYTES:
+            self.compactar_en_segundo_plano()
+
+    def compactar(self):
+        """
+        Consolida los journals en el CSV principal y en la tabla de paros.
+        Convierte al formato largo un CSV principal en formato ancho, y a códigos los paros
+        guardados con nombres. Las escrituras que llegan durante la compactación quedan en
+        el journal para la siguiente.
+
+        Los datos no cambian pero sí la versión (los archivos se reescriben): si nadie escribió
+        mientras tanto, el cubo y la instantánea de la versión anterior se vuelven a sellar con
+        la nueva en lugar de reconstruirse.
+        """
+        filas, antes, despues = self._compactar()
+        if despues is not None:
+            conservar_version(self, antes, despues)
+        return filas
+
+    def _compactar(self):
+        """
+        Compacta y devuelve (filas consolidadas, versión antes, versión después); la versión
+        después es None si no hubo nada que compactar o si llegaron escrituras durante la compactación.
+        """
+        with self._lock_compactacion:
+            with self._lock_journal:
+                antes = version_de(self)
+                corte = _tamaño(self.journal_file)
+                corte_paros = _tamaño(self.paros_journal_file)
+                formato_ancho = es_formato_ancho(_leer_encabezado(self.registros_file) or [])
+                paros_con_nombres = 'causal' in (_leer_encabezado(self.paros_file) or [])
+                if corte == 0 and corte_paros == 0 and not formato_ancho and not paros_con_nombres:
+                    return 0, antes, None
+
+            # Solo se consolida lo escrito hasta el corte; el journal nunca se modifica antes de él
+            journal_header, journal_rows = _leer_hasta(self.journal_file, corte)
+            paros_header, paros_journal = _leer_hasta(self.paros_journal_file, corte_paros)
+
+            # Reemplazar mueve el reporte al final, igual que una escritura nueva
+            nuevos = {}
+            paros = []
+            for row in journal_rows:
+                registro, paros_fila = _separar_fila(row)
+                paros.extend(paros_fila)
+                nuevos.pop(_clave(registro), None)
+                nuevos[_clave(registro)] = registro
+
+            reportes = []
+            if os.path.exists(self.registros_file):
+                with open(self.registros_file, 'r', newline='', encoding='utf-8') as file:
+                    for row in csv.DictReader(file):
+                        if _clave(row) in nuevos:
+                            continue
+                        registro, paros_fila = _separar_fila(row)
+                        paros.extend(paros_fila)
+                        reportes.append(registro)
+            reportes.extend(nuevos.values())
+
+            # Solo sobreviven los paros de reportes vigentes
+            if os.path.exists(self.paros_file):
+                with open(self.paros_file, 'r', newline='', encoding='utf-8') as file:
+                    paros.extend(csv.DictReader(file))
+            paros.extend(paros_journal)
+            vigentes = {registro['report_id'] for registro in reportes}
+            paros = [paro for paro in paros if paro['report_id'] in vigentes]
+            # Los paros de archivos anteriores (o del formato ancho) traen nombres en lugar de código
+            paros = codificar_paros(pd.DataFrame(paros)).astype(object)
+            paros = paros.where(paros.notna(), None).to_dict('records')
+
+            _escribir_csv(self.paros_file, COLUMNAS_PAROS_GUARDADOS, paros)
+            _escribir_csv(self.registros_file, ENCABEZADO_REGISTROS, reportes)
+
+            with self._lock_journal:
+                # Los datos son los mismos que en `antes` solo si no se agregó nada después del corte
+                sin_escrituras = (_tamaño(self.journal_file) == corte
+                                  and _tamaño(self.paros_journal_file) == corte_paros)
+                _recortar(self.journal_file, corte, journal_header)
+                _recortar(self.paros_journal_file, corte_paros, paros_header)
+                self._reconstruir_indice()
+                despues = version_de(self) if sin_escrituras else None
+
+            return len(journal_rows), antes, despues
+
+    def importar(self, registros, paros):
+        """Reemplaza todo el historial por los reportes y paros de los DataFrames."""
+        with self._lock_compactacion, self._lock_journal:
+            registros = asegurar_report_id(registros, 'L')
+            registros.reindex(columns=ENCABEZADO_REGISTROS).to_csv(self.registros_file + '.tmp', index=False, encoding='utf-8')
+            codificar_paros(paros).to_csv(self.paros_file + '.tmp', index=False, encoding='utf-8')
+            os.replace(self.paros_file + '.tmp', self.paros_file)
+            os.replace(self.registros_file + '.tmp', self.registros_file)
+            for file_path in (self.journal_file, self.paros_journal_file):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            self._reconstruir_indice()
+        return len(registros)
+
+    def compactar_en_segundo_plano(self):
+        """Lanza la compactación en un hilo, salvo que ya haya una en curso."""
+        if self._lock_compactacion.locked():
+            return
+        threading.Thread(target=self.compactar, name='compactacion-registros', daemon=True).start()
+
+    # --- Lectura ---
+    def _archivos_registros(self):
+        """CSV principal y journal, con el prefijo de report_id para sus filas en formato ancho."""
+        return ((self.registros_file, 'L'), (self.journal_file, 'J'))
+
+    def leer(self, lineas=None, desde=None, hasta=None, columnas=None):
+        """
+        Devuelve los reportes vigentes como DataFrame.
+        Combina el CSV principal con el journal; un reporte del journal reemplaza
+        a los del CSV con la misma clave y, dentro del journal, gana la última escritura.
+        """
+        legado = set(COLUMNAS_PAROS_LEGADO)
+        necesarias = set(columnas) | set(CLAVE_REPORTE) | {'report_id'} if columnas is not None else None
+        usecols = lambda c: c not in legado and (necesarias is None or c in necesarias)
+
+        partes = []
+        for file_path, prefijo in self._archivos_registros():
+            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                partes.append(asegurar_report_id(pd.read_csv(file_path, usecols=usecols), prefijo))
+            else:
+                partes.append(pd.DataFrame())
+        df = _aplicar_journal(*partes)
+
+        df = filtrar_registros(df, lineas, desde, hasta)
+        if columnas is not None and not df.empty:
+            df = df[[c for c in columnas if c in df.columns]]
+        return df
+
+    def leer_paros(self, lineas=None, desde=None, hasta=None):
+        """Paros de los reportes vigentes en formato largo, con fecha, turno y línea."""
+        registros = self.leer(lineas, desde, hasta, columnas=['report_id', 'fecha', 'turno', 'linea_produccion'])
+        legado = set(COLUMNAS_PAROS_LEGADO)
+
+        partes = []
+        for file_path, prefijo in self._archivos_registros():
+            if es_formato_ancho(_leer_encabezado(file_path) or []):
+                ancho = pd.read_csv(file_path, usecols=lambda c: c in legado or c == 'report_id')
+                partes.append(separar_paros(ancho, prefijo)[1])
+        for file_path in (self.paros_file, self.paros_journal_file):
+            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                partes.append(pd.read_csv(file_path))
+
+        paros = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUMNAS_PAROS_GUARDADOS)
+        if registros.empty:
+            registros = pd.DataFrame(columns=['report_id', 'fecha', 'turno', 'linea_produccion'])
+        return unir_paros(paros, registros)
+
+    def _leer_base(self):
+        """Reportes y paros (sin unir) del CSV principal y de la tabla de paros, en cualquiera de sus formatos."""
+        registros, paros = pd.DataFrame(), []
+        if _tamaño(self.registros_file) > 0:
+            df = pd.read_csv(self.registros_file)
+            if es_formato_ancho(df.columns):
+                registros, paros_ancho = separar_paros(df, 'L')
+                paros.append(paros_ancho)
+            else:
+                registros = asegurar_report_id(df, 'L')
+        if _tamaño(self.paros_file) > 0:
+            paros.append(pd.read_csv(self.paros_file))
+        return registros, paros
+
+    def leer_desde(self, marca=None):
+        """
+        Lectura incremental, para quien conserva el historial en memoria (`lectura_incremental`).
+        Con la marca de la lectura anterior devuelve solo los reportes agregados al journal desde
+        entonces, con sus paros, y completa=False: el costo es proporcional a lo nuevo. Sin marca,
+        o si los archivos se reescribieron (compactación, importación), devuelve todo con
+        completa=True. Devuelve None si el journal está en el formato ancho (se lee con `leer`).
+        """
+        archivos = (self.journal_file, self.paros_journal_file)
+        while True:
+            base = (_firma(self.registros_file), _firma(self.paros_file))
+            completa = marca is None or marca.base != base
+            with self._lock_journal:
+                # Una compactación cambió los archivos principales entre las dos firmas
+                if (_firma(self.registros_file), _firma(self.paros_file)) != base:
+                    continue
+                anteriores = (PosicionJournal(None, 0, 0),) * 2 if marca is None else (marca.journal, marca.paros_journal)
+                completa = completa or not all(_continua(f, a) for f, a in zip(archivos, anteriores))
+                if completa:
+                    anteriores = (PosicionJournal(None, 0, 0),) * 2
+                # Con el bloqueo tomado no hay paros agregados sin su reporte
+                colas = [_cola_journal(f, a.fin) for f, a in zip(archivos, anteriores)]
+
+            registros, paros = pd.DataFrame(), []
+            if completa:
+                registros, paros = self._leer_base()
+                if (_firma(self.registros_file), _firma(self.paros_file)) != base:
+                    continue
+            break
+
+        (encabezado, contenido, inodo, fin), (encabezado_paros, contenido_paros, inodo_paros, fin_paros) = colas
+        if es_formato_ancho(next(csv.reader([encabezado.decode('utf-8')]), [])):
+            return None
+        legado = set(COLUMNAS_PAROS_LEGADO)
+        journal = pd.DataFrame()
+        if contenido:
+            journal = pd.read_csv(io.BytesIO(encabezado + contenido), usecols=lambda c: c not in legado)
+            journal = asegurar_report_id(journal, 'J', inicio=anteriores[0].filas)
+        paros_journal = pd.DataFrame(columns=COLUMNAS_PAROS_GUARDADOS)
+        if contenido_paros:
+            paros_journal = pd.read_csv(io.BytesIO(encabezado_paros + contenido_paros))
+            paros.append(paros_journal)
+
+        registros = _aplicar_journal(registros, journal)
+        paros = pd.concat(paros, ignore_index=True) if paros else pd.DataFrame(columns=COLUMNAS_PAROS_GUARDADOS)
+        meta = registros if not registros.empty else pd.DataFrame(columns=['report_id', 'fecha', 'turno', 'linea_produccion'])
+        marca = MarcaLectura(base, PosicionJournal(inodo, fin, anteriores[0].filas + len(journal)),
+                             PosicionJournal(inodo_paros, fin_paros, anteriores[1].filas + len(paros_journal)))
+        return Lectura(registros.reset_index(drop=True), unir_paros(paros, meta), marca, completa)
+
+    def version(self):
+        """Versión de los datos: cambia cuando cambia el CSV principal o crece el journal."""
+        partes = []
+        for file_path in (self.registros_file, self.journal_file, self.paros_file, self.paros_journal_file):
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                partes.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+            else:
+                partes.append('')
+        return '|'.join(partes)
+
+    def dimensiones(self):
+        """Años, meses y líneas con reportes, para poblar los selectores."""
+        return dimensiones_de(self.leer(columnas=['fecha', 'linea_produccion']))
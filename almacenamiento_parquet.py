@@ -0,0 +1,299 @@
+"""
+Almacenamiento de reportes en Parquet particionado por año, mes y línea.
+
+Cada partición (`año=2025/mes=3/linea_produccion=A/datos.parquet`) contiene los
+turnos de una línea en un mes. Las lecturas abren solo las particiones del rango
+pedido y solo las columnas pedidas, así que el costo crece con la selección y no
+con el historial. Guardar un reporte reescribe únicamente su partición.
+
+Los reportes van en `registros/` y sus paros, una fila por paro con el código de su
+causal y subcausal, en `paros/`, con las mismas particiones. Un directorio con el
+formato ancho anterior (particiones en la raíz y columnas paro_*), o con particiones
+de paros con los nombres como texto, se convierte al inicializar.
+"""
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = None
+
+from almacenamiento import (BloqueoArchivo, COLUMNAS_PAROS_GUARDADOS, ENCABEZADO_REGISTROS, codificar_paros,
+                            fecha_iso, nuevo_report_id, separar_paros, unir_paros)
+
+PARQUET_DIR = 'registros_parquet'
+ARCHIVO_PARTICION = 'datos.parquet'
+ARCHIVO_VERSION = '_version'
+
+# Los paros llevan la fecha de su reporte para poder filtrarlos sin cruzar con los registros
+COLUMNAS_PAROS_PARQUET = ['report_id', 'fecha', 'codigo_paro', 'minutos']
+
+_COLUMNAS_TEXTO = {'report_id', 'fecha', 'supervisor', 'linea_produccion', 'producto_terminado'}
+
+
+def _es_texto(col):
+    return col in _COLUMNAS_TEXTO or col.startswith('paro_')
+
+
+def _esquema(tabla='registros'):
+    """Esquema de los archivos; la línea va en la ruta de la partición."""
+    if tabla == 'paros':
+        columnas = COLUMNAS_PAROS_PARQUET
+    else:
+        columnas = [col for col in ENCABEZADO_REGISTROS if col != 'linea_produccion'] + ['version']
+    return pa.schema([pa.field(col, pa.string() if _es_texto(col) else pa.int64()) for col in columnas])
+
+
+def _esquema_particion():
+    return pa.schema([pa.field('año', pa.int32()), pa.field('mes', pa.int32()),
+                      pa.field('linea_produccion', pa.string())])
+
+
+def _normalizar(df, columnas=ENCABEZADO_REGISTROS + ['version']):
+    """Convierte los tipos del DataFrame a los del esquema (vacíos como nulos)."""
+    df = df.copy()
+    for col in columnas:
+        if col not in df.columns:
+            df[col] = None
+        if col == 'linea_produccion':
+            continue
+        if _es_texto(col):
+            df[col] = df[col].where(df[col].notna() & (df[col].astype(str) != ''), None)
+            df[col] = df[col].map(lambda v: None if v is None else str(v)).astype(object)
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+    return df
+
+
+class AlmacenamientoParquet:
+    """Reportes y paros en un directorio Parquet con particiones hive año/mes/línea."""
+
+    nombre = 'parquet'
+
+    def __init__(self, directorio=PARQUET_DIR):
+        if pa is None:
+            raise ImportError("El backend 'parquet' requiere pyarrow: pip install pyarrow")
+        self.directorio = directorio
+        self._lock = BloqueoArchivo(directorio + '.lock')
+
+    def inicializar(self):
+        os.makedirs(os.path.join(self.directorio, 'registros'), exist_ok=True)
+        if self._particiones(tabla=None):
+            self._convertir_legado()
+        self._codificar_paros()
+
+    def _convertir_legado(self):
+        """Reescribe un directorio del formato ancho en las tablas registros y paros."""
+        partes = []
+        for año, mes, linea, ruta in self._particiones(tabla=None):
+            parte = pq.ParquetFile(ruta).read().to_pandas()
+            parte['linea_produccion'] = linea
+            partes.append(parte)
+        legado = pd.concat(partes, ignore_index=True).sort_values('fecha', kind='stable')
+        self.importar(*separar_paros(legado.reset_index(drop=True), 'L'))
+
+    def _codificar_paros(self):
+        """Reescribe con el código de su causal y subcausal las particiones de paros que guardan los nombres."""
+        with self._lock:
+            convertidas = 0
+            for _, _, _, ruta in self._particiones('paros'):
+                if 'codigo_paro' in pq.read_schema(ruta).names:
+                    continue
+                paros = pq.ParquetFile(ruta).read().to_pandas()
+                codificados = codificar_paros(paros).assign(fecha=paros['fecha'])
+                self._escribir_particion(ruta, _normalizar(codificados, COLUMNAS_PAROS_PARQUET), 'paros')
+                convertidas += 1
+            if convertidas:
+                self._marcar_version()
+
+    def _ruta_particion(self, año, mes, linea, tabla='registros'):
+        return os.path.join(self.directorio, tabla, f'año={año}', f'mes={mes}', f'linea_produccion={linea}',
+                            ARCHIVO_PARTICION)
+
+    def _ruta_reporte(self, fecha, linea, tabla='registros'):
+        fecha = pd.Timestamp(fecha)
+        return self._ruta_particion(fecha.year, fecha.month, linea, tabla)
+
+    def _particiones(self, tabla='registros'):
+        """
+        Lista (año, mes, línea, ruta) recorriendo solo los directorios.
+        Con `tabla=None` lista las particiones del formato anterior, en la raíz.
+        """
+        particiones = []
+        raiz = os.path.join(self.directorio, tabla) if tabla else self.directorio
+        if not os.path.isdir(raiz):
+            return particiones
+        for dir_año in os.scandir(raiz):
+            if not dir_año.name.startswith('año='):
+                continue
+            for dir_mes in os.scandir(dir_año.path):
+                if not dir_mes.name.startswith('mes='):
+                    continue
+                for dir_linea in os.scandir(dir_mes.path):
+                    ruta = os.path.join(dir_linea.path, ARCHIVO_PARTICION)
+                    if dir_linea.name.startswith('linea_produccion=') and os.path.exists(ruta):
+                        particiones.append((int(dir_año.name[4:]), int(dir_mes.name[4:]),
+                                            dir_linea.name[len('linea_produccion='):], ruta))
+        return particiones
+
+    def _leer_particion(self, ruta, tabla='registros'):
+        if not os.path.exists(ruta):
+            return pd.DataFrame(columns=_esquema(tabla).names)
+        return pq.ParquetFile(ruta).read().to_pandas()
+
+    def _escribir_particion(self, ruta, df, tabla='registros'):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tabla_arrow = pa.Table.from_pandas(df[_esquema(tabla).names], schema=_esquema(tabla), preserve_index=False)
+        pq.write_table(tabla_arrow, ruta + '.tmp')
+        os.replace(ruta + '.tmp', ruta)
+
+    def _marcar_version(self):
+        """Registra una versión nueva de los datos (para invalidar cachés)."""
+        ruta = os.path.join(self.directorio, ARCHIVO_VERSION)
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(nuevo_report_id())
+        os.replace(ruta + '.tmp', ruta)
+
+    def version(self):
+        """Versión de los datos; cambia con cada escritura."""
+        ruta = os.path.join(self.directorio, ARCHIVO_VERSION)
+        if not os.path.exists(ruta):
+            return ''
+        with open(ruta, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def _coincide(self, df, fecha, turno):
+        return (df['fecha'] == str(fecha)) & (df['turno'].astype(str) == str(turno))
+
+    def buscar(self, fecha, turno, linea):
+        """Devuelve ('parquet', ruta de la partición, versión) del reporte vigente, o None."""
+        ruta = self._ruta_reporte(fecha, linea)
+        df = self._leer_particion(ruta)
+        coincidencias = df[self._coincide(df, fecha, turno)]
+        if coincidencias.empty:
+            return None
+        return ('parquet', ruta, int(coincidencias['version'].fillna(1).max()))
+
+    def guardar(self, reporte, paros=()):
+        """Reemplaza el reporte con la misma fecha, turno y línea reescribiendo solo sus particiones."""
+        self.guardar_lote([(reporte, paros)])
+
+    def guardar_lote(self, lote):
+        """Guarda varios (reporte, paros) reescribiendo una sola vez cada partición afectada."""
+        por_particion = {}
+        for reporte, paros in lote:
+            fecha, linea = reporte['fecha'], reporte['linea_produccion']
+            por_particion.setdefault((self._ruta_reporte(fecha, linea), self._ruta_reporte(fecha, linea, 'paros')),
+                                     []).append((reporte, paros))
+
+        with self._lock:
+            for (ruta, ruta_paros), reportes in por_particion.items():
+                df = self._leer_particion(ruta)
+                df_paros = self._leer_particion(ruta_paros, 'paros')
+                for reporte, paros in reportes:
+                    anteriores = self._coincide(df, reporte['fecha'], reporte['turno'])
+                    version = int(df.loc[anteriores, 'version'].fillna(1).max()) + 1 if anteriores.any() else 1
+                    df_paros = df_paros[~df_paros['report_id'].isin(df.loc[anteriores, 'report_id'])]
+                    nuevos_paros = _normalizar(pd.DataFrame([dict(paro, fecha=reporte['fecha']) for paro in paros],
+                                                            columns=COLUMNAS_PAROS_PARQUET), COLUMNAS_PAROS_PARQUET)
+                    df_paros = pd.concat([df_paros, nuevos_paros], ignore_index=True)
+                    nuevo = _normalizar(pd.DataFrame([dict(reporte, version=version)]))
+                    df = pd.concat([df[~anteriores], nuevo[_esquema().names]], ignore_index=True)
+
+                # Primero los paros: si el proceso se interrumpe, quedan huérfanos y se ignoran al leer
+                if not df_paros.empty or os.path.exists(ruta_paros):
+                    self._escribir_particion(ruta_paros, _normalizar(df_paros, COLUMNAS_PAROS_PARQUET), 'paros')
+                self._escribir_particion(ruta, _normalizar(df))
+            self._marcar_version()
+
+    def importar(self, registros, paros):
+        """Reemplaza todo el contenido por los reportes y paros de los DataFrames, partición por partición."""
+        registros = _normalizar(registros)
+        registros['version'] = registros['version'].fillna(1)
+        fechas = pd.to_datetime(registros['fecha'])
+        # Cada paro va a la partición de su reporte
+        paros = codificar_paros(paros).merge(registros[['report_id', 'fecha', 'linea_produccion']], on='report_id')
+        paros = _normalizar(paros, COLUMNAS_PAROS_PARQUET)
+        fechas_paros = pd.to_datetime(paros['fecha'])
+
+        tmp_dir = self.directorio + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        destino = AlmacenamientoParquet(tmp_dir)
+        os.makedirs(os.path.join(tmp_dir, 'registros'))
+        for (año, mes, linea), grupo in registros.groupby([fechas.dt.year, fechas.dt.month, 'linea_produccion'], sort=False):
+            destino._escribir_particion(destino._ruta_particion(año, mes, linea), grupo)
+        for (año, mes, linea), grupo in paros.groupby([fechas_paros.dt.year, fechas_paros.dt.month, 'linea_produccion'],
+                                                      sort=False):
+            destino._escribir_particion(destino._ruta_particion(año, mes, linea, 'paros'), grupo, 'paros')
+        destino._marcar_version()
+        with self._lock:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+            os.replace(tmp_dir, self.directorio)
+        return len(registros)
+
+    def compactar(self):
+        """Las particiones se reescriben al guardar; no hay escrituras pendientes."""
+        return 0
+
+    def _dataset(self, tabla, lineas, desde, hasta):
+        """Dataset con solo las particiones de las líneas y meses pedidos, o None si no hay ninguna."""
+        mes_desde = pd.Timestamp(desde).year * 100 + pd.Timestamp(desde).month if desde is not None else None
+        mes_hasta = pd.Timestamp(hasta).year * 100 + pd.Timestamp(hasta).month if hasta is not None else None
+        archivos = [
+            ruta for año, mes, linea, ruta in self._particiones(tabla)
+            if (lineas is None or linea in lineas)
+            and (mes_desde is None or año * 100 + mes >= mes_desde)
+            and (mes_hasta is None or año * 100 + mes <= mes_hasta)
+        ]
+        if not archivos:
+            return None
+        return ds.dataset(
+            sorted(archivos), schema=pa.unify_schemas([_esquema(tabla), _esquema_particion()]), format='parquet',
+            partitioning=ds.partitioning(_esquema_particion(), flavor='hive'),
+            partition_base_dir=os.path.join(self.directorio, tabla)
+        )
+
+    def _filtro_fechas(self, desde, hasta):
+        filtro = None
+        if desde is not None:
+            filtro = ds.field('fecha') >= fecha_iso(desde)
+        if hasta is not None:
+            condicion = ds.field('fecha') <= fecha_iso(hasta)
+            filtro = condicion if filtro is None else filtro & condicion
+        return filtro
+
+    def leer(self, lineas=None, desde=None, hasta=None, columnas=None):
+        """Lee solo las particiones del rango y las columnas pedidas."""
+        columnas = list(columnas) if columnas is not None else list(ENCABEZADO_REGISTROS)
+        dataset = self._dataset('registros', lineas, desde, hasta)
+        if dataset is None:
+            return pd.DataFrame(columns=columnas)
+
+        lectura = list(dict.fromkeys(columnas + ['fecha']))
+        df = dataset.to_table(columns=lectura, filter=self._filtro_fechas(desde, hasta)).to_pandas()
+        df = df.sort_values('fecha', kind='stable').reset_index(drop=True)
+        return df[columnas]
+
+    def leer_paros(self, lineas=None, desde=None, hasta=None):
+        """Paros de los reportes vigentes, leyendo solo las particiones del rango."""
+        registros = self.leer(lineas, desde, hasta, columnas=['report_id', 'fecha', 'turno', 'linea_produccion'])
+        dataset = self._dataset('paros', lineas, desde, hasta)
+        if dataset is None:
+            paros = pd.DataFrame(columns=COLUMNAS_PAROS_GUARDADOS)
+        else:
+            paros = dataset.to_table(columns=COLUMNAS_PAROS_GUARDADOS, filter=self._filtro_fechas(desde, hasta)).to_pandas()
+        return unir_paros(paros, registros)
+
+    def dimensiones(self):
+        """Años, meses y líneas a partir de los nombres de las particiones, sin abrir archivos."""
+        particiones = self._particiones()
+        return {
+            'años': sorted({año for año, _, _, _ in particiones}),
+            'meses': sorted({mes for _, mes, _, _ in particiones}),
+            'lineas': sorted({linea for _, _, linea, _ in particiones}),
+        }
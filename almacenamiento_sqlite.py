@@ -0,0 +1,286 @@
+"""
+Almacenamiento de reportes en SQLite (modo WAL).
+
+Pensado para varias tabletas de captura escribiendo a la vez mientras el
+dashboard lee: en modo WAL los lectores no bloquean a los escritores, cada
+reemplazo de reporte es una transacción y las consultas por línea y rango de
+fechas usan índices.
+
+Los paros van en la tabla `paros`, una fila por paro enlazada por report_id y con
+el código de su causal y subcausal. Una base creada con las columnas paro_* del
+formato anterior, o con los nombres de causal y subcausal en `paros`, se convierte
+al abrirla.
+"""
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import (CLAVE_REPORTE, COLUMNAS_PAROS_GUARDADOS, COLUMNAS_PAROS_LEIDOS, ENCABEZADO_REGISTROS,
+                            codificar_paros, es_formato_ancho, fecha_iso, nombrar_paros, nuevo_report_id, separar_paros)
+
+SQLITE_FILE = 'registros_produccion.db'
+
+_TIPOS_COLUMNA = {
+    'report_id': 'TEXT NOT NULL',
+    'fecha': 'TEXT NOT NULL',
+    'turno': 'INTEGER NOT NULL',
+    'supervisor': 'TEXT',
+    'linea_produccion': 'TEXT NOT NULL',
+    'producto_terminado': 'TEXT',
+}
+
+_CREAR_PAROS = """
+    CREATE TABLE IF NOT EXISTS paros (
+        id INTEGER PRIMARY KEY,
+        report_id TEXT NOT NULL,
+        codigo_paro INTEGER NOT NULL,
+        minutos INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_paros_report_id ON paros (report_id);
+"""
+
+
+def _tipo_columna(col):
+    if col in _TIPOS_COLUMNA:
+        return _TIPOS_COLUMNA[col]
+    return 'INTEGER'
+
+
+def _valor(v):
+    """Los campos vacíos del formulario se guardan como NULL."""
+    if v is None or (isinstance(v, str) and v == ''):
+        return None
+    if not isinstance(v, str) and pd.isna(v):
+        return None
+    # sqlite3 no adapta los escalares de numpy (los de las columnas Int64, por ejemplo)
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+def _incrementar_version(conn):
+    """Cada transacción que modifica reportes cambia la versión de los datos (para invalidar cachés)."""
+    conn.execute("UPDATE estado SET valor = valor + 1 WHERE clave = 'version'")
+
+
+class AlmacenamientoSQLite:
+    """Reportes en una base SQLite con índices por fecha, línea, turno y supervisor."""
+
+    nombre = 'sqlite'
+
+    def __init__(self, db_file=SQLITE_FILE):
+        self.db_file = db_file
+        self._local = threading.local()
+
+    def _conexion(self):
+        # sqlite3 no comparte conexiones entre hilos; cada sesión de Streamlit usa la suya
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def inicializar(self):
+        """Crea las tablas de registros y paros con sus índices si no existen."""
+        columnas = ',\n    '.join(f'{col} {_tipo_columna(col)}' for col in ENCABEZADO_REGISTROS)
+        conn = self._conexion()
+        existentes = [row[1] for row in conn.execute("PRAGMA table_info(registros)")]
+        if es_formato_ancho(existentes):
+            conn.execute("ALTER TABLE registros RENAME TO registros_legado")
+            # Los índices conservan su nombre tras el RENAME; se liberan para la tabla nueva
+            indices = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'registros_legado' AND sql IS NOT NULL"
+            ).fetchall()
+            for (nombre,) in indices:
+                conn.execute(f"DROP INDEX {nombre}")
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS registros (
+                id INTEGER PRIMARY KEY,
+                {columnas},
+                version INTEGER NOT NULL DEFAULT 1
+            );
+            {_CREAR_PAROS}
+            CREATE INDEX IF NOT EXISTS idx_registros_clave ON registros (fecha, turno, linea_produccion);
+            CREATE INDEX IF NOT EXISTS idx_registros_linea_fecha ON registros (linea_produccion, fecha);
+            CREATE INDEX IF NOT EXISTS idx_registros_turno ON registros (turno);
+            CREATE INDEX IF NOT EXISTS idx_registros_supervisor ON registros (supervisor);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_registros_report_id ON registros (report_id);
+            CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+            INSERT OR IGNORE INTO estado (clave, valor) VALUES ('version', 0);
+        """)
+        if 'causal' in [row[1] for row in conn.execute("PRAGMA table_info(paros)")]:
+            self._codificar_paros()
+        # También retoma una conversión interrumpida
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'registros_legado'").fetchone():
+            self._convertir_legado()
+
+    def _convertir_legado(self):
+        """Pasa los reportes de la tabla con columnas paro_* a las tablas registros y paros."""
+        conn = self._conexion()
+        legado = pd.read_sql_query("SELECT * FROM registros_legado ORDER BY id", conn)
+        # Prefijo único para no chocar con los ids de otra conversión
+        registros, paros = separar_paros(legado.drop(columns=['id']), f'{nuevo_report_id()[:8]}-')
+        paros = codificar_paros(paros)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insertar(conn, registros, paros)
+            conn.execute("DROP TABLE registros_legado")
+            _incrementar_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _codificar_paros(self):
+        """Reemplaza la tabla de paros con nombres de causal y subcausal por una con sus códigos."""
+        conn = self._conexion()
+        paros = pd.read_sql_query("SELECT id, report_id, causal, subcausal, minutos FROM paros ORDER BY id", conn)
+        # Se codifica antes de la transacción: la taxonomía puede tener que agregar pares
+        codificados = codificar_paros(paros).assign(id=paros['id'])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Otro proceso pudo haberla convertido mientras tanto
+            if 'causal' not in [row[1] for row in conn.execute("PRAGMA table_info(paros)")]:
+                conn.execute("COMMIT")
+                return
+            conn.execute("ALTER TABLE paros RENAME TO paros_con_nombres")
+            conn.execute("DROP INDEX IF EXISTS idx_paros_report_id")
+            for sentencia in _CREAR_PAROS.split(';'):
+                if sentencia.strip():
+                    conn.execute(sentencia)
+            columnas = ['id'] + COLUMNAS_PAROS_GUARDADOS
+            conn.executemany(
+                f"INSERT INTO paros ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+                [[_valor(v) for v in row] for row in codificados[columnas].itertuples(index=False, name=None)]
+            )
+            conn.execute("DROP TABLE paros_con_nombres")
+            _incrementar_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _insertar(self, conn, registros, paros):
+        columnas = [col for col in ENCABEZADO_REGISTROS + ['version'] if col in registros.columns]
+        conn.executemany(
+            f"INSERT INTO registros ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+            [[_valor(v) for v in row] for row in registros[columnas].itertuples(index=False, name=None)]
+        )
+        conn.executemany(
+            f"INSERT INTO paros ({', '.join(COLUMNAS_PAROS_GUARDADOS)}) VALUES ({', '.join('?' * len(COLUMNAS_PAROS_GUARDADOS))})",
+            [[_valor(v) for v in row] for row in paros[COLUMNAS_PAROS_GUARDADOS].itertuples(index=False, name=None)]
+        )
+
+    def buscar(self, fecha, turno, linea):
+        """Devuelve ('registros', id, versión) del reporte vigente, o None si no existe."""
+        row = self._conexion().execute(
+            "SELECT id, version FROM registros WHERE fecha = ? AND turno = ? AND linea_produccion = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (str(fecha), str(turno), str(linea))
+        ).fetchone()
+        return ('registros', row[0], row[1]) if row else None
+
+    def guardar(self, reporte, paros=()):
+        """Reemplaza, en una sola transacción, los reportes con la misma fecha, turno y línea y sus paros."""
+        self.guardar_lote([(reporte, paros)])
+
+    def guardar_lote(self, lote):
+        """Guarda varios (reporte, paros) en una sola transacción, es decir, con un solo commit."""
+        condicion = ' AND '.join(f'{col} = ?' for col in CLAVE_REPORTE)
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for reporte, paros in lote:
+                clave = tuple(str(reporte[col]) for col in CLAVE_REPORTE)
+                columnas = [col for col in ENCABEZADO_REGISTROS if col in reporte]
+                version = conn.execute(f"SELECT MAX(version) FROM registros WHERE {condicion}", clave).fetchone()[0]
+                conn.execute(f"DELETE FROM paros WHERE report_id IN (SELECT report_id FROM registros WHERE {condicion})", clave)
+                conn.execute(f"DELETE FROM registros WHERE {condicion}", clave)
+                conn.execute(
+                    f"INSERT INTO registros ({', '.join(columnas)}, version) VALUES ({', '.join('?' * len(columnas))}, ?)",
+                    [_valor(reporte[col]) for col in columnas] + [(version or 0) + 1]
+                )
+                conn.executemany(
+                    f"INSERT INTO paros ({', '.join(COLUMNAS_PAROS_GUARDADOS)}) VALUES ({', '.join('?' * len(COLUMNAS_PAROS_GUARDADOS))})",
+                    [[_valor(paro[col]) for col in COLUMNAS_PAROS_GUARDADOS] for paro in paros]
+                )
+            _incrementar_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def importar(self, registros, paros):
+        """Reemplaza todo el contenido de las tablas por los reportes y paros de los DataFrames."""
+        conn = self._conexion()
+        paros = codificar_paros(paros)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM paros")
+            conn.execute("DELETE FROM registros")
+            self._insertar(conn, registros, paros)
+            _incrementar_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(registros)
+
+    def compactar(self):
+        """Vuelca el WAL a la base principal."""
+        self._conexion().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return 0
+
+    def _filtro(self, lineas, desde, hasta):
+        """Cláusula WHERE (sobre la tabla `r`) y parámetros para línea y rango de fechas."""
+        condiciones, parametros = [], []
+        if lineas is not None:
+            lineas = list(lineas)
+            condiciones.append(f"r.linea_produccion IN ({', '.join('?' * len(lineas))})")
+            parametros.extend(lineas)
+        if desde is not None:
+            condiciones.append("r.fecha >= ?")
+            parametros.append(fecha_iso(desde))
+        if hasta is not None:
+            condiciones.append("r.fecha <= ?")
+            parametros.append(fecha_iso(hasta))
+        return (f" WHERE {' AND '.join(condiciones)}" if condiciones else ''), parametros
+
+    def leer(self, lineas=None, desde=None, hasta=None, columnas=None):
+        """Devuelve los reportes filtrando por línea y rango de fechas en la propia consulta."""
+        where, parametros = self._filtro(lineas, desde, hasta)
+        select = ', '.join(columnas if columnas is not None else ENCABEZADO_REGISTROS)
+        return pd.read_sql_query(f"SELECT {select} FROM registros r{where} ORDER BY r.id", self._conexion(), params=parametros)
+
+    def leer_paros(self, lineas=None, desde=None, hasta=None):
+        """Paros de los reportes vigentes, filtrados por la línea y la fecha de su reporte."""
+        where, parametros = self._filtro(lineas, desde, hasta)
+        # Los nombres de causal y subcausal salen de la taxonomía, no de la base
+        select = ', '.join(f"{'r' if col in CLAVE_REPORTE else 'p'}.{col}" for col in COLUMNAS_PAROS_LEIDOS
+                           if col not in ('causal', 'subcausal'))
+        paros = pd.read_sql_query(
+            f"SELECT {select} FROM paros p JOIN registros r ON r.report_id = p.report_id{where} ORDER BY r.id, p.id",
+            self._conexion(), params=parametros
+        )
+        return nombrar_paros(paros)[COLUMNAS_PAROS_LEIDOS]
+
+    def version(self):
+        """Versión de los datos; cambia con cada transacción que guarda o reemplaza reportes."""
+        return str(self._conexion().execute("SELECT valor FROM estado WHERE clave = 'version'").fetchone()[0])
+
+    def dimensiones(self):
+        """Años, meses y líneas con reportes, para poblar los selectores."""
+        conn = self._conexion()
+        fechas = conn.execute(
+            "SELECT DISTINCT CAST(substr(fecha, 1, 4) AS INTEGER), CAST(substr(fecha, 6, 2) AS INTEGER) FROM registros"
+        ).fetchall()
+        lineas = conn.execute("SELECT DISTINCT linea_produccion FROM registros").fetchall()
+        return {
+            'años': sorted({año for año, _ in fechas}),
+            'meses': sorted({mes for _, mes in fechas}),
+            'lineas': sorted(linea for (linea,) in lineas),
+        }
@@ -0,0 +1,82 @@
+"""
+Consolidación de paros para los gráficos del dashboard.
+
+Trabaja sobre los paros en formato largo (`leer_paros`: una fila por paro con
+código, causal, subcausal y minutos) con operaciones por columnas, sin recorrer
+filas en Python: el mismo cálculo sirve para el mes de una línea o, agrupando por
+línea, año y mes, para todo el historial de una vez. La categoría de pérdida de
+cada paro sale de su código en la taxonomía (`taxonomia_paros`).
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from taxonomia_paros import obtener_taxonomia
+
+# causales: DataFrame [*por, causal, minutos] sin la pérdida de velocidad, de mayor a menor
+# dentro de cada grupo; perdida_velocidad: minutos por grupo (Serie indexada por `por`,
+# o un número si no se agrupa)
+Consolidacion = namedtuple('Consolidacion', ['causales', 'perdida_velocidad'])
+
+
+def consolidar_paros(paros, por=(), taxonomia=None):
+    """
+    Totales de minutos por causal y de pérdida de velocidad.
+    `por` son columnas de agrupación (por ejemplo ['linea_produccion', 'año', 'mes_num'])
+    para consolidar muchos grupos en una sola pasada. Las causales empatadas conservan el
+    orden en que aparecen los paros. La pérdida de velocidad no es una parada (en la cascada
+    va en su propia barra): son los paros cuyo código es de esa categoría en la taxonomía.
+    """
+    taxonomia = taxonomia or obtener_taxonomia()
+    por = list(por)
+    minutos = pd.to_numeric(paros['minutos'])
+    validos = (paros['causal'].notna() & minutos.notna()).to_numpy()
+    paros = paros.loc[validos, por + ['codigo_paro', 'causal']].assign(minutos=minutos[validos])
+    velocidad = taxonomia.es_categoria(paros['codigo_paro'], 'velocidad')
+
+    causales = paros[~velocidad].groupby(por + ['causal'], sort=False, observed=True)['minutos'].sum().reset_index()
+    causales = causales.sort_values(por + ['minutos'], ascending=[True] * len(por) + [False],
+                                    kind='stable').reset_index(drop=True)
+    if por:
+        perdida_velocidad = paros[velocidad].groupby(por, observed=True)['minutos'].sum()
+    else:
+        perdida_velocidad = paros.loc[velocidad, 'minutos'].sum()
+    return Consolidacion(causales, perdida_velocidad)
+
+
+# Niveles del Pareto: columnas que identifican cada barra
+NIVELES_PARETO = {'causal': ['causal'], 'subcausal': ['causal', 'subcausal']}
+
+# Los pocos vitales son las barras cuyo acumulado no pasa de este porcentaje
+UMBRAL_VITALES = 80
+
+
+def codificar(valores):
+    """
+    Códigos enteros y valores distintos de una columna, con el vacío como un valor más.
+    Las columnas categóricas (como las deja el dashboard) reutilizan sus códigos sin recorrer texto.
+    """
+    if isinstance(valores.dtype, pd.CategoricalDtype):
+        codigos = valores.cat.codes.to_numpy().astype(np.int64)
+        unicas = np.append(valores.cat.categories.to_numpy(dtype=object), np.nan)
+        return np.where(codigos < 0, len(unicas) - 1, codigos), unicas
+    codigos, unicas = pd.factorize(valores.to_numpy(), use_na_sentinel=False)
+    return codigos.astype(np.int64), np.asarray(unicas, dtype=object)
+
+
+def clasificar_pareto(barras, minutos):
+    """
+    Ordena las barras (DataFrame con las columnas del nivel) por sus minutos de mayor a menor,
+    sin las que no suman minutos, y agrega porcentaje, porcentaje acumulado y la marca de vital.
+    Los empates conservan el orden de `barras`.
+    """
+    minutos = np.asarray(minutos, dtype=float)
+    orden = np.argsort(-minutos, kind='stable')
+    orden = orden[minutos[orden] > 0]
+    pareto = barras.iloc[orden].reset_index(drop=True).assign(minutos=minutos[orden])
+    total = pareto['minutos'].sum()
+    pareto['porcentaje'] = pareto['minutos'] / total * 100 if total else 0.0
+    pareto['porcentaje_acumulado'] = pareto['porcentaje'].cumsum()
+    pareto['vital'] = pareto['porcentaje_acumulado'] <= UMBRAL_VITALES
+    return pareto
@@ -0,0 +1,168 @@
+"""
+Caché de resultados en disco compartida por todos los procesos del dashboard.
+
+Con varios procesos de Streamlit detrás de un balanceador, los cachés de cada proceso
+(`st.cache_resource`) empiezan fríos en cada uno. Lo que el dashboard calcula para
+una selección (agregados, figuras ya armadas) se guarda en `registros_produccion.cache/`,
+un archivo pickle por clave, así que lo que calculó un proceso lo reusan los demás.
+
+- La clave la arma quien llama: la versión de los datos (y de la taxonomía) más los
+  filtros de la selección, con tipos simples (números, textos, fechas, tuplas). A la
+  clave se le suma un resumen del código de la aplicación, para no servir resultados
+  de una versión anterior del código después de un despliegue.
+- Cada entrada se escribe en un temporal y se reemplaza de forma atómica: un lector
+  ve la entrada completa o no la ve.
+- Mientras un proceso calcula una clave, los demás que piden la misma esperan su
+  resultado en lugar de calcularla también (bloqueos por franja de claves).
+- El tamaño total está acotado (OEE_CACHE_MB, 256 MB por defecto): al pasarse, se
+  borran las entradas usadas hace más tiempo. Cada lectura actualiza la fecha de
+  modificación de su archivo, que es el orden de uso. Las entradas de versiones
+  viejas de los datos no se borran aparte: dejan de pedirse y salen por antigüedad.
+
+Las figuras se guardan como su diccionario de Plotly ya validado (`serializar_figura`)
+y se vuelven a abrir sin validarlas de nuevo (`abrir_figura`), que es lo que cuesta
+armarlas.
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+import plotly.graph_objects as go
+
+from almacenamiento import BloqueoArchivo
+
+CACHE_DIR = 'registros_produccion.cache'
+
+# Tamaño máximo de la caché, en MB (se puede cambiar con OEE_CACHE_MB)
+TAMANO_MAXIMO_MB = 256
+
+# Franjas de bloqueo para los cálculos en curso: dos claves de la misma franja se calculan de a una
+FRANJAS = 16
+
+_ausente = object()
+
+_caches = {}
+_lock_caches = threading.Lock()
+_version_codigo = (None, None)
+
+
+def version_codigo(directorio=os.path.dirname(os.path.abspath(__file__))):
+    """Resumen de los módulos .py de la aplicación; se vuelve a calcular solo si alguno cambió (mtime o tamaño)."""
+    global _version_codigo
+    firma = tuple(sorted((e.name, e.stat().st_mtime_ns, e.stat().st_size)
+                         for e in os.scandir(directorio) if e.name.endswith('.py')))
+    if _version_codigo[0] != firma:
+        resumen = hashlib.sha1()
+        for nombre, _, _ in firma:
+            with open(os.path.join(directorio, nombre), 'rb') as file:
+                resumen.update(file.read())
+        _version_codigo = (firma, resumen.hexdigest()[:12])
+    return _version_codigo[1]
+
+
+def serializar_figura(fig):
+    """Diccionario de una figura de Plotly, listo para guardar en la caché."""
+    return fig.to_dict()
+
+
+def abrir_figura(datos_figura):
+    """Figura de Plotly de un diccionario guardado con `serializar_figura`, sin volver a validarlo."""
+    return go.Figure(datos_figura, _validate=False)
+
+
+class CacheResultados:
+    """Resultados calculados guardados en un directorio, compartidos entre procesos, con desalojo por uso."""
+
+    def __init__(self, directorio=CACHE_DIR, tamano_maximo_mb=TAMANO_MAXIMO_MB):
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo_mb * 1024 * 1024
+        self._lock = BloqueoArchivo(directorio + '.lock')
+        self._franjas = [BloqueoArchivo(f'{directorio}.calculo-{i:x}.lock') for i in range(FRANJAS)]
+
+    def _resumen(self, clave):
+        return hashlib.sha1(repr((version_codigo(), clave)).encode('utf-8')).hexdigest()
+
+    def _leer(self, ruta):
+        try:
+            with open(ruta, 'rb') as file:
+                valor = pickle.load(file)
+        except FileNotFoundError:
+            return _ausente
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # Entrada ilegible (por ejemplo, de un despliegue con otras clases): se descarta
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            return _ausente
+        try:
+            # La fecha de modificación es la del último uso, el orden del desalojo
+            os.utime(ruta)
+        except OSError:
+            pass
+        return valor
+
+    def obtener(self, clave, calcular):
+        """
+        Resultado guardado para `clave`; si no está, se calcula con `calcular()` (sin argumentos)
+        y se guarda. `calcular` no debe volver a usar la caché.
+        """
+        resumen = self._resumen(clave)
+        ruta = os.path.join(self.directorio, resumen + '.pkl')
+        valor = self._leer(ruta)
+        if valor is not _ausente:
+            return valor
+        with self._franjas[int(resumen[0], 16) % FRANJAS]:
+            # Otro proceso pudo haberlo calculado mientras se esperaba el bloqueo
+            valor = self._leer(ruta)
+            if valor is _ausente:
+                valor = calcular()
+                self._guardar(ruta, valor)
+        return valor
+
+    def _guardar(self, ruta, valor):
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = f'{ruta}.{os.getpid()}-{threading.get_ident()}.tmp'
+        try:
+            with open(temporal, 'wb') as file:
+                pickle.dump(valor, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)
+        except OSError:
+            # Sin espacio o sin permisos: el resultado se usa igual, solo que no se comparte
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            return
+        self._desalojar()
+
+    def _desalojar(self):
+        """Borra las entradas usadas hace más tiempo hasta que la caché entre en su tamaño máximo."""
+        with self._lock:
+            entradas = []
+            for entrada in os.scandir(self.directorio):
+                if entrada.name.endswith('.pkl'):
+                    try:
+                        stat = entrada.stat()
+                    except OSError:
+                        continue
+                    entradas.append((stat.st_mtime_ns, stat.st_size, entrada.path))
+            total = sum(tamano for _, tamano, _ in entradas)
+            for _, tamano, ruta in sorted(entradas):
+                if total <= self.tamano_maximo:
+                    break
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    continue
+                total -= tamano
+
+
+def obtener_cache_resultados(directorio=CACHE_DIR):
+    """Caché de resultados compartida por todas las sesiones del proceso (y, en disco, por todos los procesos)."""
+    with _lock_caches:
+        if directorio not in _caches:
+            tamano_mb = float(os.environ.get('OEE_CACHE_MB', TAMANO_MAXIMO_MB))
+            _caches[directorio] = CacheResultados(directorio, tamano_mb)
+        return _caches[directorio]
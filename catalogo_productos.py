@@ -0,0 +1,59 @@
+"""
+Catálogo de productos (`productos.csv`) compartido por todo el proceso.
+
+Se lee una sola vez para todas las sesiones y se vuelve a leer solo cuando cambia
+el archivo (mtime o tamaño), así que editar `productos.csv` se refleja en el
+siguiente rerun sin reiniciar la aplicación. Junto con el catálogo se arma el
+índice linea -> {codigo: estandar}, de modo que cambiar de línea en el formulario
+es una búsqueda en un diccionario.
+"""
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+PRODUCTOS_FILE = 'productos.csv'
+
+# productos: {codigo: fila como dict}; lineas: lista ordenada;
+# por_linea: {linea: {codigo: estandar}}; estandares: {codigo: estandar}
+Catalogo = namedtuple('Catalogo', ['productos', 'lineas', 'por_linea', 'estandares'])
+
+CATALOGO_VACIO = Catalogo({}, [], {}, {})
+
+# (firma del archivo, catálogo); se reemplaza completo para que las lecturas sin lock sean consistentes
+_cache = {'entrada': (None, CATALOGO_VACIO)}
+_lock = threading.Lock()
+
+
+def _firma(productos_file):
+    stat = os.stat(productos_file)
+    return (productos_file, stat.st_mtime_ns, stat.st_size)
+
+
+def _construir(df):
+    df = df.dropna(subset=['codigo_producto'])
+    estandares = dict(zip(df['codigo_producto'], df['estandar_produccion'].astype(int)))
+    por_linea = {
+        linea: dict(zip(grupo['codigo_producto'], grupo['estandar_produccion'].astype(int)))
+        for linea, grupo in df.groupby('linea_produccion', sort=True)
+    }
+    productos = dict(zip(df['codigo_producto'], df.to_dict('records')))
+    return Catalogo(productos, sorted(por_linea), por_linea, estandares)
+
+
+def obtener_catalogo(productos_file=PRODUCTOS_FILE):
+    """
+    Devuelve el catálogo vigente, o None si el archivo no existe.
+    Los errores de lectura se propagan para que la aplicación los informe.
+    """
+    if not os.path.exists(productos_file):
+        return None
+    firma = _firma(productos_file)
+    firma_cache, catalogo = _cache['entrada']
+    if firma_cache == firma:
+        return catalogo
+    with _lock:
+        if _cache['entrada'][0] != firma:
+            _cache['entrada'] = (firma, _construir(pd.read_csv(productos_file)))
+        return _cache['entrada'][1]
@@ -0,0 +1,91 @@
+"""
+Escritor único de reportes.
+
+Las sesiones no escriben directamente en el almacenamiento: encolan su reporte y
+un solo hilo por proceso los escribe. El hilo toma todo lo que se acumuló en la
+cola mientras escribía el lote anterior y lo guarda con una sola escritura durable
+del backend (`guardar_lote`), así que con muchos supervisores guardando a la vez
+se hace un fsync o un commit por lote y no uno por reporte.
+
+Cada sesión recibe la confirmación recién cuando su reporte quedó escrito, o la
+excepción si no se pudo escribir. Entre procesos, los backends se serializan con
+sus propios bloqueos de archivo. Los observadores (por ejemplo, el cubo de OEE)
+envuelven cada escritura para actualizar lo que depende de los reportes guardados.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import ExitStack
+
+# Máximo de reportes por escritura
+LOTE_MAXIMO = 64
+
+
+class ColaEscritura:
+    """
+    Cola de reportes pendientes con un hilo escritor que los guarda por lotes.
+    Cada observador es un callable (almacenamiento, lote) -> context manager que envuelve
+    la escritura del lote; su bloque termina sin excepción solo si el lote quedó escrito.
+    """
+
+    def __init__(self, almacenamiento, lote_maximo=LOTE_MAXIMO, observadores=()):
+        self.almacenamiento = almacenamiento
+        self.lote_maximo = lote_maximo
+        self.observadores = list(observadores)
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def encolar(self, lote):
+        """
+        Agrega a la cola una lista de (reporte, paros) que se escribe completa en un mismo lote.
+        El Future se resuelve con la lista de report_id cuando quedó escrita.
+        """
+        futuro = Future()
+        self._cola.put(([(reporte, list(paros)) for reporte, paros in lote], futuro))
+        self._asegurar_hilo()
+        return futuro
+
+    def guardar(self, reporte, paros=()):
+        """Encola el reporte y espera la confirmación de escritura; devuelve su report_id."""
+        return self.encolar([(reporte, paros)]).result()[0]
+
+    def guardar_lote(self, lote):
+        """Encola varios reportes (por ejemplo, una importación) y espera a que queden escritos."""
+        return self.encolar(lote).result()
+
+    def _asegurar_hilo(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._escribir, name='escritor-reportes', daemon=True)
+                self._hilo.start()
+
+    def _escribir(self):
+        while True:
+            pendientes = [self._cola.get()]
+            total = len(pendientes[0][0])
+            while total < self.lote_maximo:
+                try:
+                    pendientes.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+                total += len(pendientes[-1][0])
+            self._guardar_lote(pendientes)
+
+    def _guardar_lote(self, pendientes):
+        lote = [item for solicitud, _ in pendientes for item in solicitud]
+        try:
+            with ExitStack() as pila:
+                for observador in self.observadores:
+                    pila.enter_context(observador(self.almacenamiento, lote))
+                self.almacenamiento.guardar_lote(lote)
+        except Exception as e:
+            if len(pendientes) == 1:
+                pendientes[0][1].set_exception(e)
+                return
+            # Se reintenta cada solicitud por separado para que un reporte con error no haga fallar a los demás
+            for pendiente in pendientes:
+                self._guardar_lote([pendiente])
+            return
+        for lote, futuro in pendientes:
+            futuro.set_result([reporte.get('report_id') for reporte, _ in lote])
@@ -0,0 +1,196 @@
+"""
+Cubo de OEE materializado: sumas por línea y día de los reportes guardados.
+
+El cubo guarda, por línea y fecha, un agregado sumable (`agregados_oee`): turnos,
+tiempos disponible, programado y efectivo, producción, defectuosos y minutos de
+paro. Las vistas por día del mes, semana ISO y mes de cada año se arman
+agregando esas celdas, que son unos pocos miles aunque el historial tenga años.
+
+Se guarda en `registros_produccion.cubo.json` junto con la versión de los datos a
+la que corresponde. El escritor único lo actualiza en cada lote guardado: los
+turnos nuevos se suman a su celda y, si el lote reemplaza reportes existentes,
+solo esos días se vuelven a calcular desde el almacenamiento. Si el cubo no
+corresponde a la versión vigente (importaciones, migraciones, compactaciones, u
+otro proceso que escribió sin pasar por el cubo), el dashboard lo reconstruye.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from agregados_oee import COMPONENTES, combinar
+from almacenamiento import BloqueoArchivo, fecha_iso, version_de
+
+CUBO_FILE = 'registros_produccion.cubo.json'
+
+# Columnas de los registros que alimentan el cubo
+COLUMNAS_CUBO = ['fecha', 'linea_produccion', 'tiempo_disponible_min', 'tiempo_programado_min', 'tiempo_efectivo_min',
+                 'produccion_real_unidades', 'produccion_defectuosa_unidades']
+
+# Medidas sumables de cada celda
+MEDIDAS_CUBO = COMPONENTES
+
+# Nivel temporal del comparativo -> columna del período dentro del año
+NIVELES_CUBO = {'dia': 'dia_mes', 'semana': 'semana', 'mes': 'mes_num'}
+
+_cubos = {}
+_lock_cubos = threading.Lock()
+
+
+def celdas_diarias(registros, paros=None):
+    """
+    Sumas por línea y fecha de un conjunto de reportes y de sus paros (con fecha y línea,
+    como los devuelve `leer_paros`): [linea_produccion, fecha, *MEDIDAS_CUBO].
+    """
+    partes = []
+    if not registros.empty:
+        aportes = pd.DataFrame({
+            'linea_produccion': registros['linea_produccion'].to_numpy(),
+            'fecha': pd.to_datetime(registros['fecha']).dt.strftime('%Y-%m-%d').to_numpy(),
+            'turnos': 1,
+            'minutos_paro': 0.0,
+        })
+        for columna in COLUMNAS_CUBO[2:]:
+            aportes[columna] = pd.to_numeric(registros[columna]).to_numpy(dtype=float)
+        partes.append(aportes)
+    if paros is not None and not paros.empty:
+        aportes = pd.DataFrame({
+            'linea_produccion': paros['linea_produccion'].to_numpy(),
+            'fecha': pd.to_datetime(paros['fecha']).dt.strftime('%Y-%m-%d').to_numpy(),
+            'minutos_paro': pd.to_numeric(paros['minutos'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        })
+        partes.append(aportes.assign(**{c: 0 for c in MEDIDAS_CUBO if c != 'minutos_paro'}))
+    return sumar_celdas(*partes)
+
+
+def sumar_celdas(*partes):
+    """Combina celdas diarias sumando las que coinciden en línea y fecha."""
+    return combinar(partes, ['linea_produccion', 'fecha'])
+
+
+def enrollar(celdas, nivel):
+    """
+    Agrega las celdas diarias por línea, año y período del nivel ('dia', 'semana' o 'mes').
+    Devuelve [linea_produccion, año, <columna del período>, *MEDIDAS_CUBO].
+    """
+    columna = NIVELES_CUBO[nivel]
+    if celdas.empty:
+        return pd.DataFrame(columns=['linea_produccion', 'año', columna] + MEDIDAS_CUBO)
+    fechas = pd.to_datetime(celdas['fecha'])
+    periodos = {'dia_mes': fechas.dt.day, 'semana': fechas.dt.isocalendar().week.astype(int),
+                'mes_num': fechas.dt.month}
+    claves = celdas[['linea_produccion']].assign(año=fechas.dt.year, **{columna: periodos[columna]})
+    return combinar([pd.concat([claves, celdas[MEDIDAS_CUBO]], axis=1)], ['linea_produccion', 'año', columna])
+
+
+class CuboOEE:
+    """Celdas diarias persistidas en un JSON, con su versión de datos y un bloqueo entre procesos."""
+
+    def __init__(self, cubo_file=CUBO_FILE):
+        base, _ = os.path.splitext(cubo_file)
+        self.cubo_file = cubo_file
+        self._lock = BloqueoArchivo(base + '.lock')
+
+    def leer(self):
+        """Devuelve (versión, celdas) del archivo, o (None, None) si no existe o no se puede leer."""
+        try:
+            with open(self.cubo_file, encoding='utf-8') as file:
+                contenido = json.load(file)
+        except (OSError, ValueError):
+            return None, None
+        # Un cubo escrito con otras medidas se trata como desactualizado
+        if contenido.get('medidas') != MEDIDAS_CUBO:
+            return None, None
+        celdas = pd.DataFrame(contenido['celdas'], columns=['linea_produccion', 'fecha'] + MEDIDAS_CUBO)
+        return contenido['version'], celdas
+
+    def _escribir(self, version, celdas):
+        contenido = {'version': version, 'medidas': MEDIDAS_CUBO, 'celdas': {c: celdas[c].tolist() for c in celdas.columns}}
+        with open(self.cubo_file + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(contenido, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.cubo_file + '.tmp', self.cubo_file)
+
+    def cargar(self, version, registros, paros):
+        """
+        Celdas del cubo para la versión de datos dada.
+        Si el archivo corresponde a otra versión, se reconstruye desde `registros` y `paros` y se guarda.
+        """
+        version_cubo, celdas = self.leer()
+        if version_cubo == version:
+            return celdas
+        celdas = celdas_diarias(registros, paros)
+        with self._lock:
+            self._escribir(version, celdas)
+        return celdas
+
+    def conservar_version(self, antes, despues):
+        """Vuelve a sellar con la versión `despues` un cubo de la versión `antes`, si los datos no cambiaron."""
+        with self._lock:
+            version_cubo, celdas = self.leer()
+            if version_cubo == antes:
+                self._escribir(despues, celdas)
+
+    @contextmanager
+    def actualizar_al_guardar(self, almacenamiento, lote):
+        """
+        Envuelve la escritura de un lote de (reporte, paros) y aplica sus cambios al cubo.
+        El bloqueo se mantiene durante la escritura para que ningún otro escritor se intercale
+        entre la versión leída antes y la registrada después. Un error del cubo no afecta
+        al guardado: el cubo queda desactualizado y el dashboard lo reconstruye.
+        """
+        with self._lock:
+            try:
+                antes = version_de(almacenamiento)
+                reemplazos = [reporte for reporte, _ in lote if almacenamiento.buscar(
+                    reporte['fecha'], reporte['turno'], reporte['linea_produccion']) is not None]
+            except Exception:
+                antes = None
+            yield
+            if antes is not None:
+                try:
+                    self._aplicar(almacenamiento, lote, reemplazos, antes)
+                except Exception:
+                    pass
+
+    def _aplicar(self, almacenamiento, lote, reemplazos, antes):
+        version_cubo, celdas = self.leer()
+        if version_cubo != antes:
+            return
+        nuevos = pd.DataFrame([reporte for reporte, _ in lote])[COLUMNAS_CUBO + ['turno']]
+        nuevos['fecha'] = nuevos['fecha'].map(fecha_iso)
+        paros_nuevos = pd.DataFrame(
+            [{'linea_produccion': reporte['linea_produccion'], 'fecha': fecha_iso(reporte['fecha']), 'minutos': paro['minutos']}
+             for reporte, paros in lote for paro in paros],
+            columns=['linea_produccion', 'fecha', 'minutos'])
+
+        # Días a recalcular: los de reportes reemplazados o repetidos dentro del lote
+        repetidos = nuevos.duplicated(['fecha', 'turno', 'linea_produccion'], keep=False)
+        dias = {(r['linea_produccion'], fecha_iso(r['fecha'])) for r in reemplazos}
+        dias |= set(zip(nuevos.loc[repetidos, 'linea_produccion'], nuevos.loc[repetidos, 'fecha']))
+        en_dias = lambda df: np.array([d in dias for d in zip(df['linea_produccion'], df['fecha'])], dtype=bool)
+
+        aportes = celdas_diarias(nuevos[~en_dias(nuevos)], paros_nuevos[~en_dias(paros_nuevos)])
+        if dias:
+            fechas = sorted(f for _, f in dias)
+            filtros = dict(lineas=sorted({l for l, _ in dias}), desde=fechas[0], hasta=fechas[-1])
+            actuales = [almacenamiento.leer(columnas=COLUMNAS_CUBO, **filtros), almacenamiento.leer_paros(**filtros)]
+            for i, df in enumerate(actuales):
+                if not df.empty:
+                    df = df.assign(fecha=df['fecha'].map(fecha_iso))
+                    actuales[i] = df[en_dias(df)]
+            celdas = celdas[~en_dias(celdas)]
+            aportes = sumar_celdas(aportes, celdas_diarias(*actuales))
+        self._escribir(version_de(almacenamiento), sumar_celdas(celdas, aportes))
+
+
+def obtener_cubo(cubo_file=CUBO_FILE):
+    """Cubo compartido por todas las sesiones del proceso."""
+    with _lock_cubos:
+        if cubo_file not in _cubos:
+            _cubos[cubo_file] = CuboOEE(cubo_file)
+        return _cubos[cubo_file]
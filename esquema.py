@@ -0,0 +1,121 @@
+"""
+Esquema tipado de los registros y paros que cargan las aplicaciones.
+
+Los backends devuelven los reportes como los guardaron (textos como object y
+minutos como float64 por los vacíos). Aquí se define, en un solo lugar, el tipo
+de cada columna para los DataFrames que quedan en memoria en cada proceso:
+
+- Textos repetidos (línea, supervisor, producto, causal, subcausal): categóricos.
+- Turno, código de paro, minutos y unidades: enteros con nulos de pocos bytes (Int8/Int16/Int32).
+  Si una columna trae decimales se deja en float64 para no truncar valores.
+- La fecha se conserva como texto ISO (clave de los reportes) y se agrega
+  `fecha_dt` ya convertida, para no volver a parsearla en cada filtro.
+
+`concatenar` agrega filas ya tipadas a un DataFrame tipado sin volver a convertir
+las anteriores (las categorías se unen), para las lecturas incrementales.
+
+`reporte_memoria` muestra cuánto ocupa cada columna, para dimensionar cuántos años
+de historial caben en cada proceso del servidor.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+COLUMNAS_CATEGORICAS = ['linea_produccion', 'supervisor', 'producto_terminado', 'causal', 'subcausal']
+
+# Enteros con nulos: el tipo más chico que cubre los valores posibles
+TIPOS_ENTEROS = {
+    'turno': 'Int8',
+    'tiempo_disponible_min': 'Int16',
+    'tiempo_programado_min': 'Int16',
+    'tiempo_efectivo_min': 'Int16',
+    'tiempo_no_conformidad_min': 'Int16',
+    'tiempo_a_justificar_min': 'Int16',
+    'minutos': 'Int16',
+    'codigo_paro': 'Int16',
+    'produccion_real_unidades': 'Int32',
+    'produccion_defectuosa_unidades': 'Int32',
+}
+
+
+def _entero(serie, tipo):
+    """Convierte a entero con nulos si todos los valores son enteros y caben en `tipo`; si no, a float64."""
+    numeros = pd.to_numeric(serie, errors='coerce')
+    valores = numeros.to_numpy(dtype=float)
+    validos = valores[~np.isnan(valores)]
+    limites = np.iinfo(tipo.lower())
+    if np.all(validos == np.round(validos)) and (validos.size == 0 or
+                                                   (validos.min() >= limites.min and validos.max() <= limites.max)):
+        return numeros.astype(tipo)
+    return numeros.astype(float)
+
+
+def _tipar(df):
+    df = df.copy()
+    for columna in df.columns.intersection(COLUMNAS_CATEGORICAS):
+        df[columna] = df[columna].astype('category')
+    for columna, tipo in TIPOS_ENTEROS.items():
+        if columna in df.columns:
+            df[columna] = _entero(df[columna], tipo)
+    if 'fecha' in df.columns:
+        df['fecha_dt'] = pd.to_datetime(df['fecha'])
+    return df
+
+
+def tipar_registros(registros):
+    """Registros con el esquema tipado (categóricos, enteros chicos con nulos y `fecha_dt`), como copia."""
+    return _tipar(registros)
+
+
+def tipar_paros(paros):
+    """Paros en formato largo con el esquema tipado; los minutos vacíos o no numéricos quedan como nulos."""
+    return _tipar(paros)
+
+
+def concatenar(previo, nuevo):
+    """
+    Une dos DataFrames con el esquema tipado (mismas columnas) conservándolo: los categóricos
+    unen sus categorías sin pasar por texto y una columna entera que cambió de tipo (por ejemplo,
+    llegó un valor con decimales) se vuelve a tipar completa. El índice queda renumerado.
+    """
+    if previo.empty:
+        return nuevo.reset_index(drop=True)
+    if nuevo.empty:
+        return previo.reset_index(drop=True)
+    if list(previo.columns) != list(nuevo.columns):
+        # Otro encabezado (columnas agregadas al CSV): se tipa de nuevo todo
+        return _tipar(pd.concat([previo, nuevo], ignore_index=True))
+    columnas = {}
+    for columna in previo.columns:
+        a, b = previo[columna], nuevo[columna]
+        if isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype):
+            try:
+                columnas[columna] = pd.Series(union_categoricals([a, b], ignore_order=True))
+                continue
+            except TypeError:
+                # Categorías de distinto tipo (números y textos): se vuelven a calcular
+                pass
+        unida = pd.concat([a, b], ignore_index=True)
+        if isinstance(a.dtype, pd.CategoricalDtype) and not isinstance(unida.dtype, pd.CategoricalDtype):
+            unida = unida.astype('category')
+        elif columna in TIPOS_ENTEROS and unida.dtype != a.dtype:
+            unida = _entero(unida, TIPOS_ENTEROS[columna])
+        columnas[columna] = unida
+    return pd.DataFrame(columnas)
+
+
+def reporte_memoria(df):
+    """
+    Memoria de cada columna (incluye el contenido de los textos), ordenada de mayor a menor,
+    con una fila final 'total'. Columnas: columna, tipo, bytes, mb.
+    """
+    uso = df.memory_usage(deep=True, index=False)
+    reporte = pd.DataFrame({
+        'columna': uso.index,
+        'tipo': [str(df[c].dtype) for c in uso.index],
+        'bytes': uso.to_numpy(),
+    }).sort_values('bytes', ascending=False, kind='stable')
+    total = pd.DataFrame({'columna': ['total'], 'tipo': [''], 'bytes': [int(uso.sum())]})
+    reporte = pd.concat([reporte, total], ignore_index=True)
+    reporte['mb'] = (reporte['bytes'] / 2 ** 20).round(2)
+    return reporte
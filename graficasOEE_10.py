@@ -1,38 +1,46 @@
 import numpy as np
 import streamlit as st
 import pandas as pd
-import os
 import plotly.graph_objects as go
-import csv
 import calendar
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-
-# --- Preparación de la base de datos CSV ---
-def create_initial_csv_files():
+from datetime import datetime
+
+from agregados_oee import AgregadoOEE, combinar, indicadores
+from almacenamiento import inicializar_almacenamiento, version_registros
+from cache_resultados import abrir_figura, obtener_cache_resultados, serializar_figura
+from analisis_paros import NIVELES_PARETO
+from catalogo_productos import obtener_catalogo
+from cubo_oee import NIVELES_CUBO, obtener_cubo
+from histogramas import PERIODOS, rango_periodo
+from instantanea import leer_instantanea
+from precalculo import agregados_dashboard, histogramas_periodo
+from submuestreo import MAX_PUNTOS_CON_ETIQUETAS, MAX_PUNTOS_GRAFICO, MIN_PUNTOS_WEBGL, lttb
+from taxonomia_paros import obtener_taxonomia
+
+# --- Preparación del almacenamiento ---
+# Aseguramos que el almacenamiento de registros exista antes de cargar la app
+inicializar_almacenamiento()
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_data(version, version_taxonomia):
     """
-    Crea el archivo CSV de registros si no existe. 
-    Asegura que el archivo tenga los encabezados correctos.
+    Carga los registros y paros ya tipados y los agregados que usan los gráficos.
+    Se arma una vez por versión de los datos (`version_registros()`) y de la taxonomía de paros
+    (los nombres de causal y subcausal salen de ella) y la comparten todas las sesiones, así que
+    un cambio de filtro no vuelve a leer ni a convertir fechas; al guardarse un reporte o editarse
+    la taxonomía cambia la versión y se recarga sola. No se modifica después de construido.
     """
-    registros_file = 'registros_produccion.csv'
-    if not os.path.exists(registros_file):
-        with open(registros_file, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            header = ['fecha', 'turno', 'supervisor', 'linea_produccion', 'tiempo_disponible_min',
-                      'tiempo_programado_min', 'producto_terminado', 'produccion_real_unidades', 'produccion_defectuosa_unidades',
-                      'tiempo_efectivo_min', 'tiempo_no_conformidad_min', 'tiempo_a_justificar_min']
-            for i in range(1, 11):
-                header.extend([f'paro_causal_{i}', f'paro_subcausal_{i}', f'tiempo_paro_min_{i}'])
-            writer.writerow(header)
-
-# Aseguramos que el archivo de registros exista antes de cargar la app
-create_initial_csv_files()
-
-def load_data(file_path):
-    """Carga los datos desde an archivo CSV."""
-    if os.path.exists(file_path):
-        return pd.read_csv(file_path)
-    return pd.DataFrame()
+    # Esquema compartido (categóricos, enteros chicos con nulos y fecha ya convertida), desde la
+    # instantánea que publica el escritor: los textos quedan en el archivo mapeado, compartido entre procesos
+    registros, paros, agregados = leer_instantanea()
+    # Cascada, comparativo, Pareto e histogramas: ya calculados por el escritor después del último
+    # guardado; si la instantánea no está publicada, desde el cubo diario de la versión, una sola vez
+    # entre todos los procesos (caché compartida en disco)
+    if agregados is None:
+        agregados = obtener_cache_resultados().obtener(
+            ('agregados', version, version_taxonomia, datetime.now().date()),
+            lambda: agregados_dashboard(registros, paros, obtener_cubo().cargar(version, registros, paros)))
+    return {'version': (version, version_taxonomia), 'registros': registros, 'paros': paros, **agregados}
 
 # --- Configuración de la página ---
 st.set_page_config(layout="wide")
@@ -40,25 +48,22 @@ st.title("📊 OEE - Efectividad de la Operación")
 st.markdown("---")
 
 # --- Cargar datos ---
-productos_df = load_data('productos.csv')
-registros_df = load_data('registros_produccion.csv')
+catalogo = obtener_catalogo()
+datos = load_data(version_registros(), obtener_taxonomia().version)
+dimensiones = datos['dimensiones']
 
 # Validar que los DataFrames no estén vacíos
-if productos_df.empty:
+if catalogo is None or not catalogo.productos:
     st.error("Error: Archivo 'productos.csv' no encontrado o vacío.")
     st.stop()
-if registros_df.empty:
-    st.error("Error: Archivo 'registros_produccion.csv' no encontrado o vacío. Por favor, asegúrese de que el archivo exista y contenga datos.")
+if not dimensiones['lineas']:
+    st.error("Error: No hay registros de producción. Por favor, asegúrese de que el almacenamiento exista y contenga datos.")
     st.stop()
 
-# --- Preprocesamiento de datos para la interfaz ---
-registros_df['fecha'] = pd.to_datetime(registros_df['fecha'])
-registros_df['mes'] = registros_df['fecha'].dt.month
-registros_df['año'] = registros_df['fecha'].dt.year  # Nueva columna para el año
-
-meses_disponibles = sorted(registros_df['mes'].unique())
-años_disponibles = sorted(registros_df['año'].unique())  # Lista de años disponibles
-lineas_disponibles = sorted(registros_df['linea_produccion'].unique())
+# --- Opciones de la interfaz ---
+meses_disponibles = dimensiones['meses']
+años_disponibles = dimensiones['años']  # Lista de años disponibles
+lineas_disponibles = dimensiones['lineas']
 
 # --- Filtros de la interfaz ---
 st.sidebar.header("Gráfico Waterfall OEE")
@@ -80,56 +85,61 @@ linea_seleccionada = st.sidebar.selectbox(
     lineas_disponibles
 )
 
-# --- Filtrar los datos ---
-df_filtrado = registros_df[
-    (registros_df['mes'] == mes_seleccionado) &
-    (registros_df['año'] == año_seleccionado) &  # Nuevo filtro por año
-    (registros_df['linea_produccion'] == linea_seleccionada)
-].copy()
-
-# --- Visualización y Lógica de OEE ---
-if df_filtrado.empty:
-    st.warning("No hay datos para la selección actual. Por favor, cambia los filtros.")
-else:
+# --- Secciones ---
+# Cada sección es un fragmento: sus controles solo vuelven a ejecutar su propio gráfico.
+# Los datos vienen ya agregados por versión desde load_data.
+
+# Conversión de minutos a días (24 horas de trabajo por día = 1440 minutos)
+def minutos_a_dias(minutos):
+    return minutos / 1440  # 24 horas * 60 minutos = 1440 minutos
+
+
+def resultado_cascada(datos, año_seleccionado, mes_seleccionado, linea_seleccionada):
+    """Figura de la cascada y resumen de tiempos de una línea en un mes; None si no hay datos."""
+    # --- Filtrar los datos ---
+    # Totales del mes y la línea seleccionados, del cubo por mes
+    cubo_mes = datos['cubo']['mes']
+    totales_mes = cubo_mes[
+        (cubo_mes['linea_produccion'] == linea_seleccionada)
+        & (cubo_mes['año'] == año_seleccionado)
+        & (cubo_mes['mes_num'] == mes_seleccionado)
+    ]
+
+    # --- Visualización y Lógica de OEE ---
+    if totales_mes.empty:
+        return None
+
     # 1. Agregación de métricas de tiempo
-    tiempo_disponible = df_filtrado['tiempo_disponible_min'].sum()
-    tiempo_programado = df_filtrado['tiempo_programado_min'].sum()
-    tiempo_efectivo = df_filtrado['tiempo_efectivo_min'].sum()
+    total = AgregadoOEE.de_fila(totales_mes.iloc[0])
+    tiempo_disponible = total.tiempo_disponible_min
+    tiempo_programado = total.tiempo_programado_min
+    tiempo_efectivo = total.tiempo_efectivo_min
 
     # 2. Consolidación de paros no planificados (EXCLUYENDO Pérdida de velocidad)
-    tiempos_paro = {}
-    tiempo_perdida_velocidad = 0  # Inicializar el tiempo de pérdida de velocidad
-    
-    for i in range(1, 11):
-        causal = df_filtrado[f'paro_causal_{i}']
-        tiempo = df_filtrado[f'tiempo_paro_min_{i}']
-        for c, t in zip(causal, tiempo):
-            if pd.notna(c) and pd.notna(t):
-                # Separar "Pérdida de velocidad" de los demás paros
-                if 'pérdida de velocidad' in str(c).lower() or 'perdida de velocidad' in str(c).lower():
-                    tiempo_perdida_velocidad += t
-                else:
-                    tiempos_paro[c] = tiempos_paro.get(c, 0) + t
-    
-    tiempos_paro_sorted = dict(sorted(tiempos_paro.items(), key=lambda item: item[1], reverse=True))
-    
+    # Ya consolidados por línea y mes al cargar los datos, de mayor a menor
+    paros_mes = datos['paros_mes']
+    causales_mes = paros_mes.causales[
+        (paros_mes.causales['linea_produccion'] == linea_seleccionada)
+        & (paros_mes.causales['año'] == año_seleccionado)
+        & (paros_mes.causales['mes_num'] == mes_seleccionado)
+    ]
+    tiempos_paro_sorted = dict(zip(causales_mes['causal'], causales_mes['minutos']))
+    tiempo_perdida_velocidad = paros_mes.perdida_velocidad.get(
+        (linea_seleccionada, año_seleccionado, mes_seleccionado), 0)
+
     tiempo_paros_total = sum(tiempos_paro_sorted.values()) + tiempo_perdida_velocidad
 
     # 3. Cálculo de métricas intermedias
     tiempo_mantenimiento = tiempo_disponible - tiempo_programado
-    produccion_real = df_filtrado['produccion_real_unidades'].sum()
-    produccion_defectuosa = df_filtrado['produccion_defectuosa_unidades'].sum()
-    
+    produccion_real = total.produccion_real_unidades
+    produccion_defectuosa = total.produccion_defectuosa_unidades
+
     # Cálculo de tiempo de defectos
     tiempo_defectos = (produccion_defectuosa / produccion_real) * tiempo_programado if produccion_real > 0 else 0
 
     # 4. Construcción del gráfico simulando una cascada con go.Bar
     fig = go.Figure()
 
-    # Función para convertir minutos a días (24 horas de trabajo por día = 1440 minutos)
-    def minutos_a_dias(minutos):
-        return minutos / 1440  # 24 horas * 60 minutos = 1440 minutos
-
     # 4.1. Primera barra: Tiempo Disponible (azul)
     fig.add_trace(go.Bar(
         x=['Tiempo Disponible'],
@@ -154,7 +164,7 @@ else:
         textposition='outside',
         textfont=dict(size=14, color='black')
     ))
-    
+
     # 4.3. Tercera barra: Tiempo Programado (azul claro)
     fig.add_trace(go.Bar(
         x=['Tiempo Programado'],
@@ -229,7 +239,7 @@ else:
 
     # Añadir anotaciones en la parte inferior con el tiempo en días
     annotations = []
-    
+
     # Tiempo Disponible
     annotations.append(dict(
         x='Tiempo Disponible', y=-5,
@@ -239,7 +249,7 @@ else:
         font=dict(size=12, color='black'),
         yshift=-25
     ))
-    
+
     # Tiempo Mantenimiento
     annotations.append(dict(
         x='Tiempo Mantenimiento', y=-5,
@@ -249,7 +259,7 @@ else:
         font=dict(size=12, color='black'),
         yshift=-25
     ))
-    
+
     # Tiempo Programado
     annotations.append(dict(
         x='Tiempo Programado', y=-5,
@@ -259,7 +269,7 @@ else:
         font=dict(size=12, color='black'),
         yshift=-25
     ))
-    
+
     # Paradas
     for causal in tiempos_paro_sorted.keys():
         tiempo = tiempos_paro_sorted[causal]
@@ -271,7 +281,7 @@ else:
             font=dict(size=10, color='black'),
             yshift=-25
         ))
-    
+
     # Pérdida de velocidad
     annotations.append(dict(
         x='Pérdida de velocidad', y=-5,
@@ -281,7 +291,7 @@ else:
         font=dict(size=12, color='black'),
         yshift=-25
     ))
-    
+
     # Tiempo Defectos
     annotations.append(dict(
         x='Tiempo Defectos', y=-5,
@@ -291,7 +301,7 @@ else:
         font=dict(size=12, color='black'),
         yshift=-25
     ))
-    
+
     # Tiempo Efectivo
     annotations.append(dict(
         x='Tiempo Efectivo', y=-5,
@@ -312,142 +322,121 @@ else:
         height=600  # Altura aumentada para mejor visualización
     )
 
-    st.plotly_chart(fig, use_container_width=True)
-
-    # 5. Mostrar el OEE Neto
+    # 5. OEE Neto
     oee_neto = (tiempo_efectivo_final / tiempo_programado) * 100 if tiempo_programado > 0 else 0
-    st.markdown(f"### **OEE NETO: {oee_neto:.1f}%**")
+    return {
+        'figura': serializar_figura(fig),
+        'oee_neto': oee_neto,
+        'tiempo_disponible': tiempo_disponible,
+        'tiempo_programado': tiempo_programado,
+        'tiempo_perdida_velocidad': tiempo_perdida_velocidad,
+        'tiempo_efectivo': tiempo_efectivo_final,
+        'paros': list(tiempos_paro_sorted.keys()),
+    }
+
+
+@st.fragment
+def seccion_cascada(datos, año_seleccionado, mes_seleccionado, linea_seleccionada):
+    """Cascada de tiempos y OEE neto de una línea en un mes."""
+    # Figura y resumen desde la caché compartida entre procesos, por versión de los datos y selección
+    resultado = obtener_cache_resultados().obtener(
+        ('cascada', datos['version'], año_seleccionado, mes_seleccionado, linea_seleccionada),
+        lambda: resultado_cascada(datos, año_seleccionado, mes_seleccionado, linea_seleccionada))
+
+    if resultado is None:
+        st.warning("No hay datos para la selección actual. Por favor, cambia los filtros.")
+    else:
+        st.plotly_chart(abrir_figura(resultado['figura']), use_container_width=True)
+
+        # 5. Mostrar el OEE Neto
+        st.markdown(f"### **OEE NETO: {resultado['oee_neto']:.1f}%**")
     
-    # Información adicional
-    st.write(f"**Resumen de tiempos:**")
-    st.write(f"- Tiempo Disponible: {tiempo_disponible/60:.1f}h ({minutos_a_dias(tiempo_disponible):.1f}d)")
-    st.write(f"- Tiempo Programado: {tiempo_programado/60:.1f}h ({minutos_a_dias(tiempo_programado):.1f}d)")
-    st.write(f"- Tiempo Pérdida Velocidad: {tiempo_perdida_velocidad/60:.1f}h ({minutos_a_dias(tiempo_perdida_velocidad):.1f}d)")
-    st.write(f"- Tiempo Efectivo: {tiempo_efectivo_final/60:.1f}h ({minutos_a_dias(tiempo_efectivo_final):.1f}d)")
+        # Información adicional
+        st.write(f"**Resumen de tiempos:**")
+        st.write(f"- Tiempo Disponible: {resultado['tiempo_disponible']/60:.1f}h ({minutos_a_dias(resultado['tiempo_disponible']):.1f}d)")
+        st.write(f"- Tiempo Programado: {resultado['tiempo_programado']/60:.1f}h ({minutos_a_dias(resultado['tiempo_programado']):.1f}d)")
+        st.write(f"- Tiempo Pérdida Velocidad: {resultado['tiempo_perdida_velocidad']/60:.1f}h ({minutos_a_dias(resultado['tiempo_perdida_velocidad']):.1f}d)")
+        st.write(f"- Tiempo Efectivo: {resultado['tiempo_efectivo']/60:.1f}h ({minutos_a_dias(resultado['tiempo_efectivo']):.1f}d)")
     
-    if tiempos_paro_sorted:
-        st.write(f"**Paros encontrados:** {list(tiempos_paro_sorted.keys())}")
-
-
-
-
-
-# 6. Gráfica de OEE neto acumulado con comparativa anual
-st.markdown("---")
-st.markdown("### 📈 Línea de tiempo - OEE Comparativo Anual")
-
-# Calcular OEE para todas las líneas y fechas
-registros_df['oee_neto'] = (registros_df['tiempo_efectivo_min'] / registros_df['tiempo_programado_min']) * 100
-registros_df['oee_neto'] = registros_df['oee_neto'].fillna(0)
-
-# Convertir fecha a datetime y extraer componentes temporales
-registros_df['fecha_dt'] = pd.to_datetime(registros_df['fecha'])
-registros_df['año'] = registros_df['fecha_dt'].dt.year
-registros_df['mes_num'] = registros_df['fecha_dt'].dt.month
-registros_df['dia'] = registros_df['fecha_dt'].dt.day
-registros_df['trimestre'] = registros_df['fecha_dt'].dt.quarter
-registros_df['semana'] = registros_df['fecha_dt'].dt.isocalendar().week
-registros_df['dia_mes'] = registros_df['fecha_dt'].dt.day  # Día del mes (1-31)
-
-# Obtener años disponibles
-años_disponibles = sorted(registros_df['año'].unique())
-
-# Selector de líneas con checkboxes
-st.sidebar.markdown("---")
-st.sidebar.subheader("🔧 Comparativa Anual OEE")
-
-# Selector de año actual
-año_actual_seleccionado = st.sidebar.selectbox(
-    "Selecciona el año actual:",
-    options=años_disponibles,
-    index=len(años_disponibles)-1 if años_disponibles else 0,
-    key="año_actual_select"
-)
-
-# Calcular año anterior
-año_anterior_seleccionado = año_actual_seleccionado - 1
-
-# Mostrar año anterior (solo lectura)
-st.sidebar.text_input(
-    "Año anterior:",
-    value=f"{año_anterior_seleccionado}",
-    disabled=True,
-    key="año_anterior_display"
-)
+        if resultado['paros']:
+            st.write(f"**Paros encontrados:** {resultado['paros']}")
 
-todas_lineas = sorted(registros_df['linea_produccion'].unique())
-lineas_seleccionadas = st.sidebar.multiselect(
-    "Seleccionar Líneas:",
-    options=todas_lineas,
-    default=[linea_seleccionada],  # La línea actual por defecto
-    key="lineas_oee_comparativo"
-)
 
-# Selector de nivel de agregación temporal
-nivel_agregacion = st.sidebar.selectbox(
-    "Nivel Temporal:",
-    options=["Día del Mes", "Semana", "Mes"],
-    index=0,  # Día del Mes por defecto
-    key="nivel_temporal_comparativo"
-)
+def resultado_comparativo(datos, lineas_seleccionadas, año_actual_seleccionado, nivel_agregacion):
+    """Figura de la comparativa anual de las líneas y OEE neto de cada línea y año."""
+    año_anterior_seleccionado = año_actual_seleccionado - 1
 
-# Filtrar por líneas seleccionadas y años (actual y anterior)
-if not lineas_seleccionadas:
-    st.warning("Selecciona al menos una línea para visualizar")
-else:
-    datos_filtrados = registros_df[
-        (registros_df['linea_produccion'].isin(lineas_seleccionadas)) &
-        (registros_df['año'].isin([año_anterior_seleccionado, año_actual_seleccionado]))
-    ].copy()
-    
-    # Agrupar según el nivel temporal seleccionado
+    # Celdas del cubo de las líneas seleccionadas y los dos años comparados
     if nivel_agregacion == "Día del Mes":
-        datos_agrupados = datos_filtrados.groupby(['linea_produccion', 'año', 'dia_mes'])['oee_neto'].mean().reset_index()
-        x_col = 'dia_mes'
+        nivel_cubo = 'dia'
         x_title = 'Día del Mes'
         hover_template = 'Día: %{x}<br>OEE: %{y:.1f}%<br>Año: %{customdata}<extra></extra>'
         x_range = [1, 31]
-        
+    
     elif nivel_agregacion == "Semana":
-        datos_agrupados = datos_filtrados.groupby(['linea_produccion', 'año', 'semana'])['oee_neto'].mean().reset_index()
-        x_col = 'semana'
+        nivel_cubo = 'semana'
         x_title = 'Semana del Año'
         hover_template = 'Semana: %{x}<br>OEE: %{y:.1f}%<br>Año: %{customdata}<extra></extra>'
         x_range = [1, 53]
-        
+    
     else:  # Mes
-        datos_agrupados = datos_filtrados.groupby(['linea_produccion', 'año', 'mes_num'])['oee_neto'].mean().reset_index()
-        x_col = 'mes_num'
+        nivel_cubo = 'mes'
         x_title = 'Mes'
         hover_template = 'Mes: %{x}<br>OEE: %{y:.1f}%<br>Año: %{customdata}<extra></extra>'
         x_range = [1, 12]
-    
+
+    x_col = NIVELES_CUBO[nivel_cubo]
+    cubo_nivel = datos['cubo'][nivel_cubo]
+    datos_agrupados = cubo_nivel[
+        cubo_nivel['linea_produccion'].isin(lineas_seleccionadas)
+        & cubo_nivel['año'].isin([año_anterior_seleccionado, año_actual_seleccionado])
+    ]
+    # OEE de cada período como cociente de sus sumas (ponderado por tiempo programado)
+    datos_agrupados = indicadores(datos_agrupados)
+    # Totales de cada línea y año: la suma de sus períodos
+    totales_año = indicadores(combinar([datos_agrupados], ['linea_produccion', 'año'])).set_index(['linea_produccion', 'año'])
+
     # Crear gráfica comparativa
     fig_comparativo = go.Figure()
-    
+
     # Colores para los años
     color_anterior = "#A59999"  # Gris para año anterior
     color_actual = "#040405"    # Azul para año actual
-    
+
+    # Modo de dibujo según la cantidad de puntos del gráfico (todas las líneas y los dos años): con
+    # muchos puntos se quitan las etiquetas por punto, se dibuja con WebGL y, por encima del
+    # presupuesto, cada serie se reduce con LTTB a su parte de MAX_PUNTOS_GRAFICO
+    total_puntos = len(datos_agrupados)
+    Traza = go.Scattergl if total_puntos >= MIN_PUNTOS_WEBGL else go.Scatter
+    modo_series = 'lines+markers+text' if total_puntos <= MAX_PUNTOS_CON_ETIQUETAS else 'lines+markers'
+    n_series = len(datos_agrupados[['linea_produccion', 'año']].drop_duplicates())
+    puntos_por_serie = MAX_PUNTOS_GRAFICO // n_series if total_puntos > MAX_PUNTOS_GRAFICO else None
+
+    def reducir(serie):
+        if puntos_por_serie is None or len(serie) <= puntos_por_serie:
+            return serie
+        serie = serie.sort_values(x_col)
+        return serie.iloc[lttb(serie[x_col], serie['oee_neto'], puntos_por_serie)]
+
     for i, linea in enumerate(lineas_seleccionadas):
         # Datos del año anterior
-        datos_anterior = datos_agrupados[
+        datos_anterior = reducir(datos_agrupados[
             (datos_agrupados['linea_produccion'] == linea) & 
             (datos_agrupados['año'] == año_anterior_seleccionado)
-        ]
-        
+        ])
+    
         # Datos del año actual
-        datos_actual = datos_agrupados[
+        datos_actual = reducir(datos_agrupados[
             (datos_agrupados['linea_produccion'] == linea) & 
             (datos_agrupados['año'] == año_actual_seleccionado)
-        ]
-        
+        ])
+    
         # Añadir serie del año anterior (gris oscuro)
         if not datos_anterior.empty:
-            fig_comparativo.add_trace(go.Scatter(
+            fig_comparativo.add_trace(Traza(
                 x=datos_anterior[x_col],
                 y=datos_anterior['oee_neto'],
-                mode='lines+markers+text',
+                mode=modo_series,
                 name=f'{linea} {año_anterior_seleccionado}',
                 line=dict(color=color_anterior, width=1.8),
                 marker=dict(size=4, color=color_anterior, symbol='circle'),
@@ -459,13 +448,13 @@ else:
                 textposition='top center',
                 textfont=dict(size=8, color=color_anterior)
             ))
-        
+    
         # Añadir serie del año actual (verde)
         if not datos_actual.empty:
-            fig_comparativo.add_trace(go.Scatter(
+            fig_comparativo.add_trace(Traza(
                 x=datos_actual[x_col],
                 y=datos_actual['oee_neto'],
-                mode='lines+markers+text',
+                mode=modo_series,
                 name=f'{linea} {año_actual_seleccionado}',
                 line=dict(color=color_actual, width=1.8),
                 marker=dict(size=5, color=color_actual, symbol='x'),
@@ -477,7 +466,7 @@ else:
                 textposition='bottom center',
                 textfont=dict(size=8, color=color_actual)
             ))
-    
+
     # Añadir líneas de referencia
     fig_comparativo.add_trace(go.Scatter(
         x=x_range,
@@ -510,7 +499,7 @@ else:
         hoverinfo='skip',
         showlegend=True
     ))
-    
+
     # Configurar layout
     fig_comparativo.update_layout(
         title=f'Comparativa OEE {año_anterior_seleccionado} vs {año_actual_seleccionado} - Nivel {nivel_agregacion}',
@@ -540,169 +529,142 @@ else:
             ticksuffix='%'
         )
     )
-    
+
     # Añadir cuadrícula
     fig_comparativo.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
     fig_comparativo.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-    
-    # Mostrar estadísticas comparativas
-    st.plotly_chart(fig_comparativo, use_container_width=True)
-    
-    # Estadísticas comparativas
-    st.markdown("### 📊 Estadísticas Comparativas")
-    
-    for linea in lineas_seleccionadas:
-        col1, col2, col3 = st.columns(3)
-        
-        # OEE promedio año anterior
-        oee_anterior = datos_agrupados[
-            (datos_agrupados['linea_produccion'] == linea) & 
-            (datos_agrupados['año'] == año_anterior_seleccionado)
-        ]['oee_neto'].mean()
-        
-        # OEE promedio año actual
-        oee_actual_val = datos_agrupados[
-            (datos_agrupados['linea_produccion'] == linea) & 
-            (datos_agrupados['año'] == año_actual_seleccionado)
-        ]['oee_neto'].mean()
-        
-        with col1:
-            if not pd.isna(oee_anterior):
-                st.metric(
-                    label=f"OEE Promedio {año_anterior_seleccionado} - Línea {linea}",
-                    value=f"{oee_anterior:.1f}%",
-                    delta=None
-                )
-        
-        with col2:
-            if not pd.isna(oee_actual_val):
-                st.metric(
-                    label=f"OEE Promedio {año_actual_seleccionado} - Línea {linea}",
-                    value=f"{oee_actual_val:.1f}%",
-                    delta=None
-                )
-        
-        with col3:
-            # Variación
-            if not pd.isna(oee_anterior) and not pd.isna(oee_actual_val):
-                variacion = oee_actual_val - oee_anterior
-                st.metric(
-                    label=f"Variación - Línea {linea}",
-                    value=f"{variacion:+.1f}%",
-                    delta=f"{variacion:+.1f}%"
-                )
 
+    return {'figura': serializar_figura(fig_comparativo), 'oee_neto': totales_año['oee_neto']}
 
-    # 8. Gráfico de Pareto para Subparos
-st.markdown("---")
-st.markdown("### 📊 Análisis de Pareto para Subparos")
 
-# Preparar datos para el gráfico de Pareto
-pareto_df = registros_df.copy()
+@st.fragment
+def seccion_comparativo(datos, linea_seleccionada):
+    """Comparativa anual del OEE neto por línea, desde el cubo."""
+    dimensiones = datos['dimensiones']
+    # 6. Gráfica de OEE neto acumulado con comparativa anual
+    st.markdown("---")
+    st.markdown("### 📈 Línea de tiempo - OEE Comparativo Anual")
 
-# Asegurarnos de que tenemos las columnas necesarias
-if 'fecha' in pareto_df.columns:
-    pareto_df['fecha_dt'] = pd.to_datetime(pareto_df['fecha'])
-else:
-    st.error("No se encuentra la columna 'fecha' en los datos.")
-    st.stop()
+    # Obtener años disponibles
+    años_disponibles = dimensiones['años']
 
-# Crear contenedor para los filtros
-col_filtro1, col_filtro2, col_filtro3, col_filtro4, col_filtro5, col_filtro6 = st.columns(6)
-
-with col_filtro1:
-    pareto_semana_btn = st.button("Última Semana", key="pareto_semana_btn", use_container_width=True)
-with col_filtro2:
-    pareto_ytd_btn = st.button("YTD", key="pareto_ytd_btn", use_container_width=True)
-with col_filtro3:
-    pareto_mes_btn = st.button("1 Mes", key="pareto_mes_btn", use_container_width=True)
-with col_filtro4:
-    pareto_seis_meses_btn = st.button("6 Meses", key="pareto_seis_meses_btn", use_container_width=True)
-with col_filtro5:
-    pareto_año_btn = st.button("1 Año", key="pareto_año_btn", use_container_width=True)
-with col_filtro6:
-    pareto_todo_btn = st.button("Todo", key="pareto_todo_btn", use_container_width=True)
-
-# Selector de línea de producción para el gráfico de Pareto
-lineas_pareto = sorted(pareto_df['linea_produccion'].unique())
-linea_seleccionada_pareto = st.selectbox(
-    "Seleccionar Línea de Producción:",
-    options=lineas_pareto,
-    index=0,
-    key="linea_pareto"
-)
+    # Controles propios de la sección: cambiarlos solo vuelve a dibujar la comparativa
+    col_año_actual, col_año_anterior, col_lineas, col_nivel = st.columns([1, 1, 2, 1])
 
-# Filtrar por línea seleccionada
-pareto_df = pareto_df[pareto_df['linea_produccion'] == linea_seleccionada_pareto]
-
-# Determinar el filtro temporal según el botón presionado
-hoy = pd.to_datetime('today')
-filtro_temporal_pareto = "YTD"  # Valor por defecto
-
-if pareto_semana_btn:
-    filtro_temporal_pareto = "Última Semana"
-    una_semana_atras = hoy - pd.DateOffset(weeks=1)
-    pareto_df = pareto_df[pareto_df['fecha_dt'] >= una_semana_atras]
-elif pareto_mes_btn:
-    filtro_temporal_pareto = "1 Mes"
-    un_mes_atras = hoy - pd.DateOffset(months=1)
-    pareto_df = pareto_df[pareto_df['fecha_dt'] >= un_mes_atras]
-elif pareto_seis_meses_btn:
-    filtro_temporal_pareto = "6 Meses"
-    seis_meses_atras = hoy - pd.DateOffset(months=6)
-    pareto_df = pareto_df[pareto_df['fecha_dt'] >= seis_meses_atras]
-elif pareto_año_btn:
-    filtro_temporal_pareto = "1 Año"
-    un_año_atras = hoy - pd.DateOffset(years=1)
-    pareto_df = pareto_df[pareto_df['fecha_dt'] >= un_año_atras]
-elif pareto_todo_btn:
-    filtro_temporal_pareto = "Todo"
-    # No aplicar filtro
-else:
-    # YTD por defecto
-    filtro_temporal_pareto = "YTD"
-    inicio_año = pd.to_datetime(f'{hoy.year}-01-01')
-    pareto_df = pareto_df[pareto_df['fecha_dt'] >= inicio_año]
-
-# Extraer todos los subparos y sus tiempos
-subparos_data = []
-for i in range(1, 11):
-    causal_col = f'paro_causal_{i}'
-    tiempo_col = f'tiempo_paro_min_{i}'
-    
-    if causal_col in pareto_df.columns and tiempo_col in pareto_df.columns:
-        for index, row in pareto_df.iterrows():
-            if pd.notna(row[causal_col]) and pd.notna(row[tiempo_col]) and row[tiempo_col] > 0:
-                subparos_data.append({
-                    'subparo': row[causal_col],
-                    'tiempo_min': row[tiempo_col]
-                })
-
-# Crear DataFrame de subparos
-if subparos_data:
-    subparos_df = pd.DataFrame(subparos_data)
+    # Selector de año actual
+    with col_año_actual:
+        año_actual_seleccionado = st.selectbox(
+            "Selecciona el año actual:",
+            options=años_disponibles,
+            index=len(años_disponibles)-1 if años_disponibles else 0,
+            key="año_actual_select"
+        )
+
+    # Calcular año anterior
+    año_anterior_seleccionado = año_actual_seleccionado - 1
+
+    # Mostrar año anterior (solo lectura)
+    with col_año_anterior:
+        st.text_input(
+            "Año anterior:",
+            value=f"{año_anterior_seleccionado}",
+            disabled=True,
+            key="año_anterior_display"
+        )
+
+    todas_lineas = dimensiones['lineas']
+    with col_lineas:
+        lineas_seleccionadas = st.multiselect(
+            "Seleccionar Líneas:",
+            options=todas_lineas,
+            default=[linea_seleccionada],  # La línea actual por defecto
+            key="lineas_oee_comparativo"
+        )
+
+    # Selector de nivel de agregación temporal
+    with col_nivel:
+        nivel_agregacion = st.selectbox(
+            "Nivel Temporal:",
+            options=["Día del Mes", "Semana", "Mes"],
+            index=0,  # Día del Mes por defecto
+            key="nivel_temporal_comparativo"
+        )
+
+    # Filtrar por líneas seleccionadas y años (actual y anterior)
+    if not lineas_seleccionadas:
+        st.warning("Selecciona al menos una línea para visualizar")
+    else:
+        # Figura y OEE de cada línea y año desde la caché compartida entre procesos
+        resultado = obtener_cache_resultados().obtener(
+            ('comparativo', datos['version'], tuple(lineas_seleccionadas), año_actual_seleccionado, nivel_agregacion),
+            lambda: resultado_comparativo(datos, lineas_seleccionadas, año_actual_seleccionado, nivel_agregacion))
+
+        # Mostrar estadísticas comparativas
+        st.plotly_chart(abrir_figura(resultado['figura']), use_container_width=True)
     
-    # Agrupar por tipo de subparo y sumar tiempos
-    subparos_agrupados = subparos_df.groupby('subparo')['tiempo_min'].sum().reset_index()
+        # Estadísticas comparativas
+        st.markdown("### 📊 Estadísticas Comparativas")
     
+        for linea in lineas_seleccionadas:
+            col1, col2, col3 = st.columns(3)
+        
+            # OEE neto del año anterior y del actual
+            oee_anterior = resultado['oee_neto'].get((linea, año_anterior_seleccionado), np.nan)
+            oee_actual_val = resultado['oee_neto'].get((linea, año_actual_seleccionado), np.nan)
+        
+            with col1:
+                if not pd.isna(oee_anterior):
+                    st.metric(
+                        label=f"OEE Neto {año_anterior_seleccionado} - Línea {linea}",
+                        value=f"{oee_anterior:.1f}%",
+                        delta=None
+                    )
+        
+            with col2:
+                if not pd.isna(oee_actual_val):
+                    st.metric(
+                        label=f"OEE Neto {año_actual_seleccionado} - Línea {linea}",
+                        value=f"{oee_actual_val:.1f}%",
+                        delta=None
+                    )
+        
+            with col3:
+                # Variación
+                if not pd.isna(oee_anterior) and not pd.isna(oee_actual_val):
+                    variacion = oee_actual_val - oee_anterior
+                    st.metric(
+                        label=f"Variación - Línea {linea}",
+                        value=f"{variacion:+.1f}%",
+                        delta=f"{variacion:+.1f}%"
+                    )
+
+
+def resultado_pareto(datos, linea_seleccionada_pareto, nivel_pareto, inicio_pareto, fin_pareto, filtro_temporal_pareto):
+    """Figura del Pareto de paros de una línea en un período y sus barras; None si no hubo paros."""
+    # Minutos por causal (o por causal y subcausal) de la línea en el período, desde el índice de sumas
+    # acumuladas, con su acumulado y la clasificación 80/20
+    subparos_agrupados = datos['indice'].pareto(linea_seleccionada_pareto, desde=inicio_pareto, hasta=fin_pareto,
+                                                nivel=nivel_pareto)
+
+    if subparos_agrupados.empty:
+        return None
+
+    # Una barra por causal, o por subcausal con su causal (la misma subcausal puede repetirse entre causales)
+    if nivel_pareto == 'subcausal':
+        subparos_agrupados['subparo'] = (subparos_agrupados['subcausal'].fillna('Sin subcausal').astype(str)
+                                         + ' (' + subparos_agrupados['causal'].astype(str) + ')')
+    else:
+        subparos_agrupados['subparo'] = subparos_agrupados['causal'].astype(str)
+
     # Convertir a horas
-    subparos_agrupados['tiempo_hrs'] = subparos_agrupados['tiempo_min'] / 60
-    
-    # Ordenar de mayor a menor
-    subparos_agrupados = subparos_agrupados.sort_values('tiempo_hrs', ascending=False)
-    
-    # Calcular porcentaje acumulado
-    subparos_agrupados['porcentaje_acumulado'] = (subparos_agrupados['tiempo_hrs'].cumsum() / 
-                                                 subparos_agrupados['tiempo_hrs'].sum() * 100)
-    
-    # Identificar los subparos que representan el 80% del tiempo total
-    subparos_agrupados['color'] = subparos_agrupados['porcentaje_acumulado'].apply(
-        lambda x: 'red' if x <= 80 else 'gray'
-    )
-    
+    subparos_agrupados['tiempo_hrs'] = subparos_agrupados['minutos'] / 60
+
+    # Los subparos que representan el 80% del tiempo total
+    subparos_agrupados['color'] = np.where(subparos_agrupados['vital'], 'red', 'gray')
+
     # Crear gráfico de Pareto
     fig_pareto = go.Figure()
-    
+
     # Añadir barras con bordes negros
     fig_pareto.add_trace(go.Bar(
         x=subparos_agrupados['subparo'],
@@ -716,7 +678,7 @@ if subparos_data:
         textposition='outside',  # Etiquetas fuera de las barras
         textfont=dict(color='black', size=10)  # Color y tamaño de etiquetas
     ))
-    
+
     # Añadir línea de porcentaje acumulado
     fig_pareto.add_trace(go.Scatter(
         x=subparos_agrupados['subparo'],
@@ -728,7 +690,7 @@ if subparos_data:
         marker=dict(size=6),
         hovertemplate='Subparo: %{x}<br>% Acumulado: %{y:.1f}%<extra></extra>'
     ))
-    
+
     # Configurar layout
     fig_pareto.update_layout(
         title=f"Análisis de Pareto de Subparos - Línea {linea_seleccionada_pareto} - Período: {filtro_temporal_pareto}",
@@ -769,19 +731,19 @@ if subparos_data:
         bargroupgap=0.1,  # Espacio entre grupos de barras
         margin=dict(r=150)  # Margen derecho para la leyenda
     )
-    
+
     # Configurar ejes para que no se desborden
     fig_pareto.update_xaxes(
         gridcolor='lightgray',
         gridwidth=1,
         showgrid=False  # Ocultar grid vertical para mejor visualización
     )
-    
+
     fig_pareto.update_yaxes(
         gridcolor='lightgray',
         gridwidth=1
     )
-    
+
     # Añadir anotación para explicar los colores
     fig_pareto.add_annotation(
         x=1.35, y=0.35,
@@ -793,220 +755,294 @@ if subparos_data:
         bordercolor="black",
         borderwidth=0.5
     )
-    
+
     # Añadir línea de referencia al 80%
     fig_pareto.add_hline(y=80, line_dash="dash", line_color="red", 
                         opacity=0.7, yref="y2",
                         annotation_text="80%", 
                         annotation_position="top right")
+
+    return {'figura': serializar_figura(fig_pareto), 'subparos': subparos_agrupados}
+
+
+@st.fragment
+def seccion_pareto(datos):
+    """Pareto de paros de una línea en un período, desde el índice de períodos."""
+    dimensiones = datos['dimensiones']
+    # 8. Gráfico de Pareto para Subparos
+    st.markdown("---")
+    st.markdown("### 📊 Análisis de Pareto para Subparos")
+
+    # Crear contenedor para los filtros
+    col_filtro1, col_filtro2, col_filtro3, col_filtro4, col_filtro5, col_filtro6 = st.columns(6)
+
+    with col_filtro1:
+        pareto_semana_btn = st.button("Última Semana", key="pareto_semana_btn", use_container_width=True)
+    with col_filtro2:
+        pareto_ytd_btn = st.button("YTD", key="pareto_ytd_btn", use_container_width=True)
+    with col_filtro3:
+        pareto_mes_btn = st.button("1 Mes", key="pareto_mes_btn", use_container_width=True)
+    with col_filtro4:
+        pareto_seis_meses_btn = st.button("6 Meses", key="pareto_seis_meses_btn", use_container_width=True)
+    with col_filtro5:
+        pareto_año_btn = st.button("1 Año", key="pareto_año_btn", use_container_width=True)
+    with col_filtro6:
+        pareto_todo_btn = st.button("Todo", key="pareto_todo_btn", use_container_width=True)
+
+    # Selector de línea de producción para el gráfico de Pareto
+    lineas_pareto = dimensiones['lineas']
+    linea_seleccionada_pareto = st.selectbox(
+        "Seleccionar Línea de Producción:",
+        options=lineas_pareto,
+        index=0,
+        key="linea_pareto"
+    )
+    nivel_pareto = st.radio(
+        "Nivel del Pareto:",
+        options=list(NIVELES_PARETO),
+        format_func=str.capitalize,
+        horizontal=True,
+        key="nivel_pareto"
+    )
+    rango_pareto = st.date_input(
+        "Rango personalizado (opcional):",
+        value=(),
+        key="rango_pareto"
+    )
+
+    # Determinar el filtro temporal según el botón presionado
+    hoy = pd.to_datetime('today')
+    filtro_temporal_pareto = "YTD"  # Valor por defecto
+    fin_pareto = None
+
+    if pareto_semana_btn:
+        filtro_temporal_pareto = "Última Semana"
+        inicio_pareto = hoy - pd.DateOffset(weeks=1)
+    elif pareto_mes_btn:
+        filtro_temporal_pareto = "1 Mes"
+        inicio_pareto = hoy - pd.DateOffset(months=1)
+    elif pareto_seis_meses_btn:
+        filtro_temporal_pareto = "6 Meses"
+        inicio_pareto = hoy - pd.DateOffset(months=6)
+    elif pareto_año_btn:
+        filtro_temporal_pareto = "1 Año"
+        inicio_pareto = hoy - pd.DateOffset(years=1)
+    elif pareto_todo_btn:
+        filtro_temporal_pareto = "Todo"
+        inicio_pareto = None  # No aplicar filtro
+    else:
+        # YTD por defecto
+        filtro_temporal_pareto = "YTD"
+        inicio_pareto = pd.to_datetime(f'{hoy.year}-01-01')
+
+    # Un rango completo elegido en el calendario reemplaza a los botones
+    if len(rango_pareto) == 2:
+        inicio_pareto, fin_pareto = rango_pareto
+        filtro_temporal_pareto = f"{inicio_pareto:%Y-%m-%d} a {fin_pareto:%Y-%m-%d}"
+
+    # El índice cuenta días enteros. Los registros llevan la fecha a medianoche, así que con la hora
+    # de `hoy` el día del límite de los botones relativos queda fuera: el período empieza al día
+    # siguiente (redondeo hacia arriba). YTD y el calendario ya caen a medianoche y no cambian
+    if inicio_pareto is not None:
+        inicio_pareto = pd.Timestamp(inicio_pareto).ceil('D').date()
+    if fin_pareto is not None:
+        fin_pareto = pd.Timestamp(fin_pareto).date()
+
+    # Minutos por causal (o por causal y subcausal) de la línea en el período, con su acumulado y la
+    # clasificación 80/20, desde la caché compartida entre procesos
+    resultado = obtener_cache_resultados().obtener(
+        ('pareto', datos['version'], linea_seleccionada_pareto, nivel_pareto, inicio_pareto, fin_pareto,
+         filtro_temporal_pareto),
+        lambda: resultado_pareto(datos, linea_seleccionada_pareto, nivel_pareto, inicio_pareto, fin_pareto,
+                                 filtro_temporal_pareto))
+
+    if resultado is not None:
+        subparos_agrupados = resultado['subparos']
+        st.plotly_chart(abrir_figura(resultado['figura']), use_container_width=True)
+    
+        # Mostrar estadísticas resumidas
+        st.markdown("**📈 Estadísticas de Subparos:**")
+    
+        total_tiempo_hrs = subparos_agrupados['tiempo_hrs'].sum()
+        total_subparos = len(subparos_agrupados)
+        subparos_vitales = subparos_agrupados[subparos_agrupados['color'] == 'red']
+        num_vitales = len(subparos_vitales)
+        tiempo_vitales = subparos_vitales['tiempo_hrs'].sum()
+    
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Tiempo Subparos", f"{total_tiempo_hrs:.1f} horas")
+        with col2:
+            st.metric("Total Tipos de Subparos", f"{total_subparos}")
+        with col3:
+            st.metric("Subparos Vitales (80/20)", f"{num_vitales}")
+        with col4:
+            st.metric("Tiempo Subparos Vitales", f"{tiempo_vitales:.1f} horas")
     
-    st.plotly_chart(fig_pareto, use_container_width=True)
+        # Mostrar tabla con detalles
+        st.markdown("**📋 Detalle de Subparos:**")
+        subparos_detalle = subparos_agrupados[['subparo', 'tiempo_hrs', 'porcentaje_acumulado']].copy()
+        subparos_detalle['tiempo_hrs'] = subparos_detalle['tiempo_hrs'].round(2)
+        subparos_detalle['porcentaje_acumulado'] = subparos_detalle['porcentaje_acumulado'].round(1)
+        subparos_detalle.columns = ['Tipo de Subparo', 'Tiempo (horas)', '% Acumulado']
     
-    # Mostrar estadísticas resumidas
-    st.markdown("**📈 Estadísticas de Subparos:**")
+        st.dataframe(subparos_detalle, use_container_width=True, hide_index=True)
     
-    total_tiempo_hrs = subparos_agrupados['tiempo_hrs'].sum()
-    total_subparos = len(subparos_agrupados)
-    subparos_vitales = subparos_agrupados[subparos_agrupados['color'] == 'red']
-    num_vitales = len(subparos_vitales)
-    tiempo_vitales = subparos_vitales['tiempo_hrs'].sum()
+    else:
+        st.warning(f"No se encontraron datos de subparos para la línea {linea_seleccionada_pareto} en el período seleccionado.")
+
+
+def resultado_histogramas(datos, periodo_hist, fecha_actual):
+    """Figura de los mini histogramas de cada línea en un período; None si no hay datos."""
+    _, _, titulo_periodo = rango_periodo(periodo_hist, fecha_actual)
+
+    # Intervalos, media y mediana de cada línea calculados en el servidor; al navegador solo van las barras.
+    # El escritor los deja calculados para el día en que publicó; otro día se calculan aquí
+    if datos['hoy'] == fecha_actual.date():
+        histogramas = datos['histogramas'][periodo_hist]
+    else:
+        histogramas = histogramas_periodo(datos['registros'], periodo_hist, fecha_actual)
+    lineas_unicas = list(histogramas)
+
+    if not lineas_unicas:
+        return None
+
+    # Calcular número de columnas (máximo 4 por fila)
+    n_lineas = len(lineas_unicas)
+    n_cols = min(4, n_lineas)
+    n_rows = (n_lineas + n_cols - 1) // n_cols
+
+    # Importar make_subplots
+    from plotly.subplots import make_subplots
+
+    # Crear subplots
+    fig = make_subplots(
+        rows=n_rows, 
+        cols=n_cols,
+        subplot_titles=lineas_unicas,
+        horizontal_spacing=0.05,
+        vertical_spacing=0.1
+    )
+
+    # Colores minimalistas
+    color_barras = "#030585"  # Gris azulado oscuro
+    color_media = "#111111"   # Rojo
+    color_mediana = "#F7F8FA" # Azul oscuro
+
+    # Crear un histograma por línea
+    for i, linea in enumerate(lineas_unicas):
+        row = (i // n_cols) + 1
+        col = (i % n_cols) + 1
     
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Total Tiempo Subparos", f"{total_tiempo_hrs:.1f} horas")
-    with col2:
-        st.metric("Total Tipos de Subparos", f"{total_subparos}")
-    with col3:
-        st.metric("Subparos Vitales (80/20)", f"{num_vitales}")
-    with col4:
-        st.metric("Tiempo Subparos Vitales", f"{tiempo_vitales:.1f} horas")
+        histograma = histogramas[linea]
+        media = histograma.media
+        mediana = histograma.mediana
+        centros = (histograma.bordes[:-1] + histograma.bordes[1:]) / 2
     
-    # Mostrar tabla con detalles
-    st.markdown("**📋 Detalle de Subparos:**")
-    subparos_detalle = subparos_agrupados[['subparo', 'tiempo_hrs', 'porcentaje_acumulado']].copy()
-    subparos_detalle['tiempo_hrs'] = subparos_detalle['tiempo_hrs'].round(2)
-    subparos_detalle['porcentaje_acumulado'] = subparos_detalle['porcentaje_acumulado'].round(1)
-    subparos_detalle.columns = ['Tipo de Subparo', 'Tiempo (horas)', '% Acumulado']
+        # Histograma como barras con los conteos ya calculados
+        fig.add_trace(
+            go.Bar(
+                x=centros,
+                y=histograma.conteos,
+                width=np.diff(histograma.bordes),
+                customdata=np.column_stack([histograma.bordes[:-1], histograma.bordes[1:]]),
+                name=linea,
+                marker_color=color_barras,
+                opacity=0.8,
+                showlegend=False,
+                hovertemplate=f'Línea: {linea}<br>Producción: %{{customdata[0]:,.0f}} - %{{customdata[1]:,.0f}}<br>Frecuencia: %{{y}}<extra></extra>'
+            ),
+            row=row, col=col
+        )
     
-    st.dataframe(subparos_detalle, use_container_width=True, hide_index=True)
+        # Añadir línea de media, a la altura del intervalo más alto
+        y_max = histograma.conteos.max() * 1.1
+        fig.add_trace(
+            go.Scatter(
+                x=[media, media],
+                y=[0, y_max],
+                mode='lines',
+                line=dict(color=color_media, width=1.5, dash='dash'),
+                name='Media',
+                showlegend=False,
+                hovertemplate=f'Media: {media:,.0f}<extra></extra>'
+            ),
+            row=row, col=col
+        )
     
-else:
-    st.warning(f"No se encontraron datos de subparos para la línea {linea_seleccionada_pareto} en el período seleccionado.")
+        # Añadir línea de mediana
+        fig.add_trace(
+            go.Scatter(
+                x=[mediana, mediana],
+                y=[0, y_max],
+                mode='lines',
+                line=dict(color=color_mediana, width=1.5, dash='dot'),
+                name='Mediana',
+                showlegend=False,
+                hovertemplate=f'Mediana: {mediana:,.0f}<extra></extra>'
+            ),
+            row=row, col=col
+        )
 
+    # Configurar layout ultra minimalista
+    fig.update_layout(
+        title=f"Distribución de Producción - {titulo_periodo}",
+        height=150 * n_rows,  # Altura dinámica
+        showlegend=False,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(size=9),
+        margin=dict(l=20, r=20, t=60, b=20)
+    )
 
+    # Configurar ejes minimalistas
+    fig.update_xaxes(
+        showgrid=False,
+        showticklabels=True,
+        tickfont=dict(size=10,color='#000000'),
+        title_font=dict(size=8)
+    )
 
+    fig.update_yaxes(
+        showgrid=False,
+        showticklabels=False,
+        title_text=''
+    )
 
+    # Ajustar títulos de subplots
+    fig.update_annotations(font_size=20)
 
+    return {'figura': serializar_figura(fig)}
 
 
-# 9. Mini Histogramas de Distribución por Línea
-st.markdown("---")
-st.markdown("### 📊 Mini Histogramas - Distribución por Línea")
-
-# Filtros para los mini histogramas
-st.sidebar.markdown("---")
-st.sidebar.subheader("🔧 Filtros Mini Histogramas")
-
-# Selector de período temporal
-periodo_hist = st.sidebar.selectbox(
-    "Período temporal:",
-    options=["YTD", "Último mes", "Último 6 meses", "Último año"],
-    index=0,
-    key="periodo_hist"
-)
+@st.fragment
+def seccion_histogramas(datos):
+    """Distribución de la producción por turno de cada línea en un período."""
+    # 9. Mini Histogramas de Distribución por Línea
+    st.markdown("---")
+    st.markdown("### 📊 Mini Histogramas - Distribución por Línea")
 
-# Obtener fecha actual y calcular fechas de filtro
-fecha_actual = datetime.now()
-df_hist = registros_df.copy()
+    # Selector de período temporal (propio de la sección)
+    periodo_hist = st.selectbox(
+        "Período temporal:",
+        options=PERIODOS,
+        index=0,
+        key="periodo_hist"
+    )
 
-if periodo_hist == "YTD":
-    # Year to date (desde inicio del año actual)
-    df_hist = df_hist[df_hist['año'] == fecha_actual.year]
-    titulo_periodo = f"YTD {fecha_actual.year}"
-    
-elif periodo_hist == "Último mes":
-    # Último mes completo
-    primer_dia_mes_anterior = (fecha_actual.replace(day=1) - timedelta(days=1)).replace(day=1)
-    df_hist = df_hist[
-        (df_hist['año'] == primer_dia_mes_anterior.year) & 
-        (df_hist['mes_num'] == primer_dia_mes_anterior.month)
-    ]
-    titulo_periodo = f"{calendar.month_name[primer_dia_mes_anterior.month]} {primer_dia_mes_anterior.year}"
-    
-elif periodo_hist == "Último 6 meses":
-    # Últimos 6 meses completos
-    seis_meses_atras = fecha_actual - relativedelta(months=6)
-    df_hist = df_hist[
-        (df_hist['fecha'] >= seis_meses_atras.replace(day=1)) &
-        (df_hist['fecha'] <= fecha_actual)
-    ]
-    titulo_periodo = "Últimos 6 meses"
-    
-elif periodo_hist == "Último año":
-    # Último año completo
-    df_hist = df_hist[df_hist['año'] == fecha_actual.year - 1]
-    titulo_periodo = f"Año {fecha_actual.year - 1}"
-
-if df_hist.empty:
-    st.warning(f"No hay datos disponibles para el período: {periodo_hist}.")
-else:
-    if 'produccion_real_unidades' not in df_hist.columns:
-        st.error("La columna 'produccion_real_unidades' no existe.")
+    # Figura del día desde la caché compartida entre procesos
+    fecha_actual = datetime.now()
+    resultado = obtener_cache_resultados().obtener(
+        ('histogramas', datos['version'], periodo_hist, fecha_actual.date()),
+        lambda: resultado_histogramas(datos, periodo_hist, fecha_actual))
+
+    if resultado is None:
+        st.warning(f"No hay datos disponibles para el período: {periodo_hist}.")
     else:
-        # Obtener líneas únicas
-        lineas_unicas = sorted(df_hist['linea_produccion'].dropna().unique())
-        
-        if not lineas_unicas:
-            st.warning("No hay datos de líneas de producción para el período seleccionado.")
-        else:
-            # Calcular número de columnas (máximo 4 por fila)
-            n_lineas = len(lineas_unicas)
-            n_cols = min(4, n_lineas)
-            n_rows = (n_lineas + n_cols - 1) // n_cols
-            
-            # Importar make_subplots
-            from plotly.subplots import make_subplots
-            
-            # Crear subplots
-            fig = make_subplots(
-                rows=n_rows, 
-                cols=n_cols,
-                subplot_titles=lineas_unicas,
-                horizontal_spacing=0.05,
-                vertical_spacing=0.1
-            )
-            
-            # Colores minimalistas
-            color_barras = "#030585"  # Gris azulado oscuro
-            color_media = "#111111"   # Rojo
-            color_mediana = "#F7F8FA" # Azul oscuro
-            
-            # Crear un histograma por línea
-            for i, linea in enumerate(lineas_unicas):
-                row = (i // n_cols) + 1
-                col = (i % n_cols) + 1
-                
-                # Filtrar datos de la línea
-                data_linea = df_hist[df_hist['linea_produccion'] == linea]['produccion_real_unidades']
-                
-                if not data_linea.empty and data_linea.notna().any():
-                    # Calcular estadísticas
-                    media = data_linea.mean()
-                    mediana = data_linea.median()
-                    
-                    # Crear histograma con pocos bins
-                    hist_data = data_linea.dropna()
-                    if len(hist_data) > 0:
-                        # Crear histograma
-                        fig.add_trace(
-                            go.Histogram(
-                                x=hist_data,
-                                nbinsx=15,  # Pocos bins para mini histogramas
-                                name=linea,
-                                marker_color=color_barras,
-                                opacity=0.8,
-                                showlegend=False,
-                                hovertemplate=f'Línea: {linea}<br>Producción: %{{x:,.0f}}<br>Frecuencia: %{{y}}<extra></extra>'
-                            ),
-                            row=row, col=col
-                        )
-                        
-                        # Añadir línea de media
-                        y_max = hist_data.value_counts().max() * 1.1 if len(hist_data.value_counts()) > 0 else 1
-                        fig.add_trace(
-                            go.Scatter(
-                                x=[media, media],
-                                y=[0, y_max],
-                                mode='lines',
-                                line=dict(color=color_media, width=1.5, dash='dash'),
-                                name='Media',
-                                showlegend=False,
-                                hovertemplate=f'Media: {media:,.0f}<extra></extra>'
-                            ),
-                            row=row, col=col
-                        )
-                        
-                        # Añadir línea de mediana
-                        fig.add_trace(
-                            go.Scatter(
-                                x=[mediana, mediana],
-                                y=[0, y_max],
-                                mode='lines',
-                                line=dict(color=color_mediana, width=1.5, dash='dot'),
-                                name='Mediana',
-                                showlegend=False,
-                                hovertemplate=f'Mediana: {mediana:,.0f}<extra></extra>'
-                            ),
-                            row=row, col=col
-                        )
-            
-            # Configurar layout ultra minimalista
-            fig.update_layout(
-                title=f"Distribución de Producción - {titulo_periodo}",
-                height=150 * n_rows,  # Altura dinámica
-                showlegend=False,
-                plot_bgcolor='white',
-                paper_bgcolor='white',
-                font=dict(size=9),
-                margin=dict(l=20, r=20, t=60, b=20)
-            )
-            
-            # Configurar ejes minimalistas
-            fig.update_xaxes(
-                showgrid=False,
-                showticklabels=True,
-                tickfont=dict(size=10,color='#000000'),
-                title_font=dict(size=8)
-            )
-            
-            fig.update_yaxes(
-                showgrid=False,
-                showticklabels=False,
-                title_text=''
-            )
-            
-            # Ajustar títulos de subplots
-            fig.update_annotations(font_size=20)
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
\ No newline at end of file
+        st.plotly_chart(abrir_figura(resultado['figura']), use_container_width=True)
+
+
+seccion_cascada(datos, año_seleccionado, mes_seleccionado, linea_seleccionada)
+seccion_comparativo(datos, linea_seleccionada)
+seccion_pareto(datos)
+seccion_histogramas(datos)
@@ -0,0 +1,74 @@
+"""
+Histogramas calculados en el servidor.
+
+En lugar de mandar al navegador cada valor de producción por turno, se calculan
+aquí los conteos por intervalo de cada línea y se dibujan como barras: el gráfico
+pesa lo mismo con una semana o con años de turnos. La media y la mediana salen de
+la misma pasada (un solo ordenamiento por línea y valor).
+
+Los períodos del selector se resuelven aquí (`rango_periodo`) para que el dashboard
+y el precálculo en segundo plano (`precalculo`) usen los mismos rangos.
+"""
+import calendar
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+# Pocos intervalos para los mini histogramas
+INTERVALOS = 15
+
+# bordes: INTERVALOS + 1 límites; conteos: turnos por intervalo (el último incluye su límite superior)
+Histograma = namedtuple('Histograma', ['bordes', 'conteos', 'media', 'mediana', 'n'])
+
+# Períodos del selector de los mini histogramas
+PERIODOS = ["YTD", "Último mes", "Último 6 meses", "Último año"]
+
+
+def rango_periodo(periodo, hoy):
+    """(inicio, fin, título) de un período del selector, relativo al día `hoy` (datetime)."""
+    if periodo == "YTD":
+        # Year to date (desde inicio del año actual)
+        return f"{hoy.year}-01-01", f"{hoy.year}-12-31", f"YTD {hoy.year}"
+    if periodo == "Último mes":
+        # Último mes completo
+        ultimo_dia_mes_anterior = hoy.replace(day=1) - timedelta(days=1)
+        primer_dia_mes_anterior = ultimo_dia_mes_anterior.replace(day=1)
+        return (primer_dia_mes_anterior, ultimo_dia_mes_anterior,
+                f"{calendar.month_name[primer_dia_mes_anterior.month]} {primer_dia_mes_anterior.year}")
+    if periodo == "Último 6 meses":
+        # Últimos 6 meses completos
+        return (hoy - relativedelta(months=6)).replace(day=1), hoy, "Últimos 6 meses"
+    # Último año completo
+    return f"{hoy.year - 1}-01-01", f"{hoy.year - 1}-12-31", f"Año {hoy.year - 1}"
+
+
+def histogramas_por_linea(lineas, valores, intervalos=INTERVALOS):
+    """
+    Histograma de `valores` para cada línea, con intervalos iguales entre su mínimo y su máximo.
+    Devuelve {linea: Histograma} en orden de línea; los valores vacíos no cuentan.
+    """
+    valores = pd.to_numeric(pd.Series(valores), errors='coerce').to_numpy(dtype=float)
+    lineas = pd.Series(lineas).to_numpy()
+    validos = ~np.isnan(valores) & pd.notna(lineas)
+    codigos, unicas = pd.factorize(lineas[validos], sort=True)
+    valores = valores[validos]
+
+    # Un solo ordenamiento: por línea y, dentro de cada línea, por valor
+    orden = np.lexsort((valores, codigos))
+    valores = valores[orden]
+    limites = np.searchsorted(codigos[orden], np.arange(len(unicas) + 1))
+
+    resultado = {}
+    for i, linea in enumerate(unicas):
+        v = valores[limites[i]:limites[i + 1]]
+        n = len(v)
+        minimo, maximo = (v[0] - 0.5, v[0] + 0.5) if v[0] == v[-1] else (v[0], v[-1])
+        bordes = np.linspace(minimo, maximo, intervalos + 1)
+        # Con los valores ordenados, el conteo de cada intervalo es la distancia entre dos búsquedas
+        conteos = np.diff(np.append(np.searchsorted(v, bordes[:-1], 'left'), n))
+        mediana = (v[(n - 1) // 2] + v[n // 2]) / 2
+        resultado[linea] = Histograma(bordes, conteos, v.mean(), mediana, n)
+    return resultado
@@ -0,0 +1,163 @@
+"""
+Carga masiva de reportes de turno desde CSV o Excel (por ejemplo, los cierres de mes del MES).
+
+    python importar_reportes.py cierre_agosto.xlsx
+    python importar_reportes.py cierre_agosto.csv --paros paros_agosto.csv
+    python importar_reportes.py cierre_agosto.csv --validar    # solo valida, no guarda
+
+Cada fila es un turno con las columnas de `registros_produccion.csv`. Los paros pueden
+venir en las mismas filas (paro_causal_N, paro_subcausal_N, tiempo_paro_min_N) o en un
+archivo aparte en formato largo (fecha, turno, linea_produccion, causal, subcausal, minutos).
+
+Todas las filas se validan juntas con las reglas del formulario (`reglas_oee`). Las válidas
+se guardan en una sola escritura, reemplazando el reporte existente del mismo turno; las
+inválidas quedan en `<archivo>.cuarentena.csv` con el motivo del rechazo.
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from almacenamiento import (CLAVE_REPORTE, COLUMNAS_PAROS, ENCABEZADO_REGISTROS, guardar_reportes,
+                            inicializar_almacenamiento, leer_registros, separar_paros)
+from catalogo_productos import CATALOGO_VACIO, obtener_catalogo
+from reglas_oee import COLUMNAS_NUMERICAS, TIEMPO_TURNO_MIN, recalcular_tiempos, tiempo_a_justificar, validar_reportes
+
+
+def leer_archivo(ruta):
+    """Lee un CSV o un Excel según la extensión."""
+    if os.path.splitext(ruta)[1].lower() in ('.xlsx', '.xls'):
+        return pd.read_excel(ruta)
+    return pd.read_csv(ruta)
+
+
+def _parsear_fechas(fechas):
+    """Acepta fechas ISO (AAAA-MM-DD) o con el día primero (DD/MM/AAAA), como las exporta el MES."""
+    iso = pd.to_datetime(fechas, format='%Y-%m-%d', errors='coerce')
+    resto = iso.isna() & fechas.notna()
+    if resto.any():
+        iso[resto] = pd.to_datetime(fechas[resto].astype(str), format='mixed', dayfirst=True, errors='coerce')
+    return iso
+
+
+def _normalizar_clave(df):
+    """Fecha en formato ISO y turno entero, como los guarda el formulario; lo que no se pueda convertir se conserva para la cuarentena."""
+    df = df.copy()
+    fechas = _parsear_fechas(df['fecha'])
+    df['fecha'] = fechas.dt.strftime('%Y-%m-%d').where(fechas.notna(), df['fecha'])
+    df['turno'] = pd.to_numeric(df['turno'], errors='coerce').astype('Int64')
+    df['linea_produccion'] = df['linea_produccion'].astype('string').str.strip()
+    return df
+
+
+def preparar_reportes(registros, paros=None):
+    """
+    Devuelve (registros, paros) listos para validar, enlazados por un report_id provisorio
+    ('F' + número de fila). Completa los tiempos que el formulario calcula solo.
+    """
+    registros = registros.drop(columns=['report_id'], errors='ignore').reset_index(drop=True)
+    registros, paros_filas = separar_paros(registros, 'F')
+    registros = _normalizar_clave(registros)
+    for col in COLUMNAS_NUMERICAS:
+        if col in registros.columns:
+            registros[col] = pd.to_numeric(registros[col], errors='coerce')
+
+    if 'tiempo_disponible_min' not in registros.columns:
+        registros['tiempo_disponible_min'] = TIEMPO_TURNO_MIN
+    if 'tiempo_efectivo_min' not in registros.columns or 'tiempo_no_conformidad_min' not in registros.columns:
+        # Solo viene la producción: los tiempos se calculan con los estándares, como en el formulario
+        for col in ['tiempo_efectivo_min', 'tiempo_no_conformidad_min', 'tiempo_a_justificar_min']:
+            registros[col] = float('nan')
+        registros = recalcular_tiempos(registros, (obtener_catalogo() or CATALOGO_VACIO).estandares)
+    elif 'tiempo_a_justificar_min' not in registros.columns:
+        registros['tiempo_a_justificar_min'] = tiempo_a_justificar(
+            pd.to_numeric(registros['tiempo_programado_min'], errors='coerce'),
+            pd.to_numeric(registros['tiempo_efectivo_min'], errors='coerce'),
+            pd.to_numeric(registros['tiempo_no_conformidad_min'], errors='coerce'))
+
+    if paros is not None:
+        # Los paros del archivo aparte se enlazan con su turno por fecha, turno y línea
+        paros = _normalizar_clave(paros)
+        claves = registros[CLAVE_REPORTE + ['report_id']].drop_duplicates(CLAVE_REPORTE, keep='last')
+        paros = paros.merge(claves, on=CLAVE_REPORTE, how='left')
+        sin_reporte = paros['report_id'].isna().sum()
+        if sin_reporte:
+            print(f"⚠️ {sin_reporte} paros no corresponden a ningún turno del archivo y se ignoran.")
+        paros_filas = pd.concat([paros_filas, paros.dropna(subset=['report_id'])[COLUMNAS_PAROS]],
+                                ignore_index=True)
+
+    return registros, paros_filas.reset_index(drop=True)
+
+
+def clasificar(registros, paros):
+    """Motivo de rechazo por fila ('' si es válida), incluidos los turnos repetidos dentro del archivo."""
+    motivos = validar_reportes(registros, paros)
+    repetidos = registros.duplicated(CLAVE_REPORTE, keep='last') & (motivos == '')
+    motivos[repetidos] = "turno repetido en el archivo (se importa la última fila)"
+    return motivos
+
+
+def _a_lote(registros, paros):
+    """Convierte los DataFrames en la lista de (reporte, paros) que recibe guardar_reportes."""
+    # Ya validados: los tiempos y cantidades se guardan como enteros, igual que desde el formulario
+    registros = registros.copy()
+    for col in COLUMNAS_NUMERICAS + ['tiempo_disponible_min']:
+        registros[col] = pd.to_numeric(registros[col]).round().astype('int64')
+    registros['turno'] = registros['turno'].astype('int64')
+    paros = paros.assign(minutos=pd.to_numeric(paros['minutos']).round().astype('int64'))
+    paros_por_reporte = {
+        report_id: grupo[['causal', 'subcausal', 'minutos']].to_dict('records')
+        for report_id, grupo in paros.groupby('report_id', sort=False)
+    }
+    columnas = [col for col in ENCABEZADO_REGISTROS if col != 'report_id' and col in registros.columns]
+    lote = []
+    for reporte in registros[['report_id'] + columnas].to_dict('records'):
+        report_id = reporte.pop('report_id')
+        lote.append((reporte, paros_por_reporte.get(report_id, [])))
+    return lote
+
+
+def importar(ruta, ruta_paros=None, solo_validar=False, ruta_cuarentena=None):
+    """Valida e importa un archivo; devuelve (importados, nuevos, en cuarentena)."""
+    original = leer_archivo(ruta)
+    registros, paros = preparar_reportes(original, leer_archivo(ruta_paros) if ruta_paros else None)
+    motivos = clasificar(registros, paros)
+    rechazados = motivos != ''
+
+    if rechazados.any():
+        ruta_cuarentena = ruta_cuarentena or os.path.splitext(ruta)[0] + '.cuarentena.csv'
+        cuarentena = original.reset_index(drop=True)[rechazados.to_numpy()].copy()
+        cuarentena['motivo'] = motivos[rechazados].to_numpy()
+        cuarentena.to_csv(ruta_cuarentena, index=False, encoding='utf-8')
+        print(f"🚫 {int(rechazados.sum())} filas en cuarentena: {ruta_cuarentena}")
+        for motivo, n in motivos[rechazados].value_counts().items():
+            print(f"   - {motivo}: {n}")
+
+    validos = registros[~rechazados]
+    paros_validos = paros[paros['report_id'].isin(validos['report_id'])]
+    existentes = leer_registros(columnas=CLAVE_REPORTE)
+    claves_existentes = set(existentes[CLAVE_REPORTE].astype(str).itertuples(index=False, name=None))
+    nuevos = sum(clave not in claves_existentes
+                 for clave in validos[CLAVE_REPORTE].astype(str).itertuples(index=False, name=None))
+
+    if solo_validar:
+        print(f"✅ {len(validos)} filas válidas ({nuevos} nuevas, {len(validos) - nuevos} reemplazarían un reporte existente).")
+        return 0, nuevos, int(rechazados.sum())
+
+    if len(validos):
+        guardar_reportes(_a_lote(validos, paros_validos))
+    print(f"✅ {len(validos)} reportes importados ({nuevos} nuevos, {len(validos) - nuevos} reemplazados), "
+          f"{len(paros_validos)} paros.")
+    return len(validos), nuevos, int(rechazados.sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa reportes de turno desde un CSV o Excel.")
+    parser.add_argument('archivo', help="CSV o Excel con un turno por fila.")
+    parser.add_argument('--paros', help="Archivo aparte con los paros en formato largo.")
+    parser.add_argument('--validar', action='store_true', help="Solo valida y genera la cuarentena, sin guardar.")
+    parser.add_argument('--cuarentena', help="Ruta del CSV de filas rechazadas (por defecto <archivo>.cuarentena.csv).")
+    args = parser.parse_args()
+
+    inicializar_almacenamiento()
+    importar(args.archivo, args.paros, args.validar, args.cuarentena)
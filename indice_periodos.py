@@ -0,0 +1,105 @@
+"""
+Índice de sumas acumuladas por línea y día para consultar cualquier período.
+
+Por cada línea se guardan los días con datos (ordenados) y, para cada uno, las
+sumas acumuladas hasta ese día de los minutos de paro por causal/subcausal y de
+los componentes del agregado de OEE (turnos, tiempos, producción, defectuosos).
+El total de un rango [desde, hasta] es la resta de dos filas acumuladas: dos
+búsquedas binarias y una resta del largo de las categorías, sin volver a filtrar
+el historial. Así los botones de período y un rango de fechas arbitrario cuestan
+lo mismo.
+
+Se construye una vez por versión de los datos, junto con el resto de lo que el
+dashboard carga.
+"""
+import numpy as np
+import pandas as pd
+
+from agregados_oee import COMPONENTES, AgregadoOEE
+from analisis_paros import NIVELES_PARETO, clasificar_pareto, codificar
+
+
+def _dias(fechas):
+    return pd.to_datetime(pd.Series(fechas)).to_numpy(dtype='datetime64[D]')
+
+
+def _acumular(dias, lineas, pesos, columnas, codigos=None):
+    """
+    Suma por línea y día y acumula por línea. `pesos` es una matriz con `columnas` columnas
+    (una fila por registro) o, si se dan `codigos`, un vector con la columna de cada registro.
+    Devuelve {linea: (días ordenados, acumulado con una fila de ceros al inicio)}.
+    """
+    resultado = {}
+    codigos_linea, unicas = pd.factorize(lineas)
+    for i, linea in enumerate(unicas):
+        en_linea = codigos_linea == i
+        dias_linea, posicion = np.unique(dias[en_linea], return_inverse=True)
+        posicion = posicion.ravel()
+        n = len(dias_linea)
+        if codigos is None:
+            suma = np.column_stack([np.bincount(posicion, weights=pesos[en_linea, j], minlength=n)
+                                    for j in range(columnas)]) if columnas else np.zeros((n, 0))
+        else:
+            suma = np.bincount(posicion * columnas + codigos[en_linea], weights=pesos[en_linea],
+                               minlength=n * columnas).reshape(n, columnas)
+        acumulado = np.zeros((n + 1, columnas))
+        np.cumsum(suma, axis=0, out=acumulado[1:])
+        resultado[linea] = (dias_linea, acumulado)
+    return resultado
+
+
+def _rango(dias, acumulado, desde, hasta):
+    """Suma de las filas con día en [desde, hasta] (None deja el extremo abierto)."""
+    inicio = 0 if desde is None else np.searchsorted(dias, np.datetime64(pd.Timestamp(desde).date(), 'D'), 'left')
+    fin = len(dias) if hasta is None else np.searchsorted(dias, np.datetime64(pd.Timestamp(hasta).date(), 'D'), 'right')
+    return acumulado[max(fin, inicio)] - acumulado[inicio]
+
+
+class IndicePeriodos:
+    """Sumas acumuladas por línea y día de paros (por causal/subcausal) y del agregado de OEE."""
+
+    def __init__(self, celdas, paros):
+        """
+        `celdas`: agregados diarios por línea (como las celdas del cubo de OEE).
+        `paros`: paros en formato largo con fecha, línea, causal, subcausal y minutos
+        (si ya traen `fecha_dt` convertida, se usa esa columna).
+        """
+        self.componentes = _acumular(_dias(celdas['fecha']), celdas['linea_produccion'].to_numpy(),
+                                     celdas[COMPONENTES].to_numpy(dtype=float), len(COMPONENTES))
+
+        minutos = pd.to_numeric(paros['minutos'], errors='coerce').to_numpy(dtype=float)
+        validos = paros['causal'].notna().to_numpy() & (minutos > 0)
+        cod_causal, causales = codificar(paros['causal'])
+        cod_subcausal, subcausales = codificar(paros['subcausal'])
+        # Un código por par causal/subcausal, numerado en el orden en que aparecen los paros
+        pares, combinados = pd.factorize(cod_causal[validos] * len(subcausales) + cod_subcausal[validos])
+        causal_par, subcausal_par = np.divmod(combinados, len(subcausales))
+        self.categorias = pd.DataFrame({'causal': causales[causal_par], 'subcausal': subcausales[subcausal_par]})
+        # Cada par apunta a su causal, numerada también por orden de aparición
+        self._causal_de_par, self._causales = pd.factorize(self.categorias['causal'])
+
+        fechas = paros['fecha_dt'] if 'fecha_dt' in paros.columns else paros['fecha']
+        self.paros = _acumular(_dias(fechas.to_numpy()[validos]), paros['linea_produccion'].to_numpy()[validos],
+                               minutos[validos], len(combinados), codigos=pares)
+
+    def agregado(self, linea, desde=None, hasta=None):
+        """AgregadoOEE de la línea en el rango de fechas (inclusivo)."""
+        if linea not in self.componentes:
+            return AgregadoOEE.vacio()
+        return AgregadoOEE(*_rango(*self.componentes[linea], desde, hasta))
+
+    def minutos_paro(self, linea, desde=None, hasta=None, nivel='subcausal'):
+        """Minutos de paro de la línea en el rango por causal o por par causal/subcausal (en el orden de `categorias`)."""
+        if linea in self.paros:
+            minutos = _rango(*self.paros[linea], desde, hasta)
+        else:
+            minutos = np.zeros(len(self.categorias))
+        if nivel == 'causal':
+            return np.bincount(self._causal_de_par, weights=minutos, minlength=len(self._causales))
+        return minutos
+
+    def pareto(self, linea, desde=None, hasta=None, nivel='causal'):
+        """Pareto de paros de la línea en el rango, con el formato de `clasificar_pareto`."""
+        barras = (pd.DataFrame({'causal': np.asarray(self._causales, dtype=object)}) if nivel == 'causal'
+                  else self.categorias[NIVELES_PARETO[nivel]])
+        return clasificar_pareto(barras, self.minutos_paro(linea, desde, hasta, nivel))
@@ -0,0 +1,234 @@
+"""
+Instantánea compartida de los datos tipados para los dashboards.
+
+El escritor publica, después de cada lote guardado, los registros y paros ya tipados
+(`esquema`) en archivos Arrow IPC (Feather v2, sin compresión) dentro de
+`registros_produccion.instantanea/`. Los archivos nunca se modifican: cada
+publicación escribe archivos nuevos y cambia el puntero `actual.json` con un
+reemplazo atómico, así que un lector ve la instantánea anterior o la nueva, nunca
+una a medias.
+
+Los dashboards abren la instantánea de la versión vigente con un mapeo de memoria.
+Con pandas 3, cuyas columnas de texto usan pyarrow, los textos (report_id, fecha, que
+son la mayor parte de cada fila) quedan respaldados por el archivo mapeado sin
+copiarse, así que todos los procesos que leen la misma versión comparten una sola
+copia física en la caché de páginas; los números, fechas y códigos de categoría sí
+se materializan en cada proceso. Con pandas 2 los textos se convierten a objetos de
+Python en cada proceso: la instantánea sigue evitando leer y tipar el almacenamiento,
+pero no comparte esa memoria. Si la
+instantánea no corresponde a la versión de los datos (por ejemplo, tras una
+importación o una compactación hecha por otro proceso) o de la taxonomía de paros
+(los paros se guardan con sus nombres), o del código de la aplicación (los agregados
+se guardan con sus clases), se lee del almacenamiento como antes y se pide una
+publicación nueva.
+
+La publicación corre en un hilo aparte para no demorar la confirmación de los
+guardados; varios lotes seguidos se publican una sola vez. Los datos salen de la
+lectura incremental (`lectura_incremental`), así que publicar después de un turno
+nuevo solo parsea ese turno. Con cada instantánea se publican también los agregados
+que el dashboard necesita para su primer dibujo (`precalculo`), en un pickle al lado
+de los archivos Arrow.
+"""
+import json
+import os
+import pickle
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from almacenamiento import BloqueoArchivo, nuevo_report_id, obtener_almacenamiento, version_de
+from cache_resultados import version_codigo
+from cubo_oee import obtener_cubo
+from lectura_incremental import obtener_lectura_incremental
+from precalculo import agregados_dashboard
+from taxonomia_paros import obtener_taxonomia
+
+INSTANTANEA_DIR = 'registros_produccion.instantanea'
+ARCHIVO_ACTUAL = 'actual.json'
+TABLAS = ('registros', 'paros')
+
+# Instantáneas que se conservan: la vigente y la anterior, que puede estar abriendo algún lector
+INSTANTANEAS_CONSERVADAS = 2
+
+# agregados: los de `precalculo.agregados_dashboard`, o None si no vienen de la instantánea
+DatosInstantanea = namedtuple('DatosInstantanea', ['registros', 'paros', 'agregados'])
+
+_instantaneas = {}
+_lock_instantaneas = threading.Lock()
+
+
+def _version(almacenamiento):
+    """
+    Versión de los datos, de la taxonomía con la que se nombran los paros y del código que
+    armó los agregados (el pickle guarda sus clases): un despliegue también pide publicar.
+    """
+    return f"{version_de(almacenamiento)}|{obtener_taxonomia().version}|{version_codigo()}"
+
+
+def _leer_tabla(ruta):
+    """DataFrame respaldado por el archivo mapeado en memoria (con pandas 3, sin copiar las columnas de texto)."""
+    tabla = pa.ipc.open_file(pa.memory_map(ruta, 'r')).read_all()
+    return tabla.to_pandas(split_blocks=True, self_destruct=False)
+
+
+class Instantanea:
+    """Archivos Arrow de los datos tipados por versión, con un puntero a la vigente y un hilo publicador."""
+
+    def __init__(self, directorio=INSTANTANEA_DIR):
+        self.directorio = directorio
+        self._lock = BloqueoArchivo(directorio + '.lock')
+        self._pendiente = threading.Event()
+        self._hilo = None
+        self._lock_hilo = threading.Lock()
+        self._almacenamiento = None
+
+    def actual(self):
+        """Puntero de la instantánea vigente ({'version', 'archivos'}), o None si no hay ninguna."""
+        try:
+            with open(os.path.join(self.directorio, ARCHIVO_ACTUAL), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def abrir(self, almacenamiento):
+        """DatosInstantanea de la instantánea si corresponde a la versión vigente de los datos; None si no."""
+        puntero = self.actual()
+        if puntero is None or puntero['version'] != _version(almacenamiento):
+            return None
+        try:
+            registros, paros = (_leer_tabla(os.path.join(self.directorio, puntero['archivos'][tabla])) for tabla in TABLAS)
+            with open(os.path.join(self.directorio, puntero['archivos']['agregados']), 'rb') as file:
+                agregados = pickle.load(file)
+        except (OSError, EOFError, pa.ArrowInvalid, KeyError, pickle.UnpicklingError):
+            # Se reemplazó y limpió entre leer el puntero y abrir los archivos
+            return None
+        except (AttributeError, ImportError):
+            # Agregados de otra versión del código (clases renombradas o movidas): se lee del almacenamiento
+            return None
+        return DatosInstantanea(registros, paros, agregados)
+
+    def cargar(self, almacenamiento):
+        """
+        DatosInstantanea vigentes: desde la instantánea si está publicada, o los registros y
+        paros desde el almacenamiento, sin agregados (y se pide publicarla para los demás procesos).
+        """
+        datos = self.abrir(almacenamiento)
+        if datos is not None:
+            return datos
+        self.solicitar(almacenamiento)
+        return DatosInstantanea(*obtener_lectura_incremental(almacenamiento).leer(), None)
+
+    def publicar(self, almacenamiento):
+        """
+        Escribe la instantánea de la versión actual del almacenamiento, si no está ya publicada.
+        Si los datos cambian mientras se leen, se vuelve a leer para no publicar una mezcla.
+        """
+        with self._lock:
+            while True:
+                version = _version(almacenamiento)
+                puntero = self.actual()
+                if puntero is not None and puntero['version'] == version:
+                    return
+                datos = dict(zip(TABLAS, obtener_lectura_incremental(almacenamiento).leer()))
+                if _version(almacenamiento) == version:
+                    break
+            celdas = obtener_cubo().cargar(version_de(almacenamiento), datos['registros'], datos['paros'])
+            agregados = agregados_dashboard(datos['registros'], datos['paros'], celdas)
+
+            os.makedirs(self.directorio, exist_ok=True)
+            ficha = nuevo_report_id()[:12]
+            archivos = {}
+            for tabla, df in datos.items():
+                archivos[tabla] = f'{tabla}-{ficha}.arrow'
+                ruta = os.path.join(self.directorio, archivos[tabla])
+                # Sin compresión: es lo que permite leer las columnas directamente del archivo mapeado
+                feather.write_feather(df.reset_index(drop=True), ruta + '.tmp', compression='uncompressed')
+                os.replace(ruta + '.tmp', ruta)
+            archivos['agregados'] = f'agregados-{ficha}.pkl'
+            ruta = os.path.join(self.directorio, archivos['agregados'])
+            with open(ruta + '.tmp', 'wb') as file:
+                pickle.dump(agregados, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(ruta + '.tmp', ruta)
+
+            self._escribir_actual(version, archivos)
+            self._limpiar()
+
+    def _escribir_actual(self, version, archivos):
+        ruta_actual = os.path.join(self.directorio, ARCHIVO_ACTUAL)
+        with open(ruta_actual + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'version': version, 'archivos': archivos}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(ruta_actual + '.tmp', ruta_actual)
+
+    def conservar_version(self, antes, despues):
+        """
+        Vuelve a sellar la instantánea vigente con la versión de datos `despues` si era de la
+        versión `antes` (como las da `version_de`) y los datos no cambiaron.
+        """
+        with self._lock:
+            puntero = self.actual()
+            if puntero is not None and puntero['version'].startswith(antes + '|'):
+                self._escribir_actual(despues + puntero['version'][len(antes):], puntero['archivos'])
+
+    def _limpiar(self):
+        """Borra las instantáneas viejas; en Windows, las que sigan abiertas se borran en otra publicación."""
+        fichas = {}
+        for entrada in os.scandir(self.directorio):
+            if entrada.name.endswith(('.arrow', '.pkl')):
+                fichas.setdefault(os.path.splitext(entrada.name.split('-', 1)[1])[0], []).append(entrada)
+        viejas = sorted(fichas.values(), key=lambda archivos: max(a.stat().st_mtime_ns for a in archivos))
+        for archivos in viejas[:-INSTANTANEAS_CONSERVADAS]:
+            for archivo in archivos:
+                try:
+                    os.remove(archivo.path)
+                except OSError:
+                    pass
+
+    def solicitar(self, almacenamiento):
+        """Pide una publicación en segundo plano; las pedidas mientras se publica se juntan en una sola."""
+        with self._lock_hilo:
+            self._almacenamiento = almacenamiento
+            self._pendiente.set()
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._publicar_pendientes, name='publicador-instantanea',
+                                              daemon=True)
+                self._hilo.start()
+
+    def _publicar_pendientes(self):
+        while True:
+            # El pedido se toma y la salida se decide con el mismo bloqueo que usa `solicitar`: un
+            # pedido que llega mientras el hilo termina encuentra _hilo en None y arranca otro
+            with self._lock_hilo:
+                if not self._pendiente.is_set():
+                    self._hilo = None
+                    return
+                self._pendiente.clear()
+                almacenamiento = self._almacenamiento
+            try:
+                self.publicar(almacenamiento)
+            except Exception:
+                # La instantánea queda desactualizada y los dashboards leen del almacenamiento
+                pass
+
+    @contextmanager
+    def publicar_al_guardar(self, almacenamiento, lote):
+        """Observador del escritor: pide una publicación cuando el lote quedó escrito."""
+        yield
+        self.solicitar(almacenamiento)
+
+
+def obtener_instantanea(directorio=INSTANTANEA_DIR):
+    """Instantánea compartida por todas las sesiones del proceso."""
+    with _lock_instantaneas:
+        if directorio not in _instantaneas:
+            _instantaneas[directorio] = Instantanea(directorio)
+        return _instantaneas[directorio]
+
+
+def leer_instantanea():
+    """DatosInstantanea vigentes del backend configurado, desde la instantánea si está publicada."""
+    return obtener_instantanea().cargar(obtener_almacenamiento())
@@ -0,0 +1,104 @@
+"""
+Historial tipado en memoria que se pone al día leyendo solo lo nuevo.
+
+Normalmente, entre una lectura y la siguiente solo se agregaron uno o pocos turnos
+al journal. Con los backends que lo permiten (`leer_desde`, hoy el CSV) se parsean
+solo las filas agregadas desde la última lectura y se suman a los DataFrames ya
+tipados: un reporte de reemplazo saca al anterior (y a sus paros) y se agrega al
+final, igual que en una lectura completa. Si los archivos se reescribieron
+(compactación, importación) se vuelve a leer todo. Los demás backends se leen
+completos cada vez que cambia la versión de los datos.
+
+Si cambió la taxonomía de paros, los paros que ya estaban en memoria se vuelven a
+nombrar sin leer el almacenamiento.
+"""
+import threading
+
+import pandas as pd
+
+from almacenamiento import CLAVE_REPORTE, version_de
+from esquema import concatenar, tipar_paros, tipar_registros
+from taxonomia_paros import obtener_taxonomia
+
+_lecturas = {}
+_lock_lecturas = threading.Lock()
+
+
+def _claves(df):
+    """Clave de cada reporte, con los números comparados por valor (el turno puede venir como Int8 o float)."""
+    columnas = [pd.to_numeric(df[c]).astype(float) if pd.api.types.is_numeric_dtype(df[c]) else df[c].astype(str)
+                for c in CLAVE_REPORTE]
+    return list(zip(*columnas))
+
+
+class LecturaIncremental:
+    """Registros y paros tipados de un backend, con la versión y la marca de lectura a las que corresponden."""
+
+    def __init__(self, almacenamiento):
+        self.almacenamiento = almacenamiento
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_taxonomia = None
+        self._marca = None
+        self._registros = None
+        self._paros = None
+
+    def leer(self):
+        """
+        (registros, paros) tipados vigentes. Son copias superficiales: agregarles columnas
+        no modifica los que se conservan para la próxima lectura.
+        """
+        with self._lock:
+            version = version_de(self.almacenamiento)
+            version_taxonomia = obtener_taxonomia().version
+            if version != self._version:
+                self._actualizar()
+                self._version = version
+            # Los paros que ya estaban en memoria quedaron con los nombres de la taxonomía anterior
+            if self._version_taxonomia is not None and version_taxonomia != self._version_taxonomia:
+                self._nombrar()
+            self._version_taxonomia = version_taxonomia
+            return self._registros.copy(deep=False), self._paros.copy(deep=False)
+
+    def _actualizar(self):
+        leer_desde = getattr(self.almacenamiento, 'leer_desde', None)
+        lectura = leer_desde(self._marca if self._registros is not None else None) if leer_desde else None
+        if lectura is None:
+            self._marca = None
+            self._registros = tipar_registros(self.almacenamiento.leer())
+            self._paros = tipar_paros(self.almacenamiento.leer_paros())
+            return
+        self._marca = lectura.marca
+        if lectura.completa:
+            self._registros = tipar_registros(lectura.registros)
+            self._paros = tipar_paros(lectura.paros)
+            return
+
+        nuevos = tipar_registros(lectura.registros)
+        if nuevos.empty:
+            return
+        registros = self._registros
+        # Solo se comparan las claves de los reportes de las mismas fechas que los nuevos
+        candidatos = registros.index[registros['fecha'].isin(nuevos['fecha'].unique())]
+        claves_nuevas = set(_claves(nuevos))
+        reemplazados = [i for i, clave in zip(candidatos, _claves(registros.loc[candidatos])) if clave in claves_nuevas]
+        ids_reemplazados = registros.loc[reemplazados, 'report_id']
+        paros = self._paros
+        if reemplazados:
+            registros = registros.drop(index=reemplazados)
+            paros = paros[~paros['report_id'].isin(ids_reemplazados)]
+        self._registros = concatenar(registros, nuevos)
+        self._paros = concatenar(paros, tipar_paros(lectura.paros))
+
+    def _nombrar(self):
+        """Vuelve a poner los nombres de causal y subcausal con la taxonomía vigente."""
+        causales, subcausales = obtener_taxonomia().nombres(self._paros['codigo_paro'])
+        self._paros = self._paros.assign(causal=pd.Categorical(causales), subcausal=pd.Categorical(subcausales))
+
+
+def obtener_lectura_incremental(almacenamiento):
+    """Lectura incremental de un backend, compartida por todas las sesiones del proceso."""
+    with _lock_lecturas:
+        if almacenamiento not in _lecturas:
+            _lecturas[almacenamiento] = LecturaIncremental(almacenamiento)
+        return _lecturas[almacenamiento]
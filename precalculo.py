@@ -0,0 +1,58 @@
+"""
+Agregados del dashboard calculados en segundo plano después de cada guardado.
+
+El publicador de la instantánea (`instantanea`) hace de trabajador: después de cada
+lote confirmado, además de los datos tipados publica lo que el dashboard arma para
+su primer dibujo, así el primer visitante después de un guardado no lo paga:
+
+- el cubo por día del mes, semana y mes: las series del comparativo anual y, por
+  línea y mes, los totales de la cascada;
+- los paros consolidados por línea, año y mes (barras de paro de la cascada);
+- el índice de sumas acumuladas del Pareto;
+- las barras de los mini histogramas de cada período, para el día en que se calcularon;
+- los años, meses y líneas de los selectores.
+
+El cubo diario ya se actualiza de forma incremental en cada guardado; el resto es una
+pasada vectorizada sobre el historial que el publicador tiene en memoria.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from almacenamiento import dimensiones_de, fecha_iso
+from analisis_paros import consolidar_paros
+from cubo_oee import NIVELES_CUBO, enrollar
+from histogramas import PERIODOS, histogramas_por_linea, rango_periodo
+from indice_periodos import IndicePeriodos
+
+
+def histogramas_periodo(registros, periodo, hoy):
+    """{linea: Histograma} de la producción por turno en un período del selector."""
+    if registros.empty:
+        return {}
+    inicio, fin, _ = rango_periodo(periodo, hoy)
+    en_periodo = ((registros['fecha_dt'] >= pd.Timestamp(fecha_iso(inicio)))
+                  & (registros['fecha_dt'] <= pd.Timestamp(fecha_iso(fin)))).to_numpy()
+    return histogramas_por_linea(registros.loc[en_periodo, 'linea_produccion'],
+                                 registros.loc[en_periodo, 'produccion_real_unidades'])
+
+
+def agregados_dashboard(registros, paros, celdas, hoy=None):
+    """
+    Agregados del dashboard a partir de los registros y paros tipados y de las celdas diarias
+    del cubo: {'dimensiones', 'paros_mes', 'cubo', 'indice', 'histogramas', 'hoy'}.
+    Los histogramas dependen del día (`hoy`, datetime; por defecto, ahora).
+    """
+    hoy = hoy or datetime.now()
+    paros = paros.assign(año=paros['fecha_dt'].dt.year, mes_num=paros['fecha_dt'].dt.month)
+    return {
+        'dimensiones': dimensiones_de(registros),
+        # Paros consolidados de todas las líneas y meses; la cascada solo toma su mes
+        'paros_mes': consolidar_paros(paros, por=['linea_produccion', 'año', 'mes_num']),
+        # Sumas por línea × año × día del mes / semana ISO / mes
+        'cubo': {nivel: enrollar(celdas, nivel) for nivel in NIVELES_CUBO},
+        # Sumas acumuladas por línea y día: el Pareto de cualquier período es la resta de dos filas
+        'indice': IndicePeriodos(celdas, paros),
+        'histogramas': {periodo: histogramas_periodo(registros, periodo, hoy) for periodo in PERIODOS},
+        'hoy': hoy.date(),
+    }
@@ -0,0 +1,124 @@
+"""
+Reglas de coherencia de los reportes de turno.
+
+Son las mismas que aplica el formulario de captura (`calculate_times` y
+`handle_editor_change`), escritas sobre columnas completas para validar de una
+vez miles de turnos, como en la carga masiva de `importar_reportes.py`.
+
+`calcular_tiempos_lote` es el cálculo de tiempos a partir de la producción: lo
+usan el formulario (un turno), el importador y los recálculos del historial.
+"""
+import numpy as np
+import pandas as pd
+
+# Diferencia admitida por redondeo entre la suma de tiempos y el tiempo programado
+TOLERANCIA_MIN = 1
+
+# Duración del turno; el estándar de cada producto son las unidades por turno completo
+TIEMPO_TURNO_MIN = 480
+
+TURNOS = [1, 2, 3]
+
+# Columnas que deben ser números no negativos
+COLUMNAS_NUMERICAS = ['tiempo_programado_min', 'tiempo_efectivo_min', 'tiempo_no_conformidad_min',
+                      'tiempo_a_justificar_min', 'produccion_real_unidades', 'produccion_defectuosa_unidades']
+
+
+def tiempo_a_justificar(tiempo_programado, tiempo_efectivo, tiempo_no_conformidad):
+    """Lo que falta del tiempo programado, redondeado y nunca negativo (acepta escalares o columnas)."""
+    return np.maximum(0, np.round(tiempo_programado - tiempo_efectivo - tiempo_no_conformidad))
+
+
+def calcular_tiempos_lote(tiempo_programado, produccion_real, produccion_defectuosa, estandar,
+                          tiempo_turno=TIEMPO_TURNO_MIN):
+    """
+    Calcula los tiempos de muchos turnos a la vez.
+    `produccion_real`, `produccion_defectuosa` y `estandar` son matrices turnos × productos
+    (los productos que no aplican a un turno van con estándar 0) o vectores de un producto
+    por turno. `tiempo_turno` puede ser un escalar o un valor por turno.
+    Devuelve arrays (tiempo_efectivo, tiempo_no_conformidad, tiempo_a_justificar); un turno
+    sin tiempo programado da los tres en 0.
+    """
+    programado = np.asarray(tiempo_programado, dtype=float)
+    real = np.asarray(produccion_real, dtype=float)
+    defectuosa = np.asarray(produccion_defectuosa, dtype=float)
+    estandar = np.asarray(estandar, dtype=float)
+    tiempo_turno = np.asarray(tiempo_turno, dtype=float)
+
+    por_producto = real.ndim > programado.ndim
+    if por_producto and tiempo_turno.ndim:
+        tiempo_turno = tiempo_turno[..., np.newaxis]
+
+    # Minutos que toma cada unidad; los productos sin estándar no suman tiempo
+    minutos_por_unidad = np.divide(tiempo_turno, estandar, out=np.zeros(np.broadcast(tiempo_turno, estandar).shape),
+                                   where=estandar > 0)
+    efectivo = real * minutos_por_unidad
+    no_conformidad = defectuosa * minutos_por_unidad
+    if por_producto:
+        efectivo = efectivo.sum(axis=-1)
+        no_conformidad = no_conformidad.sum(axis=-1)
+
+    con_programa = programado > 0
+    efectivo = np.where(con_programa, efectivo, 0.0)
+    no_conformidad = np.where(con_programa, no_conformidad, 0.0)
+    a_justificar = np.where(con_programa, tiempo_a_justificar(programado, efectivo, no_conformidad), 0).astype(int)
+    return efectivo, no_conformidad, a_justificar
+
+
+def recalcular_tiempos(registros, estandares, tiempo_turno=TIEMPO_TURNO_MIN):
+    """
+    Recalcula los tiempos de los reportes con un solo producto a partir de `estandares`
+    ({codigo: unidades por turno}), por ejemplo después de corregir un estándar.
+    Los reportes con varios productos guardan solo los totales y se devuelven sin cambios.
+    """
+    registros = registros.copy()
+    estandar = registros['producto_terminado'].map(estandares)
+    entradas = registros[['tiempo_programado_min', 'produccion_real_unidades', 'produccion_defectuosa_unidades']]
+    recalculables = (estandar.notna() & entradas.notna().all(axis=1)).to_numpy()
+    if not recalculables.any():
+        return registros
+
+    filas = registros[recalculables]
+    efectivo, no_conformidad, a_justificar = calcular_tiempos_lote(
+        filas['tiempo_programado_min'].to_numpy(), filas['produccion_real_unidades'].to_numpy(),
+        filas['produccion_defectuosa_unidades'].to_numpy(), estandar[recalculables].to_numpy(),
+        filas['tiempo_disponible_min'].to_numpy() if 'tiempo_disponible_min' in filas.columns else tiempo_turno)
+    registros.loc[recalculables, 'tiempo_efectivo_min'] = np.round(efectivo).astype(int)
+    registros.loc[recalculables, 'tiempo_no_conformidad_min'] = np.round(no_conformidad).astype(int)
+    registros.loc[recalculables, 'tiempo_a_justificar_min'] = a_justificar
+    return registros
+
+
+def validar_reportes(registros, paros):
+    """
+    Valida cada reporte contra las reglas del formulario.
+    `paros` está en formato largo con report_id. Devuelve una Serie alineada con
+    `registros` con el motivo de rechazo de cada fila, o '' si es válida.
+    Cuando una fila incumple varias reglas se informa la primera.
+    """
+    numericos = registros.reindex(columns=COLUMNAS_NUMERICAS).apply(pd.to_numeric, errors='coerce')
+    programado = numericos['tiempo_programado_min']
+    suma_tiempos = (numericos['tiempo_efectivo_min'] + numericos['tiempo_no_conformidad_min']
+                    + numericos['tiempo_a_justificar_min'])
+
+    minutos_paros = pd.to_numeric(paros['minutos'], errors='coerce')
+    total_paros = minutos_paros.groupby(paros['report_id']).sum()
+    total_paros = registros['report_id'].map(total_paros).fillna(0)
+    paros_invalidos = paros.loc[minutos_paros.isna() | (minutos_paros <= 0) | paros['causal'].isna(), 'report_id']
+
+    linea = registros['linea_produccion']
+    reglas = [
+        (pd.to_datetime(registros['fecha'], format='%Y-%m-%d', errors='coerce').isna(), "fecha inválida"),
+        (~pd.to_numeric(registros['turno'], errors='coerce').isin(TURNOS), "turno inválido"),
+        (linea.isna() | (linea.astype(str).str.strip() == ''), "sin línea de producción"),
+        (numericos.isna().any(axis=1) | (numericos < 0).any(axis=1), "tiempos o producción no numéricos o negativos"),
+        (programado <= 0, "tiempo programado debe ser mayor a 0"),
+        ((suma_tiempos - programado).abs() > TOLERANCIA_MIN,
+         "efectivo + no conformidad + a justificar no coincide con el tiempo programado"),
+        (registros['report_id'].isin(paros_invalidos), "paro sin causal o con minutos inválidos"),
+        # Misma holgura de redondeo que el botón Guardar del formulario
+        (total_paros > numericos['tiempo_a_justificar_min'] + TOLERANCIA_MIN, "la suma de paros excede el tiempo a justificar"),
+    ]
+    motivos = np.select([condicion.to_numpy(dtype=bool) for condicion, _ in reglas],
+                        [motivo for _, motivo in reglas], default='')
+    return pd.Series(motivos, index=registros.index)
@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
-import csv
-import os
+import numpy as np
 from datetime import datetime
 
+from almacenamiento import existe_reporte, guardar_reporte, inicializar_almacenamiento, version_registros
+from catalogo_productos import PRODUCTOS_FILE, obtener_catalogo
+from instantanea import leer_instantanea
+from reglas_oee import TIEMPO_TURNO_MIN, TOLERANCIA_MIN, calcular_tiempos_lote
+from taxonomia_paros import obtener_taxonomia
+
 # Configuración de página compacta
 st.set_page_config(
     page_title="Reporte de Productividad - OEE",
@@ -59,58 +64,30 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Funciones base ---
-def create_initial_csv_files():
-    registros_file = 'registros_produccion.csv'
-    if not os.path.exists(registros_file):
-        with open(registros_file, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            header = ['fecha', 'turno', 'supervisor', 'linea_produccion', 'tiempo_disponible_min',
-                      'tiempo_programado_min', 'producto_terminado', 'produccion_real_unidades', 'produccion_defectuosa_unidades',
-                      'tiempo_efectivo_min', 'tiempo_no_conformidad_min', 'tiempo_a_justificar_min']
-            for i in range(1, 11):
-                header.extend([f'paro_causal_{i}', f'paro_subcausal_{i}', f'tiempo_paro_min_{i}'])
-            writer.writerow(header)
-
 def cargar_productos():
+    # Catálogo compartido por todas las sesiones; se relee solo si cambió productos.csv
     productos = {}
     lineas_disponibles = []
     
-    if os.path.exists('productos.csv'):
-        try:
-            df_productos = pd.read_csv('productos.csv')
-            for index, row in df_productos.iterrows():
-                productos[row['codigo_producto']] = row.to_dict()
-            
-            lineas_disponibles = sorted(df_productos['linea_produccion'].dropna().unique().tolist())
-            
-        except Exception as e:
-            st.error(f"Error al cargar productos: {e}")
-    else:
-        st.warning("El archivo 'productos.csv' no existe. Por favor, cree este archivo para continuar.")
+    try:
+        catalogo = obtener_catalogo()
+        if catalogo is not None:
+            productos = catalogo.productos
+            lineas_disponibles = catalogo.lineas
+        else:
+            st.warning(f"El archivo '{PRODUCTOS_FILE}' no existe. Por favor, cree este archivo para continuar.")
+    except Exception as e:
+        st.error(f"Error al cargar productos: {e}")
     
     return productos, lineas_disponibles
 
-causales_paros = {
-    "Falla de equipo": ["Fallo mecanico", "Fallo electrico", "Falla de sensores", "Fuga de aceite/aire"],
-    "Mantenimiento no programado": ["Ajustes de emergencia", "Cambio de repuestos criticos", "Inspecciones correctivas"],
-    "Cambio de producto / setup": ["Ajuste de maquina", "Limpieza de linea", "Cambio de herramientas/moldes"],
-    "Abastecimiento de materiales": ["Falta de materia prima", "Retraso de logistica interna", "Retraso de proveedor externo", "Material defectuoso recibido"],
-    "Calidad del producto": ["Producto fuera de especificacion", "Reproceso en linea", "Bloqueo por inspeccion de calidad"],
-    "Problemas de planeacion/programa": ["Orden cancelada", "Espera por programacion", "Secuencia incorrecta"],
-    "Servicios auxiliares": ["Falta de energia electrica", "Corte de agua", "Falla de aire comprimido", "Fallo de vapor/gas"],
-    "Mano de obra / personal": ["Falta de operador", "Capacitacion en maquina", "Relevo de turno retrasado"],
-    "Retrabajo / reproceso": ["Ajuste de lote", "Correccion por error de empaque", "Correccion por error de etiquetado"],
-    "Inicio / fin de produccion": ["Arranque de linea (puesta a punto)", "Parada por fin de orden de produccion", "Limpieza final"],
-    "Perdida de velocidad": ["Materia Prima", "Equipos/Proceso", "Gestión/Personal"]
-}
-
 def initialize_session_state():
     if 'report_products' not in st.session_state:
         st.session_state.report_products = []
     if 'unplanned_stops' not in st.session_state:
         st.session_state.unplanned_stops = []
-    if 'productos' not in st.session_state:
-        st.session_state.productos, st.session_state.lineas_disponibles = cargar_productos()
+    # En cada rerun, para tomar los cambios de productos.csv (si no cambió, no se vuelve a leer)
+    st.session_state.productos, st.session_state.lineas_disponibles = cargar_productos()
     if 'selected_linea' not in st.session_state:
         st.session_state.selected_linea = None
     if 'filtered_products' not in st.session_state:
@@ -130,9 +107,9 @@ def load_products_for_linea(linea):
     if not linea: return {}
     productos_filtrados = {}
     try:
-        for codigo, datos in st.session_state.productos.items():
-            if datos['linea_produccion'] == linea:
-                productos_filtrados[codigo] = int(datos['estandar_produccion'])
+        catalogo = obtener_catalogo()
+        if catalogo is not None:
+            productos_filtrados = catalogo.por_linea.get(linea, {})
     except Exception as e:
         st.error(f"Error al filtrar productos: {e}")
     return productos_filtrados
@@ -158,19 +135,15 @@ def remove_product(index):
 def calculate_times(tiempo_programado, report_products):
     if not tiempo_programado or tiempo_programado <= 0:
         return 0, 0, 0
-    tiempo_efectivo = 0
-    tiempo_no_conformidad = 0
-    for p in report_products:
-        estandar = p['estandar']
-        if estandar > 0:
-            tiempo_efectivo += (p['produccion_real'] / estandar) * 480
-            tiempo_no_conformidad += (p['produccion_defectuosa'] / estandar) * 480
-    
-    tiempo_a_justificar = tiempo_programado - tiempo_efectivo - tiempo_no_conformidad
+    # Un turno como matriz de 1 × productos
+    tiempo_efectivo, tiempo_no_conformidad, tiempo_a_justificar = calcular_tiempos_lote(
+        [tiempo_programado],
+        [[p['produccion_real'] for p in report_products]],
+        [[p['produccion_defectuosa'] for p in report_products]],
+        [[p['estandar'] for p in report_products]]
+    )
     
-    tiempo_a_justificar = max(0, round(tiempo_a_justificar))
-    
-    return tiempo_efectivo, tiempo_no_conformidad, tiempo_a_justificar
+    return float(tiempo_efectivo[0]), float(tiempo_no_conformidad[0]), int(tiempo_a_justificar[0])
 
 def add_unplanned_stop(causal, subcausal, tiempo):
     if not all([causal, subcausal, tiempo]):
@@ -219,7 +192,7 @@ def save_report(fecha, turno, supervisor, linea, tiempo_programado, tiempo_efect
         'turno': turno,
         'supervisor': supervisor,
         'linea_produccion': linea,
-        'tiempo_disponible_min': 480,
+        'tiempo_disponible_min': TIEMPO_TURNO_MIN,
         'tiempo_programado_min': tiempo_programado,
         'producto_terminado': ', '.join(productos_terminados),
         'produccion_real_unidades': produccion_real_total,
@@ -229,37 +202,14 @@ def save_report(fecha, turno, supervisor, linea, tiempo_programado, tiempo_efect
         'tiempo_a_justificar_min': tiempo_a_justificar,
     }
     
-    for i in range(10):
-        if i < len(st.session_state.unplanned_stops):
-            stop = st.session_state.unplanned_stops[i]
-            new_data[f'paro_causal_{i+1}'] = stop['causal']
-            new_data[f'paro_subcausal_{i+1}'] = stop['subcausal']
-            new_data[f'tiempo_paro_min_{i+1}'] = stop['tiempo']
-        else:
-            new_data[f'paro_causal_{i+1}'] = ''
-            new_data[f'paro_subcausal_{i+1}'] = ''
-            new_data[f'tiempo_paro_min_{i+1}'] = ''
+    # Un paro por fila, sin límite de paros por turno
+    paros = [
+        {'causal': stop['causal'], 'subcausal': stop['subcausal'], 'minutos': stop['tiempo']}
+        for stop in st.session_state.unplanned_stops
+    ]
             
     try:
-        file_path = 'registros_produccion.csv'
-        all_reports = []
-        header = new_data.keys()
-        
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            with open(file_path, 'r', newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                if reader.fieldnames:
-                    header = reader.fieldnames
-                    for row in reader:
-                        if not (row['fecha'] == fecha and row['turno'] == turno and row['linea_produccion'] == linea):
-                            all_reports.append(row)
-
-        all_reports.append(new_data)
-        
-        with open(file_path, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=header)
-            writer.writeheader()
-            writer.writerows(all_reports)
+        guardar_reporte(new_data, paros)
             
         st.success("Reporte guardado exitosamente.")
         return True
@@ -296,20 +246,56 @@ def clear_fields():
             del st.session_state[key]
 
 
+# Filas por página en la tabla del historial
+FILAS_POR_PAGINA = 50
+
+# Columnas del historial que se pueden filtrar, con su índice de posiciones
+FILTROS_HISTORIAL = ['linea_produccion', 'turno', 'mes', 'supervisor', 'dia']
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def cargar_historial(version):
+    """
+    Historial tipado con sus índices y valores de filtro, compartido por todas las sesiones.
+    Se arma una vez por versión de los datos (`version_registros()`), no en cada rerun.
+    No se modifica después de construido.
+    """
+    registros = leer_instantanea().registros
+    df = registros[['linea_produccion', 'fecha', 'turno', 'supervisor', 'produccion_real_unidades',
+                    'tiempo_programado_min', 'fecha_dt']].reset_index(drop=True)
+    df['fecha'] = df.pop('fecha_dt')
+    df['mes'] = df['fecha'].dt.strftime('%Y-%m').astype('category')
+    df['dia'] = df['fecha'].dt.strftime('%Y-%m-%d').astype('category')
+    
+    # valor -> posiciones (ordenadas) de las filas con ese valor
+    indices = {col: df.groupby(col, observed=True).indices for col in FILTROS_HISTORIAL}
+    opciones = {col: sorted(df[col].dropna().unique().tolist()) for col in FILTROS_HISTORIAL if col != 'dia'}
+    return {'df': df, 'indices': indices, 'opciones': opciones}
+
+def filtrar_historial(historial, filtros):
+    """
+    Posiciones de las filas que cumplen todos los filtros ({columna: valor}).
+    Intersecta los índices precalculados empezando por el más selectivo, sin recorrer la tabla.
+    """
+    vacio = np.array([], dtype=np.intp)
+    listas = sorted((historial['indices'][col].get(valor, vacio) for col, valor in filtros.items()), key=len)
+    if not listas:
+        return np.arange(len(historial['df']))
+    seleccion = listas[0]
+    for posiciones in listas[1:]:
+        seleccion = np.intersect1d(seleccion, posiciones, assume_unique=True)
+    return seleccion
+
 def show_history():
     st.subheader("Historial de Reportes")
     try:
-        if os.path.exists('registros_produccion.csv'):
-            df = pd.read_csv('registros_produccion.csv')
-            
+        historial = cargar_historial(version_registros())
+        df = historial['df']
+        if not df.empty:
             cols = st.columns(5)
-            lineas = ['Todas'] + sorted(df['linea_produccion'].dropna().unique().tolist())
-            turnos = ['Todos'] + sorted(df['turno'].dropna().unique().tolist())
-            supervisores = ['Todos'] + sorted(df['supervisor'].dropna().unique().tolist())
-            
-            df['fecha'] = pd.to_datetime(df['fecha'])
-            df['mes'] = df['fecha'].dt.strftime('%Y-%m')
-            meses = ['Todos'] + sorted(df['mes'].dropna().unique().tolist())
+            lineas = ['Todas'] + historial['opciones']['linea_produccion']
+            turnos = ['Todos'] + historial['opciones']['turno']
+            supervisores = ['Todos'] + historial['opciones']['supervisor']
+            meses = ['Todos'] + historial['opciones']['mes']
             
             with cols[0]:
                 linea_filter = st.selectbox("Línea:", lineas, key="hist_linea")
@@ -322,33 +308,47 @@ def show_history():
             with cols[4]:
                 fecha_filter = st.text_input("Fecha:", "", key="hist_fecha")
             
-            filtered_df = df.copy()
+            filtros = {}
             if linea_filter != "Todas":
-                filtered_df = filtered_df[filtered_df['linea_produccion'] == linea_filter]
+                filtros['linea_produccion'] = linea_filter
             if turno_filter != "Todos":
-                filtered_df = filtered_df[filtered_df['turno'] == turno_filter]
+                filtros['turno'] = turno_filter
             if mes_filter != "Todos":
-                filtered_df = filtered_df[filtered_df['mes'] == mes_filter]
+                filtros['mes'] = mes_filter
             if supervisor_filter != "Todos":
-                filtered_df = filtered_df[filtered_df['supervisor'] == supervisor_filter]
+                filtros['supervisor'] = supervisor_filter
             if fecha_filter:
-                filtered_df = filtered_df[filtered_df['fecha'].dt.strftime('%Y-%m-%d') == fecha_filter]
+                filtros['dia'] = fecha_filter.strip()
+            seleccion = filtrar_historial(historial, filtros)
+            
+            # Solo la página visible se envía al navegador
+            total_paginas = max(1, -(-len(seleccion) // FILAS_POR_PAGINA))
+            if st.session_state.get('hist_pagina', 1) > total_paginas:
+                st.session_state.hist_pagina = 1
+            pagina = st.number_input("Página:", min_value=1, max_value=total_paginas, value=1, step=1, key="hist_pagina")
+            inicio = (pagina - 1) * FILAS_POR_PAGINA
+            pagina_df = df.iloc[seleccion[inicio:inicio + FILAS_POR_PAGINA]]
             
             st.dataframe(
-                filtered_df[['linea_produccion', 'fecha', 'turno', 'supervisor', 'produccion_real_unidades']],
+                pagina_df[['linea_produccion', 'fecha', 'turno', 'supervisor', 'produccion_real_unidades']],
                 use_container_width=True,
                 height=200
             )
+            st.caption(f"Filas {min(inicio + 1, len(seleccion))}–{min(inicio + FILAS_POR_PAGINA, len(seleccion))} de {len(seleccion)} · página {pagina} de {total_paginas}")
+            
+            # Las columnas admiten nulos: la suma de la Serie los salta, como antes
+            produccion_total = int(df['produccion_real_unidades'].iloc[seleccion].sum())
+            tiempo_programado_total = int(df['tiempo_programado_min'].iloc[seleccion].sum())
             
             st.subheader("Estadísticas")
             stat_cols = st.columns(3)
             with stat_cols[0]:
-                st.metric("Total Reportes", len(filtered_df))
+                st.metric("Total Reportes", len(seleccion))
             with stat_cols[1]:
-                st.metric("Producción Total", f"{filtered_df['produccion_real_unidades'].sum():,}")
+                st.metric("Producción Total", f"{produccion_total:,}")
             with stat_cols[2]:
-                eficiencia = (filtered_df['produccion_real_unidades'].sum() / 
-                               (filtered_df['tiempo_programado_min'].sum() / 60)) if filtered_df['tiempo_programado_min'].sum() > 0 else 0
+                eficiencia = (produccion_total / 
+                               (tiempo_programado_total / 60)) if tiempo_programado_total > 0 else 0
                 st.metric("Eficiencia", f"{eficiencia:.2f}u/h")
         else:
             st.info("No hay registros de producción disponibles.")
@@ -378,7 +378,7 @@ def handle_editor_change():
                 # Validación estricta: la suma debe ser exactamente igual al tiempo programado
                 suma_tiempos = temp_tiempo_efectivo + temp_tiempo_no_conformidad + temp_tiempo_a_justificar
                 
-                if abs(suma_tiempos - tiempo_programado) > 1:  # Permitir pequeña diferencia por redondeo
+                if abs(suma_tiempos - tiempo_programado) > TOLERANCIA_MIN:  # Permitir pequeña diferencia por redondeo
                     st.session_state.validation_error = f"❌ La suma del tiempo efectivo ({temp_tiempo_efectivo:.0f} min), tiempo no conforme ({temp_tiempo_no_conformidad:.0f} min) y tiempo a justificar ({temp_tiempo_a_justificar:.0f} min) debe ser exactamente igual al tiempo programado ({tiempo_programado} min). Diferencia: {abs(suma_tiempos - tiempo_programado):.1f} min."
                 elif total_paros_actual > temp_tiempo_a_justificar:
                     st.session_state.validation_error = f"❌ ¡Error de coherencia! La suma de paros ({total_paros_actual} min) excede el nuevo tiempo a justificar ({temp_tiempo_a_justificar:.0f} min)."
@@ -392,7 +392,7 @@ def handle_editor_change():
 
 # --- Interfaz compacta ---
 def main():
-    create_initial_csv_files()
+    inicializar_almacenamiento()
     initialize_session_state()
     
     st.title("📊Reporte de Efectividad - OEE")
@@ -432,7 +432,8 @@ def main():
                                  key="linea_select")
             if linea != st.session_state.selected_linea:
                 st.session_state.selected_linea = linea
-                st.session_state.filtered_products = load_products_for_linea(linea)
+            # Búsqueda directa en el índice por línea del catálogo
+            st.session_state.filtered_products = load_products_for_linea(linea)
         with cols[4]:
             tiempo_disponible = st.number_input("T. Disp (min):", min_value=0, max_value=1440, value=480, disabled=True, key="tiempo_disp")
         with cols[5]:
@@ -489,12 +490,14 @@ def main():
         
         # Validación de coherencia de tiempos
         suma_tiempos = tiempo_efectivo + tiempo_no_conformidad + tiempo_a_justificar
-        if abs(suma_tiempos - tiempo_programado) > 1:  # Permitir pequeña diferencia por redondeo
+        if abs(suma_tiempos - tiempo_programado) > TOLERANCIA_MIN:  # Permitir pequeña diferencia por redondeo
             st.error(f"❌ ¡Error de coherencia! La suma de tiempos ({suma_tiempos:.1f} min) no coincide con el tiempo programado ({tiempo_programado} min). Diferencia: {abs(suma_tiempos - tiempo_programado):.1f} min.")
         
         st.markdown('<p class="section-header">Paradas No Programadas</p>', unsafe_allow_html=True)
         stop_cols = st.columns([2, 2, 1, 1])
         with stop_cols[0]:
+            # Causales y subcausales activas de la taxonomía (taxonomia_paros.csv)
+            causales_paros = obtener_taxonomia().causales
             causal = st.selectbox("Causal:", [""] + list(causales_paros.keys()), key="causal_select")
         with stop_cols[1]:
             subcausales = causales_paros.get(causal, []) if causal else []
@@ -550,13 +553,7 @@ def main():
         report_exists_check = False
         if all([fecha_str, turno, linea]):
             try:
-                if os.path.exists('registros_produccion.csv'):
-                    with open('registros_produccion.csv', 'r', newline='', encoding='utf-8') as file:
-                        reader = csv.DictReader(file)
-                        for row in reader:
-                            if row['fecha'] == fecha_str and row['turno'] == turno and row['linea_produccion'] == linea:
-                                report_exists_check = True
-                                break
+                report_exists_check = existe_reporte(fecha_str, turno, linea)
             except Exception:
                 pass
         
@@ -570,8 +567,8 @@ def main():
             
             # Validación estricta para permitir guardar
             suma_tiempos_actual = tiempo_efectivo + tiempo_no_conformidad + tiempo_a_justificar
-            tiempo_coherente = abs(suma_tiempos_actual - tiempo_programado) <= 1
-            paros_coherentes = abs(tiempo_a_justificar - total_paros_actual) <= 1
+            tiempo_coherente = abs(suma_tiempos_actual - tiempo_programado) <= TOLERANCIA_MIN
+            paros_coherentes = abs(tiempo_a_justificar - total_paros_actual) <= TOLERANCIA_MIN
             
             puede_guardar = (
                 tiempo_coherente and
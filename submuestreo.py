@@ -0,0 +1,44 @@
+"""
+Reducción de puntos para los gráficos de líneas.
+
+Largest-Triangle-Three-Buckets (LTTB): conserva el primer y el último punto y, de
+cada tramo intermedio, el punto que forma el triángulo más grande con el punto ya
+elegido y el promedio del tramo siguiente. Mantiene picos y caídas, que es lo que
+se mira en una serie de OEE, con una fracción de los puntos.
+"""
+import numpy as np
+
+# Modo de dibujo adaptable de los gráficos de líneas, en puntos totales del gráfico
+MAX_PUNTOS_CON_ETIQUETAS = 200
+MIN_PUNTOS_WEBGL = 1000
+# Por encima de este total, cada serie se reduce con LTTB a su parte del presupuesto
+MAX_PUNTOS_GRAFICO = 2000
+
+
+def lttb(x, y, puntos):
+    """
+    Índices (ordenados) de `puntos` puntos de la serie (x creciente) elegidos por LTTB; al menos
+    se conservan el primero, el último y uno intermedio. Si la serie no tiene más de `puntos`, devuelve todos.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    puntos = max(puntos, 3)
+    if n <= puntos:
+        return np.arange(n)
+
+    # Tramos intermedios, sin el primer ni el último punto
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(int)
+    elegidos = np.empty(puntos, dtype=int)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Promedio del tramo siguiente (el último punto para el último tramo)
+        sig_inicio, sig_fin = (bordes[i + 1], bordes[i + 2]) if i + 2 < len(bordes) else (n - 1, n)
+        x_sig, y_sig = x[sig_inicio:sig_fin].mean(), y[sig_inicio:sig_fin].mean()
+        areas = np.abs((x[anterior] - x_sig) * (y[inicio:fin] - y[anterior])
+                       - (x[anterior] - x[inicio:fin]) * (y_sig - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        elegidos[i + 1] = anterior
+    return elegidos
@@ -0,0 +1,225 @@
+"""
+Taxonomía de paros: causales y subcausales con códigos enteros estables.
+
+La tabla vive en `taxonomia_paros.csv`, una fila por par causal/subcausal:
+
+- ``codigo``: código del par, el que se guarda en cada paro. No cambia nunca, así
+  que renombrar una causal o una subcausal en la tabla no reescribe el historial.
+- ``codigo_causal``: código de la causal, compartido por sus subcausales.
+- ``categoria``: pérdida a la que pertenece (disponibilidad, velocidad o calidad).
+  Las agregaciones clasifican los paros con una búsqueda por código, sin comparar textos.
+- ``activa``: 0 para los pares retirados, que se siguen leyendo pero ya no se ofrecen
+  en el formulario.
+
+La versión de la tabla es un resumen de su contenido: cambia con cualquier edición y
+sirve de clave para los cachés que muestran nombres. Los pares que llegan por texto y
+no están en la tabla (historiales anteriores, importaciones) se agregan con un código
+nuevo; la búsqueda no distingue mayúsculas, tildes ni espacios repetidos.
+"""
+import hashlib
+import os
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import BloqueoArchivo
+
+TAXONOMIA_FILE = 'taxonomia_paros.csv'
+
+COLUMNAS_TAXONOMIA = ['codigo', 'codigo_causal', 'causal', 'subcausal', 'categoria', 'activa']
+
+# Categorías de pérdida; el índice en esta lista es el código de la categoría
+CATEGORIAS = ['disponibilidad', 'velocidad', 'calidad']
+
+CAUSALES_INICIALES = {
+    "Falla de equipo": ["Fallo mecanico", "Fallo electrico", "Falla de sensores", "Fuga de aceite/aire"],
+    "Mantenimiento no programado": ["Ajustes de emergencia", "Cambio de repuestos criticos", "Inspecciones correctivas"],
+    "Cambio de producto / setup": ["Ajuste de maquina", "Limpieza de linea", "Cambio de herramientas/moldes"],
+    "Abastecimiento de materiales": ["Falta de materia prima", "Retraso de logistica interna", "Retraso de proveedor externo", "Material defectuoso recibido"],
+    "Calidad del producto": ["Producto fuera de especificacion", "Reproceso en linea", "Bloqueo por inspeccion de calidad"],
+    "Problemas de planeacion/programa": ["Orden cancelada", "Espera por programacion", "Secuencia incorrecta"],
+    "Servicios auxiliares": ["Falta de energia electrica", "Corte de agua", "Falla de aire comprimido", "Fallo de vapor/gas"],
+    "Mano de obra / personal": ["Falta de operador", "Capacitacion en maquina", "Relevo de turno retrasado"],
+    "Retrabajo / reproceso": ["Ajuste de lote", "Correccion por error de empaque", "Correccion por error de etiquetado"],
+    "Inicio / fin de produccion": ["Arranque de linea (puesta a punto)", "Parada por fin de orden de produccion", "Limpieza final"],
+    "Perdida de velocidad": ["Materia Prima", "Equipos/Proceso", "Gestión/Personal"]
+}
+
+# Causales iniciales que no son de disponibilidad
+CATEGORIAS_INICIALES = {
+    "Calidad del producto": 'calidad',
+    "Retrabajo / reproceso": 'calidad',
+    "Perdida de velocidad": 'velocidad',
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _normalizar(texto):
+    """Clave de búsqueda de un nombre: sin tildes, sin mayúsculas y con los espacios colapsados."""
+    if texto is None or (not isinstance(texto, str) and pd.isna(texto)):
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ' '.join(''.join(c for c in texto if not unicodedata.combining(c)).casefold().split())
+
+
+def _categoria_por_nombre(causal):
+    """Categoría de una causal que llega sin clasificar: solo la pérdida de velocidad se reconoce por su nombre."""
+    return 'velocidad' if 'perdida de velocidad' in _normalizar(causal) else 'disponibilidad'
+
+
+def tabla_inicial():
+    """Tabla con las causales con las que arrancó la aplicación, numeradas en orden."""
+    filas = []
+    for codigo_causal, (causal, subcausales) in enumerate(CAUSALES_INICIALES.items(), start=1):
+        for subcausal in subcausales:
+            filas.append({'codigo': len(filas) + 1, 'codigo_causal': codigo_causal, 'causal': causal,
+                          'subcausal': subcausal, 'categoria': CATEGORIAS_INICIALES.get(causal, 'disponibilidad'),
+                          'activa': 1})
+    return pd.DataFrame(filas, columns=COLUMNAS_TAXONOMIA)
+
+
+class Taxonomia:
+    """Tabla de la taxonomía con búsquedas por código (arreglos) y por nombre (diccionario)."""
+
+    def __init__(self, tabla, version):
+        self.tabla = tabla
+        self.version = version
+        codigos = tabla['codigo'].to_numpy(dtype=np.int64)
+        n = int(codigos.max()) + 1 if len(codigos) else 1
+        # Arreglos indexados por código; los códigos que no están en la tabla quedan sin nombre
+        self._causal = np.full(n, None, dtype=object)
+        self._subcausal = np.full(n, None, dtype=object)
+        self._categoria = np.full(n, -1, dtype=np.int8)
+        self._causal[codigos] = tabla['causal'].to_numpy(dtype=object)
+        self._subcausal[codigos] = tabla['subcausal'].where(tabla['subcausal'].notna(), None).to_numpy(dtype=object)
+        self._categoria[codigos] = [CATEGORIAS.index(c) for c in tabla['categoria']]
+        self.claves = {(_normalizar(c), _normalizar(s)): codigo
+                       for codigo, c, s in zip(codigos, tabla['causal'], tabla['subcausal'])}
+        # Causal -> subcausales, solo los pares activos, en el orden de la tabla
+        self.causales = {}
+        for causal, subcausal in tabla.loc[tabla['activa'] == 1, ['causal', 'subcausal']].itertuples(index=False):
+            self.causales.setdefault(causal, []).append(subcausal)
+
+    def _indices(self, codigos):
+        """Códigos como posiciones válidas de los arreglos; los nulos o desconocidos apuntan a una posición vacía."""
+        codigos = pd.to_numeric(pd.Series(codigos), errors='coerce').to_numpy(dtype=float)
+        validos = ~np.isnan(codigos) & (codigos >= 0) & (codigos < len(self._causal))
+        return np.where(validos, np.nan_to_num(codigos), 0).astype(np.int64), validos
+
+    def nombres(self, codigos):
+        """(causales, subcausales) de los códigos, como arreglos de texto; None si el código no existe."""
+        indices, validos = self._indices(codigos)
+        return np.where(validos, self._causal[indices], None), np.where(validos, self._subcausal[indices], None)
+
+    def categorias(self, codigos):
+        """Código de categoría (índice en CATEGORIAS) de cada paro; -1 si el código no existe."""
+        indices, validos = self._indices(codigos)
+        return np.where(validos, self._categoria[indices], -1)
+
+    def es_categoria(self, codigos, categoria):
+        """Máscara de los paros de una categoría ('disponibilidad', 'velocidad' o 'calidad')."""
+        return self.categorias(codigos) == CATEGORIAS.index(categoria)
+
+    def faltantes(self, pares):
+        """Pares (causal, subcausal) de la lista que no están en la tabla, sin repetir."""
+        vistos = {}
+        for causal, subcausal in pares:
+            clave = (_normalizar(causal), _normalizar(subcausal))
+            if clave[0] and clave not in self.claves:
+                vistos.setdefault(clave, (causal, subcausal))
+        return list(vistos.values())
+
+    def codificar(self, causales, subcausales):
+        """
+        Código de cada par causal/subcausal (Int64, nulo sin causal). Los pares deben estar
+        en la tabla; para agregar los que falten, usar `codificar_paros`.
+        """
+        # Los nombres se normalizan una vez por valor distinto y se buscan una vez por par distinto
+        cod_causal, causales = pd.factorize(pd.Series(causales, dtype=object))
+        cod_subcausal, subcausales = pd.factorize(pd.Series(subcausales, dtype=object))
+        causales = [_normalizar(c) for c in causales] + ['']
+        subcausales = [_normalizar(s) for s in subcausales] + ['']
+        # El código -1 (vacío) apunta al último nombre, ''
+        combinados = (np.where(cod_causal < 0, len(causales) - 1, cod_causal) * len(subcausales)
+                      + np.where(cod_subcausal < 0, len(subcausales) - 1, cod_subcausal))
+        pares, unicos = pd.factorize(combinados)
+        codigos = []
+        for causal, subcausal in zip(*np.divmod(unicos, len(subcausales))):
+            clave = (causales[causal], subcausales[subcausal])
+            codigos.append(self.claves.get(clave) if clave[0] else None)
+        return pd.array(codigos, dtype='Int64').take(pares)
+
+
+def _firma(taxonomia_file):
+    stat = os.stat(taxonomia_file)
+    return (taxonomia_file, stat.st_mtime_ns, stat.st_size)
+
+
+def _leer(taxonomia_file):
+    with open(taxonomia_file, 'rb') as file:
+        contenido = file.read()
+    tabla = pd.read_csv(taxonomia_file, dtype={'causal': object, 'subcausal': object, 'categoria': object})
+    return Taxonomia(tabla, hashlib.sha1(contenido).hexdigest()[:12])
+
+
+def inicializar_taxonomia(taxonomia_file=TAXONOMIA_FILE):
+    """Crea la tabla con las causales iniciales si no existe."""
+    if not os.path.exists(taxonomia_file):
+        with BloqueoArchivo(taxonomia_file + '.lock'):
+            if not os.path.exists(taxonomia_file):
+                tabla_inicial().to_csv(taxonomia_file + '.tmp', index=False, encoding='utf-8')
+                os.replace(taxonomia_file + '.tmp', taxonomia_file)
+
+
+def obtener_taxonomia(taxonomia_file=TAXONOMIA_FILE):
+    """
+    Taxonomía vigente, compartida por todas las sesiones del proceso.
+    Se vuelve a leer solo cuando cambia el archivo (mtime o tamaño).
+    """
+    inicializar_taxonomia(taxonomia_file)
+    firma = _firma(taxonomia_file)
+    entrada = _cache.get(taxonomia_file)
+    if entrada is not None and entrada[0] == firma:
+        return entrada[1]
+    with _lock:
+        if _cache.get(taxonomia_file, (None,))[0] != firma:
+            _cache[taxonomia_file] = (firma, _leer(taxonomia_file))
+        return _cache[taxonomia_file][1]
+
+
+def registrar(pares, taxonomia_file=TAXONOMIA_FILE):
+    """
+    Agrega a la tabla los pares (causal, subcausal) que no estén, con códigos nuevos, y
+    devuelve la taxonomía actualizada. Una causal nueva recibe también un código de causal
+    nuevo; un par nuevo de una causal existente usa el código de esa causal.
+    """
+    taxonomia = obtener_taxonomia(taxonomia_file)
+    if not taxonomia.faltantes(pares):
+        return taxonomia
+    with BloqueoArchivo(taxonomia_file + '.lock'):
+        # Otro proceso pudo haberlos agregado mientras se esperaba el bloqueo
+        taxonomia = _leer(taxonomia_file)
+        tabla = taxonomia.tabla
+        codigo = int(tabla['codigo'].max()) if len(tabla) else 0
+        codigo_causal = int(tabla['codigo_causal'].max()) if len(tabla) else 0
+        # Un par nuevo de una causal existente toma el nombre, el código y la categoría de esa causal
+        causales = {_normalizar(c): (cc, c, cat) for c, cc, cat in
+                    zip(tabla['causal'], tabla['codigo_causal'], tabla['categoria'])}
+        filas = []
+        for causal, subcausal in taxonomia.faltantes(pares):
+            clave_causal = _normalizar(causal)
+            if clave_causal not in causales:
+                codigo_causal += 1
+                causales[clave_causal] = (codigo_causal, causal, _categoria_por_nombre(causal))
+            codigo += 1
+            cc, nombre, categoria = causales[clave_causal]
+            filas.append([codigo, cc, nombre, None if _normalizar(subcausal) == '' else subcausal, categoria, 1])
+        with open(taxonomia_file, 'a', newline='', encoding='utf-8') as file:
+            pd.DataFrame(filas, columns=COLUMNAS_TAXONOMIA).to_csv(file, header=False, index=False)
+            file.flush()
+            os.fsync(file.fileno())
+    return obtener_taxonomia(taxonomia_file)